@@ -1,9 +1,150 @@
 import os
 import random
 import streamlit as st
-from utils.llm_api import call_llm
-from scripts import functions, prompts
-from scripts.config import Config
+from scripts import functions, core, audio_engine, trailer_pool
+
+
+def random_points(trailer_points):
+    """Picks a random option for every trailer element category."""
+    return {
+        point["category"]: random.choice(point["options"]) for point in trailer_points
+    }
+
+
+def llm_settings(config):
+    """
+    Returns the model, API key, base URL and key pool for the selected provider.
+    """
+    if st.session_state.use_local_model:
+        # Ollama's OpenAI compatible endpoint; the key is a placeholder
+        base_url = config.ollama_base_url
+        api_key = config.ollama_api_key
+        key_pool = None
+    else:
+        # Use OpenRouter
+        base_url = "https://openrouter.ai/api/v1"
+        # Spread calls over the configured OpenRouter keys
+        key_pool = config.key_pool("openrouter")
+        api_key = config.openrouter_api_key or next(
+            iter(config.openrouter_api_keys), None
+        )
+    return st.session_state.get("selected_model"), api_key, base_url, key_pool
+
+
+def apply_text_result(result):
+    """Shows a generated title and script."""
+    st.session_state.movie_name = result["movie_name"]
+    st.session_state.generated_script = result["script"]
+    st.session_state.generation_id = result["generation_id"]
+    st.session_state.script_generated = True
+
+
+def deliver_text(job):
+    """Copies a finished title/script job into the session."""
+    if job.status == "failed":
+        st.session_state.job_error = f"Error generating script: {job.error}"
+        st.session_state.script_generated = False
+        return
+    apply_text_result(job.result)
+
+
+def start_prefetch(config, trailer_points):
+    """
+    Pre-generates the title (and script) of the next random combination in the
+    background, once per finished trailer and within the session's budget.
+    """
+    if config.prefetch not in ("title", "script"):
+        return
+    final_audio_path = st.session_state.get("final_audio_path")
+    if st.session_state.get("prefetched_for") == final_audio_path:
+        return
+    if st.session_state.get("prefetch_count", 0) >= config.prefetch_budget:
+        return
+    model_name, api_key, base_url, key_pool = llm_settings(config)
+    if not api_key or not model_name:
+        return
+    st.session_state.prefetched_for = final_audio_path
+    st.session_state.prefetch_count = st.session_state.get("prefetch_count", 0) + 1
+    st.session_state.prefetched = None
+    functions.job_manager().submit(
+        functions.session_id(),
+        "prefetch",
+        core.prefetch_trailer_text,
+        random_points(trailer_points),
+        model_name,
+        api_key,
+        base_url,
+        key_pool=key_pool,
+        include_script=config.prefetch == "script",
+    )
+
+
+def serve_pooled_trailer(config):
+    """
+    Shows a pre-generated trailer from the pool and tops the pool up again in
+    the background.
+    """
+    trailer = trailer_pool.take_trailer(
+        is_available=lambda path: config.artifact_backend != "filesystem"
+        or os.path.exists(path)
+    )
+    if trailer is None:
+        st.session_state.job_error = (
+            "No pre-generated trailer is ready yet. Please try again shortly."
+        )
+    else:
+        st.session_state.selected_points = dict(trailer.elements)
+        apply_text_result(
+            {
+                "movie_name": trailer.movie_name,
+                "script": trailer.script,
+                "generation_id": None,
+            }
+        )
+        st.session_state.final_audio_path = trailer.audio_path
+    # One refill per server at a time, shared by all sessions
+    functions.job_manager().submit(
+        "trailer-pool", "refill", trailer_pool.refill_from_config, config
+    )
+
+
+def collect_prefetch():
+    """
+    Returns the finished prefetch result of this session, if any. A prefetch
+    still running is not waited for; it is discarded if its combination is not
+    the one generated next.
+    """
+    job = functions.job_manager().pop_finished(functions.session_id(), "prefetch")
+    if job is not None and job.status == "done":
+        st.session_state.prefetched = job.result
+    return st.session_state.get("prefetched")
+
+
+def deliver_audio(job):
+    """Copies a finished voice-over job into the session."""
+    if job.status == "failed":
+        st.session_state.job_error = f"Failed to generate audio: {job.error}"
+        return
+    st.session_state.final_audio_path = job.result
+
+
+@st.fragment(run_every=1)
+def job_progress(kind, deliver):
+    """
+    Polls the session's background job of one kind.
+
+    Shows its progress while it runs; once it finished, hands it to ``deliver``
+    and reruns the app so the result is displayed.
+    """
+    jobs = functions.job_manager()
+    job = jobs.pop_finished(functions.session_id(), kind)
+    if job is None:
+        job = jobs.get(functions.session_id(), kind)
+        if job is not None:
+            st.progress(job.progress, text=job.message or "Waiting for a worker...")
+        return
+    deliver(job)
+    st.rerun()
 
 
 def main():
@@ -19,8 +160,10 @@ def main():
     st.set_page_config(page_title="Movie Trailer Generator", layout="wide")
     st.title("Movie Trailer Generator")
 
-    # Initialize configuration
-    config = Config.load()
+    # Configuration snapshot, shared across reruns
+    config = functions.app_config()
+    # Warm local models in the background even before Ollama mode is chosen
+    functions.warm_ollama_models()
 
     # Initialize mode in session state if not present
     if "use_local_model" not in st.session_state:
@@ -47,8 +190,17 @@ def main():
             )
             st.stop()
         else:
+            # Of interchangeable models, preselect one Ollama already has loaded
+            acceptable = [
+                model
+                for model in [
+                    config.ollama_default_model,
+                    *config.ollama_acceptable_models,
+                ]
+                if model in ollama_models
+            ]
             default_model = (
-                "llama3.2:3b" if "llama3.2:3b" in ollama_models else ollama_models[0]
+                config.ollama_scheduler().pick_model(acceptable) or ollama_models[0]
             )
             selected_model = st.sidebar.selectbox(
                 "Select Local Model",
@@ -60,6 +212,8 @@ def main():
                 ),
             )
             st.session_state.selected_model = selected_model
+            # Load it now instead of on the first generation
+            functions.ollama_model_status(selected_model)
     else:
         # OpenRouter models
         st.sidebar.subheader("OpenRouter Model Selection")
@@ -99,7 +253,7 @@ def main():
 
         # Add API key instructions
         # Check the key from the loaded config object
-        if not config.openrouter_api_key:
+        if not config.is_valid():
             st.sidebar.error(
                 "OpenRouter API key not found. "
                 "Please configure it via environment variables or secrets.toml."
@@ -113,10 +267,7 @@ def main():
     colors = ["#FFB3BA", "#BAFFC9", "#BAE1FF", "#FFFFBA", "#FFDFBA"]
 
     if "selected_points" not in st.session_state:
-        st.session_state.selected_points = {
-            point["category"]: random.choice(point["options"])
-            for point in trailer_points
-        }
+        st.session_state.selected_points = random_points(trailer_points)
     if "movie_name" not in st.session_state:
         st.session_state.movie_name = ""  # Initialize as an empty string
 
@@ -166,44 +317,36 @@ def main():
 
         if not custom_mode:
             if st.button("🎲 Randomize All", use_container_width=True):
-                st.session_state.selected_points = {
-                    point["category"]: random.choice(point["options"])
-                    for point in trailer_points
-                }
+                prefetched = collect_prefetch()
+                if prefetched:
+                    # Take the combination generated in the background
+                    st.session_state.selected_points = dict(prefetched["elements"])
+                else:
+                    st.session_state.selected_points = random_points(trailer_points)
+                st.rerun()
+            if config.trailer_pool_size > 0 and st.button(
+                "⚡ Instant Trailer",
+                use_container_width=True,
+                help="Play a trailer that was generated in advance",
+            ):
+                serve_pooled_trailer(config)
                 st.rerun()
 
     # Main content column
     with main_col:
+        jobs = functions.job_manager()
+        session_id = functions.session_id()
+
         if st.button("Generate Voice-Over Script"):
             st.session_state.script_generated = False
             st.session_state.generated_script = None
             st.session_state.movie_name = None
+            st.session_state.generation_id = None
+            st.session_state.final_audio_path = None
 
-            # --- Determine API parameters ---
-            api_key = None
-            base_url = None
-            model_name_for_generation = None
-
-            if st.session_state.use_local_model:
-                # Assume Ollama setup
-                # Get base URL from config or env var if available, else default
-                base_url = getattr(
-                    config,
-                    "ollama_base_url",
-                    os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/v1"),
-                )
-                # Ollama's OpenAI compatible endpoint often uses a placeholder key
-                api_key = getattr(
-                    config, "ollama_api_key", os.getenv("OLLAMA_API_KEY", "ollama")
-                )
-                # Get the specific local model name from session state
-                model_name_for_generation = st.session_state.selected_model
-            else:
-                # Use OpenRouter
-                base_url = "https://openrouter.ai/api/v1"
-                # Get API key from the loaded config object
-                api_key = config.openrouter_api_key
-                model_name_for_generation = st.session_state.selected_model
+            model_name_for_generation, api_key, base_url, key_pool = llm_settings(
+                config
+            )
 
             # Basic validation of parameters
             if not api_key or not base_url or not model_name_for_generation:
@@ -211,105 +354,50 @@ def main():
                     "API Key, Base URL, or Model Name is missing. Please check configuration."
                 )
             else:
-                # --- First LLM Call (Movie Name) using call_llm ---
-                movie_name = None
-                try:
-                    with st.spinner("Generating movie name..."):
-                        # Prepare the prompt for movie name generation
-                        movie_name_prompt = prompts.MOVIE_TITLE_USER_PROMPT.format(
-                            genre=st.session_state.selected_points["Genre"],
-                            main_character=st.session_state.selected_points[
-                                "Main Character"
-                            ],
-                            setting=st.session_state.selected_points["Setting"],
-                            conflict=st.session_state.selected_points["Conflict"],
-                            plot_twist=st.session_state.selected_points["Plot Twist"],
-                        )
-
-                        movie_name = call_llm(
-                            model_name=model_name_for_generation,
-                            prompt=movie_name_prompt,
-                            api_key=api_key,
-                            base_url=base_url,
-                            temperature=0.7,
-                            max_tokens=50,
-                        )
-                except Exception as e:
-                    st.error(f"Error generating movie name: {e}")
-                    st.stop()
-
-                # --- Check Movie Name ---
-                if movie_name and isinstance(movie_name, str):
-                    # Clean up potential quotes or extra whitespace
-                    st.session_state.movie_name = movie_name.strip().replace('"', "")
-                    st.success(f"Generated Movie Name: {st.session_state.movie_name}")
-
-                    # --- Second LLM Call (Script) using call_llm ---
-                    script = None
-                    try:
-                        with st.spinner("Generating voice-over script..."):
-                            # Prepare the prompt for script generation
-                            # Ensure keys match the placeholders in prompts.SCRIPT_USER_PROMPT
-                            script_prompt_args = {
-                                "title": st.session_state.movie_name,  # Use 'title' key
-                                "genre": st.session_state.selected_points["Genre"],
-                                "setting": st.session_state.selected_points["Setting"],
-                                "character": st.session_state.selected_points[
-                                    "Main Character"
-                                ],  # Use 'character' key
-                                "conflict": st.session_state.selected_points[
-                                    "Conflict"
-                                ],
-                                "plot_twist": st.session_state.selected_points[
-                                    "Plot Twist"
-                                ],
-                            }
-                            script_prompt = prompts.SCRIPT_USER_PROMPT.format(
-                                **script_prompt_args
-                            )
-
-                            script = call_llm(
-                                model_name=model_name_for_generation,
-                                prompt=script_prompt,
-                                api_key=api_key,
-                                base_url=base_url,
-                                temperature=0.7,
-                                max_tokens=500,
-                            )
-                    except KeyError as e:
-                        st.error(
-                            f"Error formatting script prompt: Missing key {e}. Check prompts.py and app.py alignment."
-                        )
-                        # Optionally add st.stop() here if this is critical
-                    except Exception as e:
-                        st.error(f"Error generating script: {e}")
-
-                    # --- Process Script ---
-                    if script:
-                        formatted_script = "\n\n".join(
-                            [
-                                line.strip()
-                                for line in script.split("\n")
-                                if line.strip()
-                            ]
+                prefetched = collect_prefetch()
+                st.session_state.prefetched = None
+                if (
+                    prefetched
+                    and core.prefetch_matches(
+                        prefetched,
+                        st.session_state.selected_points,
+                        model_name_for_generation,
+                        base_url,
+                    )
+                    and prefetched["stages"].get("script")
+                ):
+                    # Everything was prefetched; only the history entry is left
+                    apply_text_result(
+                        core.generate_trailer_text(
+                            dict(st.session_state.selected_points),
+                            model_name_for_generation,
+                            api_key,
+                            base_url,
+                            prefetched=prefetched,
                         )
-                        st.session_state.generated_script = formatted_script
-                        st.session_state.script_generated = True
-                    else:
-                        # Error message was already shown in the except block if script generation failed
-                        # If script is None/empty without an exception, show a generic message
-                        if movie_name:
-                            st.warning(
-                                "Script generation returned empty. Try adjusting parameters or regenerating."
-                            )
-                        st.session_state.script_generated = False
+                    )
                 else:
-                    # Error message was already shown in the except block if name generation failed
-                    # If name is None/empty without an exception, show a generic message
-                    st.warning(
-                        "Movie name generation returned empty. Please try again."
+                    # Title and script are generated in the background; the
+                    # progress fragment below delivers them into the session
+                    jobs.submit(
+                        session_id,
+                        "text",
+                        core.generate_trailer_text,
+                        dict(st.session_state.selected_points),
+                        model_name_for_generation,
+                        api_key,
+                        base_url,
+                        key_pool=key_pool,
+                        prefetched=prefetched,
                     )
 
+        if jobs.get(session_id, "text"):
+            job_progress("text", deliver_text)
+
+        job_error = st.session_state.pop("job_error", None)
+        if job_error:
+            st.error(job_error)
+
         # Display the script if it exists
         if st.session_state.get("script_generated", False):
             st.subheader(st.session_state.movie_name)
@@ -319,44 +407,45 @@ def main():
                 height=200,
             )
 
+            fit_mode = st.selectbox(
+                "Music fitting",
+                audio_engine.FIT_MODES,
+                index=(
+                    audio_engine.FIT_MODES.index(config.music_fit_mode)
+                    if config.music_fit_mode in audio_engine.FIT_MODES
+                    else 0
+                ),
+                help="stretch: resample the music to the voice-over length. "
+                "loop: loop and trim the music on phrase boundaries.",
+            )
+
             if st.button("Generate Voice over"):
-                with st.spinner("Generating audio..."):
-                    audio = functions.generate_audio_with_elevenlabs(
-                        st.session_state.generated_script
-                    )
-                if audio:
-                    # Save the audio file
-                    audio_file_path = functions.save_audio_file(
-                        audio,
-                        st.session_state.selected_points,
-                        st.session_state.movie_name,
-                    )
+                st.session_state.final_audio_path = None
+                jobs.submit(
+                    session_id,
+                    "audio",
+                    core.generate_trailer_audio,
+                    st.session_state.generated_script,
+                    dict(st.session_state.selected_points),
+                    st.session_state.movie_name,
+                    config,
+                    fit_mode=fit_mode,
+                    generation_id=st.session_state.get("generation_id"),
+                )
 
-                    # Apply background music
-                    audio_with_music_path = functions.apply_background_music(
-                        audio_file_path
-                    )
-                    if audio_with_music_path:
-                        st.audio(audio_with_music_path, format="audio/mp3")
-                        with open(audio_with_music_path, "rb") as file:
-                            st.download_button(
-                                label="Download",
-                                data=file,
-                                file_name=os.path.basename(audio_with_music_path),
-                                mime="audio/mp3",
-                            )
-                    else:
-                        st.error("Failed to apply background music. Please try again.")
-
-                    with open(audio_with_music_path, "rb") as file:
-                        st.download_button(
-                            label="Download",
-                            data=file,
-                            file_name=os.path.basename(audio_with_music_path),
-                            mime="audio/mp3",
-                        )
-                else:
-                    st.error("Failed to generate audio. Please try again.")
+            if jobs.get(session_id, "audio"):
+                job_progress("audio", deliver_audio)
+
+            if st.session_state.get("final_audio_path"):
+                functions.audio_player(
+                    st.session_state.final_audio_path,
+                    base_url=config.media_base_url,
+                    host=config.media_server_host,
+                    port=config.media_server_port,
+                    root=config.artifact_root,
+                )
+                # Users usually randomize again while listening
+                start_prefetch(config, trailer_points)
 
         # Note about Audio Browser
         st.markdown("---")
@@ -1,6 +1,8 @@
 import streamlit as st
 import os
 import time
+from scripts import functions
+from scripts.config import reload_config, update_secrets
 
 st.title("API Key Management")
 
@@ -23,30 +25,18 @@ def create_secrets_file():
 # Function to save API keys to secrets.toml
 def save_api_keys(elevenlabs_key=None, openrouter_key=None):
     secrets_path = os.path.join(".streamlit", "secrets.toml")
-    current_secrets = {}
-
-    # Read existing secrets
-    if os.path.exists(secrets_path):
-        with open(secrets_path, "r") as f:
-            content = f.read()
-            # Parse existing keys
-            for line in content.split("\n"):
-                if "=" in line:
-                    key, value = line.split("=", 1)
-                    current_secrets[key.strip()] = value.strip().strip('"')
-
-    # Update with new values if provided
+    values = {}
     if elevenlabs_key is not None:
-        current_secrets["ELEVENLABS_API_KEY"] = elevenlabs_key
+        values["ELEVENLABS_API_KEY"] = elevenlabs_key
     if openrouter_key is not None:
-        current_secrets["OPENROUTER_API_KEY"] = openrouter_key
-
-    # Write back all secrets
-    with open(secrets_path, "w") as f:
-        f.write("# This is where you store your API keys. DO NOT share this file!\n")
-        for key, value in current_secrets.items():
-            f.write(f'{key} = "{value}"\n')
-
+        values["OPENROUTER_API_KEY"] = openrouter_key
+
+    # Only the two key lines are rewritten; other settings are left as they are
+    try:
+        update_secrets(values, secrets_path)
+    except ValueError as e:
+        st.error(f"Could not save API keys: {e}")
+        return False
     return True
 
 
@@ -80,6 +70,7 @@ with col2:
 # Save button for both API keys
 if st.button("Save API Keys", use_container_width=True):
     if save_api_keys(elevenlabs_api_key, openrouter_api_key):
+        reload_config()
         st.success("API keys saved! Restarting app...")
         time.sleep(1)  # Give user time to see the success message
         st.rerun()
@@ -101,3 +92,12 @@ with status_col2:
         st.success("OpenRouter API Key: ✅ Set")
     else:
         st.error("OpenRouter API Key: ❌ Not Set")
+
+# Health of pooled keys (extra keys come from OPENROUTER_API_KEYS /
+# ELEVENLABS_API_KEYS or the openrouter_api_keys / elevenlabs_api_keys secrets)
+config = functions.app_config()
+for provider, label in (("openrouter", "OpenRouter"), ("elevenlabs", "ElevenLabs")):
+    pool_status = config.key_pool(provider).status()
+    if len(pool_status) > 1 or any(row["failures"] for row in pool_status):
+        st.markdown(f"**{label} key pool**")
+        st.dataframe(pool_status, use_container_width=True)
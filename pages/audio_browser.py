@@ -1,27 +1,61 @@
 import os
 import streamlit as st
+from scripts import artifact_catalog, functions
 
 
+PAGE_SIZES = [10, 20, 50]
+
 st.title("Audio Browser")
 
-audio_files = [f for f in os.listdir("generated_audio") if f.endswith(".mp3")]
-audio_files.sort(
-    key=lambda x: os.path.getmtime(os.path.join("generated_audio", x)),
-    reverse=True,
-)
-
-if audio_files:
-    for audio_file in audio_files:
-        audio_path = os.path.join("generated_audio", audio_file)
-        st.markdown(f"**{audio_file}**")
-        st.audio(audio_path, format="audio/mp3")
-
-        with open(audio_path, "rb") as file:
-            st.download_button(
-                label="Download",
-                data=file,
-                file_name=audio_file,
-                mime="audio/mp3",
-            )
+config = functions.app_config()
+
+# Pick up files saved outside the app once per session; the app itself records
+# every artifact in the catalog when it is saved.
+rescan = st.sidebar.button(f"Rescan {config.artifact_root}")
+if rescan or "audio_catalog_synced" not in st.session_state:
+    artifact_catalog.sync_directory(config.artifact_root)
+    st.session_state.audio_catalog_synced = True
+
+search_col, kind_col, size_col = st.columns([3, 1, 1])
+with search_col:
+    search = st.text_input("Search by title or genre", key="audio_search")
+with kind_col:
+    kind_label = st.selectbox("Show", ["Final mixes", "Voice-overs", "All"])
+with size_col:
+    page_size = st.selectbox("Per page", PAGE_SIZES, index=1)
+
+kind = {"Final mixes": "final", "Voice-overs": "voiceover", "All": None}[kind_label]
+total = artifact_catalog.count_artifacts(search=search or None, kind=kind)
+
+if total:
+    page_count = (total + page_size - 1) // page_size
+    page = st.number_input(
+        f"Page (of {page_count})", min_value=1, max_value=page_count, value=1
+    )
+    rows = artifact_catalog.query_artifacts(
+        search=search or None,
+        kind=kind,
+        limit=page_size,
+        offset=(page - 1) * page_size,
+    )
+    st.caption(f"{total} files")
+
+    # Only the rows on this page are rendered; audio is streamed by URL
+    for row in rows:
+        if not os.path.exists(row["path"]):
+            continue
+        st.markdown(f"**{row['movie'] or row['name']}**")
+        details = [row["genre"], f"{row['size'] / 1_000_000:.1f} MB"]
+        if row["duration_ms"]:
+            details.append(f"{row['duration_ms'] / 1000:.0f} s")
+        st.caption(" · ".join(d for d in details if d))
+        functions.audio_player(
+            row["path"],
+            base_url=config.media_base_url,
+            host=config.media_server_host,
+            port=config.media_server_port,
+            key=f"download_{row['path']}",
+            root=config.artifact_root,
+        )
 else:
     st.write("No audio files generated yet.")
@@ -0,0 +1,243 @@
+"""
+SQLite catalog of generated audio artifacts.
+
+Artifacts are recorded when they are saved, so the Audio Browser can search and
+paginate without listing the directory or opening any audio file. A directory
+sync picks up files written before the catalog existed or by other tools.
+"""
+
+import os
+import re
+import json
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, Iterator, List, Optional
+
+DEFAULT_AUDIO_DIR = "generated_audio"
+# Kept out of generated_audio/, which the media server publishes
+DEFAULT_DB_PATH = os.path.join("data", "catalog.sqlite3")
+
+# voiceover_<movie>_<YYYYmmdd_HHMMSS>.mp3 / final_<movie>_<...>.mp3; batch jobs
+# use a 16-digit hex idempotency key instead of the timestamp
+_FILENAME_PATTERN = re.compile(
+    r"^(voiceover|final)_(.*)_(\d{8}_\d{6}|[0-9a-f]{16})\.mp3$"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    path TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    movie TEXT,
+    genre TEXT,
+    elements TEXT,
+    mtime REAL NOT NULL,
+    duration_ms REAL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_mtime ON artifacts (mtime DESC);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind_mtime ON artifacts (kind, mtime DESC);
+CREATE INDEX IF NOT EXISTS idx_artifacts_movie ON artifacts (movie);
+CREATE INDEX IF NOT EXISTS idx_artifacts_genre ON artifacts (genre);
+"""
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Opens the catalog, creating the database and schema if needed."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def parse_filename(filename: str) -> Dict[str, Optional[str]]:
+    """
+    Extracts the artifact kind and movie name from a generated file name.
+
+    Returns:
+        dict: ``kind`` ("voiceover", "final" or "other") and ``movie`` (or None).
+    """
+    match = _FILENAME_PATTERN.match(filename)
+    if not match:
+        return {"kind": "other", "movie": None}
+    return {"kind": match.group(1), "movie": match.group(2)}
+
+
+def record_artifact(
+    path: str,
+    movie_name: Optional[str] = None,
+    selected_points: Optional[Dict[str, str]] = None,
+    duration_ms: Optional[float] = None,
+    source_path: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> None:
+    """
+    Adds or updates one artifact in the catalog.
+
+    Args:
+        path (str): Path of the saved file.
+        movie_name (str, optional): Movie title. Parsed from the file name if omitted.
+        selected_points (dict, optional): Trailer elements used for the artifact.
+        duration_ms (float, optional): Audio length, when already known.
+        source_path (str, optional): Artifact this one was derived from (e.g. the
+            voice-over of a final mix); its title and elements are reused.
+        db_path (str, optional): Catalog database path.
+    """
+    stat = os.stat(path)
+    name = os.path.basename(path)
+    parsed = parse_filename(name)
+
+    with closing(connect(db_path)) as conn, conn:
+        if source_path and (movie_name is None or selected_points is None):
+            source = conn.execute(
+                "SELECT movie, elements FROM artifacts WHERE path = ?", (source_path,)
+            ).fetchone()
+            if source:
+                movie_name = movie_name or source["movie"]
+                if selected_points is None and source["elements"]:
+                    selected_points = json.loads(source["elements"])
+
+        conn.execute(
+            "INSERT OR REPLACE INTO artifacts "
+            "(path, name, kind, movie, genre, elements, mtime, duration_ms, size) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                path,
+                name,
+                parsed["kind"],
+                movie_name or parsed["movie"],
+                (selected_points or {}).get("Genre"),
+                json.dumps(selected_points) if selected_points else None,
+                stat.st_mtime,
+                duration_ms,
+                stat.st_size,
+            ),
+        )
+
+
+def _iter_audio_files(directory: str) -> Iterator[os.DirEntry]:
+    """Yields MP3 files in ``directory`` and its (shard) subdirectories."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir():
+                yield from _iter_audio_files(entry.path)
+            elif entry.is_file() and entry.name.endswith(".mp3"):
+                yield entry
+
+
+def remove_artifacts(paths: List[str], db_path: str = DEFAULT_DB_PATH) -> None:
+    """Removes deleted files from the catalog."""
+    with closing(connect(db_path)) as conn, conn:
+        conn.executemany("DELETE FROM artifacts WHERE path = ?", [(p,) for p in paths])
+
+
+def sync_directory(
+    directory: str = DEFAULT_AUDIO_DIR, db_path: str = DEFAULT_DB_PATH
+) -> int:
+    """
+    Reconciles the catalog with the files on disk.
+
+    The directory is scanned recursively, so sharded artifact stores are covered.
+    Only new or modified MP3 files are inserted (using the metadata from their
+    names) and rows for deleted files are removed. No audio file is opened.
+
+    Returns:
+        int: Number of rows added, updated or removed.
+    """
+    if not os.path.isdir(directory):
+        return 0
+
+    with closing(connect(db_path)) as conn, conn:
+        known = {
+            row["path"]: row["mtime"]
+            for row in conn.execute("SELECT path, mtime FROM artifacts")
+        }
+        rows = []
+        seen = set()
+        for entry in _iter_audio_files(directory):
+            seen.add(entry.path)
+            stat = entry.stat()
+            if known.get(entry.path) == stat.st_mtime:
+                continue
+            parsed = parse_filename(entry.name)
+            rows.append(
+                (
+                    entry.path,
+                    entry.name,
+                    parsed["kind"],
+                    parsed["movie"],
+                    stat.st_mtime,
+                    stat.st_size,
+                )
+            )
+
+        # New files get name-derived metadata; modified files keep what was recorded
+        conn.executemany(
+            "INSERT INTO artifacts (path, name, kind, movie, mtime, size) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime = excluded.mtime, size = excluded.size",
+            rows,
+        )
+        missing = [(path,) for path in known if path not in seen]
+        conn.executemany("DELETE FROM artifacts WHERE path = ?", missing)
+    return len(rows) + len(missing)
+
+
+def _where(search: Optional[str], kind: Optional[str]):
+    clauses, params = [], []
+    if search:
+        clauses.append("(movie LIKE ? OR genre LIKE ? OR name LIKE ?)")
+        params.extend([f"%{search}%"] * 3)
+    if kind:
+        clauses.append("kind = ?")
+        params.append(kind)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+
+def count_artifacts(
+    search: Optional[str] = None,
+    kind: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> int:
+    """Returns the number of artifacts matching a search."""
+    where, params = _where(search, kind)
+    with closing(connect(db_path)) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM artifacts{where}", params).fetchone()[0]
+
+
+def query_artifacts(
+    search: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    db_path: str = DEFAULT_DB_PATH,
+) -> List[Dict[str, Any]]:
+    """
+    Returns one page of artifacts, newest first.
+
+    Args:
+        search (str, optional): Matched against movie title, genre and file name.
+        kind (str, optional): "voiceover" or "final" to filter by artifact type.
+        limit (int, optional): Page size.
+        offset (int, optional): Number of rows to skip.
+        db_path (str, optional): Catalog database path.
+
+    Returns:
+        list[dict]: Artifact rows with ``elements`` decoded to a dict.
+    """
+    where, params = _where(search, kind)
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute(
+            f"SELECT * FROM artifacts{where} ORDER BY mtime DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+    results = []
+    for row in rows:
+        item = dict(row)
+        item["elements"] = json.loads(item["elements"]) if item["elements"] else {}
+        results.append(item)
+    return results
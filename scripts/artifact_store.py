@@ -0,0 +1,320 @@
+"""
+Storage backends for generated artifacts (voice-overs and final mixes).
+
+Artifacts are addressed by their file name (the "key"). The filesystem backend
+spreads files over hash-sharded subdirectories and writes atomically; the S3
+backend stores them in any S3-compatible bucket (AWS, MinIO, ...). Both support
+a retention policy by age and total size, and deleting intermediates once the
+final mix exists.
+"""
+
+import os
+import time
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional
+
+from scripts.lazy_import import lazy_import
+
+boto3 = lazy_import("boto3", "the S3 artifact store")
+
+
+@dataclass(frozen=True)
+class ArtifactInfo:
+    """A stored artifact."""
+
+    key: str
+    size: int
+    mtime: float
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    """Limits applied by ArtifactStore.enforce_retention (None disables a limit)."""
+
+    max_age_seconds: Optional[float] = None
+    max_total_bytes: Optional[int] = None
+
+
+def shard_for(key: str, depth: int = 2) -> List[str]:
+    """Returns the shard directory names for a key, e.g. ["3f", "a2"]."""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return [digest[2 * i : 2 * i + 2] for i in range(depth)]
+
+
+class ArtifactStore(ABC):
+    """Interface shared by all artifact storage backends."""
+
+    @abstractmethod
+    def put(self, key: str, data: bytes) -> str:
+        """Stores ``data`` under ``key`` and returns its location."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes:
+        """Returns the contents of an artifact. Raises KeyError if it is missing."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Returns True if the artifact exists."""
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Deletes an artifact. Returns False if it did not exist."""
+
+    @abstractmethod
+    def list(self) -> Iterator[ArtifactInfo]:
+        """Yields every stored artifact."""
+
+    @abstractmethod
+    def locate(self, key: str) -> str:
+        """Returns the location of an artifact (local path or URL)."""
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Returns a local file path for the artifact, if the backend has one."""
+        return None
+
+    def url(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        """Returns a URL browsers can load the artifact from, if there is one."""
+        return None
+
+    def enforce_retention(
+        self, policy: RetentionPolicy, now: Optional[float] = None
+    ) -> List[str]:
+        """
+        Deletes artifacts that are older than the policy allows, then the oldest
+        remaining artifacts until the total size fits.
+
+        Returns:
+            list[str]: Keys of the deleted artifacts.
+        """
+        now = time.time() if now is None else now
+        items = sorted(self.list(), key=lambda a: a.mtime)
+        deleted = []
+
+        if policy.max_age_seconds is not None:
+            cutoff = now - policy.max_age_seconds
+            while items and items[0].mtime < cutoff:
+                deleted.append(items.pop(0).key)
+
+        if policy.max_total_bytes is not None:
+            total = sum(a.size for a in items)
+            while items and total > policy.max_total_bytes:
+                oldest = items.pop(0)
+                total -= oldest.size
+                deleted.append(oldest.key)
+
+        for key in deleted:
+            self.delete(key)
+        return deleted
+
+    def collect_intermediates(self, final_key: str, intermediate_keys: List[str]) -> List[str]:
+        """
+        Deletes intermediate artifacts once ``final_key`` exists. The final
+        artifact itself is never deleted, even if it is listed.
+
+        Returns:
+            list[str]: Keys that were deleted (none if the final artifact is missing).
+        """
+        if not self.exists(final_key):
+            return []
+        return [
+            key for key in intermediate_keys if key != final_key and self.delete(key)
+        ]
+
+
+class FilesystemArtifactStore(ArtifactStore):
+    """
+    Stores artifacts below ``root`` in hash-sharded subdirectories
+    (``root/3f/a2/<key>``), so no directory grows unbounded.
+
+    Files written directly to ``root`` by older versions are still found,
+    listed and deleted.
+    """
+
+    def __init__(self, root: str = "generated_audio", shard_depth: int = 2):
+        self.root = root
+        self.shard_depth = shard_depth
+
+    def _sharded_path(self, key: str) -> str:
+        return os.path.join(self.root, *shard_for(key, self.shard_depth), key)
+
+    def local_path(self, key: str) -> Optional[str]:
+        path = self._sharded_path(key)
+        if os.path.exists(path):
+            return path
+        legacy = os.path.join(self.root, key)
+        return legacy if os.path.exists(legacy) else None
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self._sharded_path(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def get(self, key: str) -> bytes:
+        path = self.local_path(key)
+        if path is None:
+            raise KeyError(key)
+        with open(path, "rb") as f:
+            return f.read()
+
+    def exists(self, key: str) -> bool:
+        return self.local_path(key) is not None
+
+    def delete(self, key: str) -> bool:
+        path = self.local_path(key)
+        if path is None:
+            return False
+        os.remove(path)
+        return True
+
+    def locate(self, key: str) -> str:
+        return self.local_path(key) or self._sharded_path(key)
+
+    def list(self) -> Iterator[ArtifactInfo]:
+        if not os.path.isdir(self.root):
+            return
+        yield from self._scan(self.root, 0)
+
+    def _scan(self, directory: str, depth: int) -> Iterator[ArtifactInfo]:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir() and depth < self.shard_depth and len(entry.name) == 2:
+                    yield from self._scan(entry.path, depth + 1)
+                elif entry.is_file() and (depth == self.shard_depth or entry.name.endswith(".mp3")):
+                    stat = entry.stat()
+                    yield ArtifactInfo(entry.name, stat.st_size, stat.st_mtime)
+
+
+class S3ArtifactStore(ArtifactStore):
+    """
+    Stores artifacts in an S3-compatible bucket under
+    ``<prefix>/<shard>/<shard>/<key>``.
+
+    Args:
+        bucket (str): Bucket name.
+        prefix (str, optional): Key prefix inside the bucket.
+        client (optional): A boto3 S3 client (or compatible object). Created from
+            ``endpoint_url`` when omitted, which requires boto3.
+        endpoint_url (str, optional): Endpoint of a non-AWS service such as MinIO.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "generated_audio",
+        client: Any = None,
+        endpoint_url: Optional[str] = None,
+        shard_depth: int = 2,
+    ):
+        if client is None:
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.shard_depth = shard_depth
+
+    def _object_key(self, key: str) -> str:
+        parts = [self.prefix] if self.prefix else []
+        return "/".join(parts + shard_for(key, self.shard_depth) + [key])
+
+    def _is_missing(self, error: Exception) -> bool:
+        code = getattr(error, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def put(self, key: str, data: bytes) -> str:
+        # S3 PUTs are atomic: readers see the old object or the new one
+        self.client.put_object(Bucket=self.bucket, Key=self._object_key(key), Body=data)
+        return self.locate(key)
+
+    def get(self, key: str) -> bytes:
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except Exception as e:
+            if self._is_missing(e):
+                raise KeyError(key) from e
+            raise
+        return response["Body"].read()
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+            return True
+        except Exception as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    def delete(self, key: str) -> bool:
+        if not self.exists(key):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=self._object_key(key))
+        return True
+
+    def locate(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._object_key(key)}"
+
+    def url(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        # Presigned, so private buckets work without making objects public
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=expires_in,
+        )
+
+    def list(self) -> Iterator[ArtifactInfo]:
+        kwargs = {"Bucket": self.bucket}
+        if self.prefix:
+            kwargs["Prefix"] = self.prefix + "/"
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for item in response.get("Contents", []):
+                yield ArtifactInfo(
+                    key=item["Key"].rsplit("/", 1)[-1],
+                    size=int(item["Size"]),
+                    mtime=item["LastModified"].timestamp(),
+                )
+            if not response.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+
+def create_store(
+    backend: str = "filesystem",
+    root: str = "generated_audio",
+    bucket: Optional[str] = None,
+    prefix: str = "generated_audio",
+    endpoint_url: Optional[str] = None,
+) -> ArtifactStore:
+    """
+    Builds an artifact store from configuration values.
+
+    Args:
+        backend (str, optional): "filesystem" or "s3".
+        root (str, optional): Root directory for the filesystem backend.
+        bucket (str, optional): Bucket for the S3 backend.
+        prefix (str, optional): Key prefix for the S3 backend.
+        endpoint_url (str, optional): S3 endpoint (e.g. a MinIO server).
+    """
+    if backend == "s3":
+        if not bucket:
+            raise ValueError("An S3 bucket is required for the s3 artifact backend")
+        return S3ArtifactStore(bucket, prefix=prefix, endpoint_url=endpoint_url)
+    if backend != "filesystem":
+        raise ValueError(f"Unknown artifact backend: {backend}")
+    return FilesystemArtifactStore(root)
@@ -0,0 +1,485 @@
+"""
+Crash-safe, resumable batch generation of trailers.
+
+A job is a manifest of trailers (one set of elements each) stored in SQLite.
+Every stage of every trailer (title, script, TTS, mix) is checkpointed as soon
+as it completes, so a restarted runner skips finished stages and only retries
+failed or unfinished ones. Paid stages use idempotency keys: the TTS output is
+saved under a key derived from the job, trailer and stage, and is reused
+instead of being requested (and billed) again.
+
+Run a job from the command line with ``python -m scripts.batch_jobs``.
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import sqlite3
+import hashlib
+import argparse
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_DB_PATH = os.path.join("data", "jobs.sqlite3")
+STAGES = ("title", "script", "tts", "mix")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    item_id INTEGER NOT NULL,
+    elements TEXT NOT NULL,
+    PRIMARY KEY (job_id, item_id)
+);
+CREATE TABLE IF NOT EXISTS job_stages (
+    job_id TEXT NOT NULL,
+    item_id INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, item_id, stage)
+);
+"""
+
+
+@dataclass
+class JobItem:
+    """One trailer of a job, with the outputs of its completed stages."""
+
+    job_id: str
+    item_id: int
+    elements: Dict[str, str]
+    outputs: Dict[str, str] = field(default_factory=dict)
+    attempts: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def idempotency_key(self, stage: str) -> str:
+        """Returns a key that is stable across restarts for one stage of this item."""
+        raw = f"{self.job_id}/{self.item_id}/{stage}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+    def exhausted(self, stage: str, max_attempts: int) -> bool:
+        """Returns whether a stage failed and has no attempts left."""
+        return self.attempts.get(stage, 0) >= max_attempts and stage in self.errors
+
+    def next_stage(self) -> Optional[str]:
+        """Returns the first stage without a checkpoint, or None when done."""
+        for stage in STAGES:
+            if stage not in self.outputs:
+                return stage
+        return None
+
+
+StageHandler = Callable[[JobItem], str]
+# Produces one stage for many items at once; returns outputs by item id and
+# leaves out the items it could not do
+BulkHandler = Callable[[List[JobItem]], Dict[int, str]]
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Opens the job database, creating it and its schema if needed."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # Every checkpoint must survive a power loss, not only a process crash
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def create_job(
+    elements_list: List[Dict[str, str]],
+    job_id: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> str:
+    """
+    Writes a job manifest.
+
+    Args:
+        elements_list (list[dict]): Trailer elements, one dict per trailer.
+        job_id (str, optional): Id for the job. Generated when omitted.
+        db_path (str, optional): Job database path.
+
+    Returns:
+        str: The job id.
+    """
+    job_id = job_id or uuid.uuid4().hex
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute(
+            "INSERT INTO jobs (id, created_at) VALUES (?, ?)", (job_id, time.time())
+        )
+        conn.executemany(
+            "INSERT INTO job_items (job_id, item_id, elements) VALUES (?, ?, ?)",
+            [
+                (job_id, item_id, json.dumps(elements))
+                for item_id, elements in enumerate(elements_list)
+            ],
+        )
+    return job_id
+
+
+def load_items(job_id: str, db_path: str = DEFAULT_DB_PATH) -> List[JobItem]:
+    """Returns the items of a job with their checkpointed stage state."""
+    with closing(connect(db_path)) as conn:
+        items = {
+            row["item_id"]: JobItem(job_id, row["item_id"], json.loads(row["elements"]))
+            for row in conn.execute(
+                "SELECT item_id, elements FROM job_items WHERE job_id = ? ORDER BY item_id",
+                (job_id,),
+            )
+        }
+        for row in conn.execute(
+            "SELECT item_id, stage, status, output, attempts, error "
+            "FROM job_stages WHERE job_id = ?",
+            (job_id,),
+        ):
+            item = items[row["item_id"]]
+            item.attempts[row["stage"]] = row["attempts"]
+            if row["status"] == "done":
+                item.outputs[row["stage"]] = row["output"]
+            elif row["error"]:
+                item.errors[row["stage"]] = row["error"]
+    return list(items.values())
+
+
+def _save_stage(
+    item: JobItem,
+    stage: str,
+    status: str,
+    output: Optional[str],
+    error: Optional[str],
+    db_path: str,
+) -> None:
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute(
+            "INSERT INTO job_stages "
+            "(job_id, item_id, stage, status, output, attempts, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT(job_id, item_id, stage) DO UPDATE SET "
+            "status = excluded.status, output = excluded.output, "
+            "attempts = attempts + 1, error = excluded.error, "
+            "updated_at = excluded.updated_at",
+            (item.job_id, item.item_id, stage, status, output, error, time.time()),
+        )
+
+
+def checkpoint(item: JobItem, stage: str, output: str, db_path: str = DEFAULT_DB_PATH) -> None:
+    """Records the output of a completed stage."""
+    _save_stage(item, stage, "done", output, None, db_path)
+    item.outputs[stage] = output
+    item.errors.pop(stage, None)
+    item.attempts[stage] = item.attempts.get(stage, 0) + 1
+
+
+def record_failure(
+    item: JobItem, stage: str, error: str, db_path: str = DEFAULT_DB_PATH
+) -> None:
+    """Records a failed attempt of a stage."""
+    _save_stage(item, stage, "failed", None, error, db_path)
+    item.errors[stage] = error
+    item.attempts[stage] = item.attempts.get(stage, 0) + 1
+
+
+def job_summary(
+    job_id: str, db_path: str = DEFAULT_DB_PATH, max_attempts: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Counts the items of a job by state.
+
+    Args:
+        job_id (str): The job.
+        db_path (str, optional): Job database path.
+        max_attempts (int, optional): When given, a failed item only counts as
+            ``failed`` once its stage has no attempts left; until then it is
+            ``pending``.
+
+    Returns:
+        dict: ``total``, ``done`` (all stages complete), ``failed`` (last attempt
+        of a stage failed) and ``pending`` items.
+    """
+    items = load_items(job_id, db_path)
+    done = sum(1 for item in items if item.next_stage() is None)
+    failed = sum(
+        1
+        for item in items
+        if item.next_stage() in item.errors
+        and (max_attempts is None or item.exhausted(item.next_stage(), max_attempts))
+    )
+    return {
+        "total": len(items),
+        "done": done,
+        "failed": failed,
+        "pending": len(items) - done - failed,
+    }
+
+
+def run_job(
+    job_id: str,
+    handlers: Dict[str, StageHandler],
+    max_attempts: int = 3,
+    max_consecutive_failures: int = 5,
+    db_path: str = DEFAULT_DB_PATH,
+    bulk_handlers: Optional[Dict[str, BulkHandler]] = None,
+) -> Dict[str, int]:
+    """
+    Runs (or resumes) a job.
+
+    Each item's stages run in order, starting after its last checkpoint. A failed
+    stage is recorded and the runner moves on to the next item; the stage is
+    retried by a later run until it has failed ``max_attempts`` times. After
+    ``max_consecutive_failures`` failures in a row (e.g. a provider outage) the
+    run stops early, so attempts are not used up while the provider is down.
+
+    Stages with a bulk handler are first done for all items that are due for
+    them in one go; items the bulk handler leaves out fall back to the stage
+    handler one by one.
+
+    Args:
+        job_id (str): The job to run.
+        handlers (dict): Stage name -> callable taking the JobItem and returning
+            the stage output as a string. Handlers read earlier outputs from
+            ``item.outputs`` and should use ``item.idempotency_key(stage)`` for
+            side effects that must not be repeated.
+        max_attempts (int, optional): Attempts per stage across all runs.
+        max_consecutive_failures (int, optional): Failures in a row that stop the run.
+        db_path (str, optional): Job database path.
+        bulk_handlers (dict, optional): Stage name -> callable taking the due
+            JobItems and returning outputs by item id.
+
+    Returns:
+        dict: The job summary after the run (see job_summary).
+    """
+    items = load_items(job_id, db_path)
+    for stage, bulk in (bulk_handlers or {}).items():
+        due = [
+            item
+            for item in items
+            if item.next_stage() == stage and not item.exhausted(stage, max_attempts)
+        ]
+        if not due:
+            continue
+        try:
+            outputs = bulk(due)
+        except Exception as e:
+            # Not an attempt: the items are retried one by one below
+            print(f"Warning: job {job_id} bulk stage {stage} failed: {e}")
+            outputs = {}
+        for item in due:
+            if outputs.get(item.item_id):
+                checkpoint(item, stage, outputs[item.item_id], db_path)
+
+    consecutive_failures = 0
+    for item in items:
+        stage = item.next_stage()
+        while stage is not None:
+            if item.exhausted(stage, max_attempts):
+                break
+            try:
+                output = handlers[stage](item)
+            except Exception as e:
+                print(f"Warning: job {job_id} item {item.item_id} stage {stage} failed: {e}")
+                record_failure(item, stage, str(e), db_path)
+                consecutive_failures += 1
+                if consecutive_failures >= max_consecutive_failures:
+                    print(f"Stopping job {job_id} after {consecutive_failures} failures in a row")
+                    return job_summary(job_id, db_path)
+                break
+            checkpoint(item, stage, output, db_path)
+            consecutive_failures = 0
+            stage = item.next_stage()
+    return job_summary(job_id, db_path)
+
+
+def pipeline_handlers(
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    store,
+    config,
+    key_pool=None,
+) -> Dict[str, StageHandler]:
+    """
+    Builds the stage handlers of the app's title -> script -> TTS -> mix chain.
+
+    Args:
+        model_name (str): LLM used for the title and script.
+        api_key (str): API key of the LLM provider.
+        base_url (str): Base URL of the LLM provider.
+        store (ArtifactStore): Where voice-overs and mixes are saved.
+        config (Config): Audio settings (TTS format, fitting, loudness, ...).
+        key_pool (KeyPool, optional): Pool of LLM keys used instead of ``api_key``.
+    """
+    from scripts import core
+
+    def title(item: JobItem) -> str:
+        return core.generate_title(
+            item.elements, model_name, api_key, base_url, key_pool=key_pool
+        )
+
+    def script(item: JobItem) -> str:
+        return core.generate_script(
+            item.outputs["title"],
+            item.elements,
+            model_name,
+            api_key,
+            base_url,
+            key_pool=key_pool,
+        )
+
+    def tts(item: JobItem) -> str:
+        key = f"voiceover_{item.outputs['title']}_{item.idempotency_key('tts')}.mp3"
+        final_key = core.final_key_for(key)
+        # Saved by an earlier run that crashed before its checkpoint
+        if store.exists(key) or store.exists(final_key):
+            return key
+        audio = core.generate_audio_with_elevenlabs(
+            item.outputs["script"],
+            output_format=config.tts_output_format,
+            key_pool=config.key_pool("elevenlabs"),
+        )
+        core.save_audio_file(
+            audio,
+            item.elements,
+            item.outputs["title"],
+            audio_format=config.tts_output_format,
+            store=store,
+            key=key,
+        )
+        return key
+
+    def mix(item: JobItem) -> str:
+        voice_key = item.outputs["tts"]
+        final_key = core.final_key_for(voice_key)
+        if store.exists(final_key):
+            return store.locate(final_key)
+        return core.apply_background_music(
+            store.locate(voice_key),
+            fit_mode=config.music_fit_mode,
+            ducking=config.music_ducking,
+            target_lufs=config.target_lufs,
+            genre=item.elements.get("Genre"),
+            music_dir=config.music_library_dir,
+            voice_audio=store.get(voice_key),
+            store=store,
+            keep_intermediates=config.keep_intermediates,
+        )
+
+    return {"title": title, "script": script, "tts": tts, "mix": mix}
+
+
+def pipeline_bulk_handlers(
+    model_name: str,
+    api_key: str,
+    base_url: str,
+    config,
+    key_pool=None,
+) -> Dict[str, BulkHandler]:
+    """
+    Builds the bulk handlers of the pipeline: titles for many items per request.
+
+    The batch size follows the model's model_token_limits (or conservative
+    defaults), capped by title_batch_size. No bulk handler is returned when
+    only one combination would fit per request.
+
+    Args:
+        model_name, api_key, base_url, key_pool: As for pipeline_handlers.
+        config (Config): Batch size and token limit settings.
+    """
+    from scripts import core
+
+    limits = config.model_token_limits.get(model_name, {})
+    batch_size = core.title_batch_size(
+        limits.get("context", core.DEFAULT_CONTEXT_TOKENS),
+        limits.get("output", core.DEFAULT_OUTPUT_TOKENS),
+        config.title_batch_size,
+    )
+    if batch_size < 2:
+        return {}
+
+    def titles(items: List[JobItem]) -> Dict[int, str]:
+        generated = core.generate_titles(
+            [item.elements for item in items],
+            model_name,
+            api_key,
+            base_url,
+            key_pool=key_pool,
+            batch_size=batch_size,
+        )
+        return {item.item_id: title for item, title in zip(items, generated) if title}
+
+    return {"title": titles}
+
+
+def random_elements(count: int) -> List[Dict[str, str]]:
+    """Returns ``count`` random element combinations from assets/data."""
+    from scripts import core
+
+    points = core.get_trailer_points()
+    return [
+        {point["category"]: random.choice(point["options"]) for point in points}
+        for _ in range(count)
+    ]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point: create, run or inspect batch jobs."""
+    from scripts.config import parse_overrides, reload_config
+
+    parser = argparse.ArgumentParser(description="Resumable batch trailer generation")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Job database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("create", help="Create a job of random trailers")
+    create.add_argument("count", type=int)
+    run = commands.add_parser("run", help="Run or resume a job")
+    run.add_argument("job_id")
+    run.add_argument("--model", help="LLM model (defaults to the configured OpenRouter model)")
+    run.add_argument("--max-attempts", type=int, default=3)
+    run.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Override a setting, e.g. --set target_lufs=-14",
+    )
+    status = commands.add_parser("status", help="Show the progress of a job")
+    status.add_argument("job_id")
+    args = parser.parse_args(argv)
+
+    if args.command == "create":
+        print(create_job(random_elements(args.count), db_path=args.db))
+    elif args.command == "status":
+        print(job_summary(args.job_id, db_path=args.db))
+    else:
+        config = reload_config(overrides=parse_overrides(args.set))
+        llm = dict(
+            model_name=args.model or config.openrouter_default_model,
+            api_key=config.openrouter_api_key,
+            base_url="https://openrouter.ai/api/v1",
+            key_pool=config.key_pool("openrouter"),
+        )
+        handlers = pipeline_handlers(
+            store=config.artifact_store(), config=config, **llm
+        )
+        print(
+            run_job(
+                args.job_id,
+                handlers,
+                max_attempts=args.max_attempts,
+                db_path=args.db,
+                bulk_handlers=pipeline_bulk_handlers(config=config, **llm),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,76 +1,563 @@
-import streamlit as st
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable, Mapping, Tuple
 from dataclasses import dataclass, field
+import dataclasses
+import json
 import os
+import re
+import tempfile
+import threading
+from types import MappingProxyType
 
+try:
+    import tomllib
+except ImportError:  # Python < 3.11
+    import tomli as tomllib
 
-@dataclass
+from scripts.artifact_store import ArtifactStore, RetentionPolicy, create_store
+from scripts.key_pool import KeyPool, get_key_pool
+from scripts.rate_limiter import RateLimiter, get_rate_limiter, merge_limits
+from scripts.ollama_manager import OllamaManager, get_ollama_manager, ollama_host
+from scripts.ollama_scheduler import OllamaScheduler, get_ollama_scheduler
+
+DEFAULT_SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+
+@dataclass(frozen=True)
 class Config:
-    """Configuration class for the application."""
+    """
+    Immutable configuration snapshot for the application.
+
+    Use get_config() to share one snapshot per process instead of loading a new
+    one for every call. The snapshot is shared by every session, so list
+    settings are stored as tuples and table settings as read-only mappings.
+    """
 
     openrouter_api_key: Optional[str] = None
+    # Additional keys; calls spread over openrouter_api_key and these
+    openrouter_api_keys: Tuple[str, ...] = ()
+    elevenlabs_api_key: Optional[str] = None
+    elevenlabs_api_keys: Tuple[str, ...] = ()
+    # How a key is picked from a pool ("least_loaded" or "round_robin")
+    key_selection: str = "least_loaded"
+    # Rate limits per provider and resource as (capacity, window in seconds),
+    # e.g. {"elevenlabs": {"characters": (100_000, 2_592_000)}}; they override
+    # rate_limiter.DEFAULT_LIMITS and a capacity of 0 removes a limit
+    rate_limits: Mapping[str, Mapping[str, Tuple[float, float]]] = field(
+        default_factory=dict
+    )
     # Deprecated: Use openrouter_default_model instead
     openrouter_model: Optional[str] = None
+    # Deprecated: beds are picked from music_library_dir instead
     background_music_path: str = "assets/audio/trailer_music.mp3"
+    # Directory of background music beds, indexed by scripts/music_library.py
+    music_library_dir: str = "assets/audio"
+    # ElevenLabs output format; "pcm_<rate>" skips MP3 decoding in the mixer
+    tts_output_format: str = "mp3_44100_128"
+    # Artifact storage for voice-overs and mixes ("filesystem" or "s3")
+    artifact_backend: str = "filesystem"
+    artifact_root: str = "generated_audio"
+    artifact_s3_bucket: Optional[str] = None
+    artifact_s3_prefix: str = "generated_audio"
+    artifact_s3_endpoint_url: Optional[str] = None
+    # Retention limits (None keeps everything)
+    artifact_max_age_days: Optional[float] = None
+    artifact_max_total_mb: Optional[float] = None
+    # Keep voice-overs after the final mix has been saved
+    keep_intermediates: bool = False
+    # Local media server for generated audio (range requests, caching)
+    media_server_host: str = "127.0.0.1"
+    media_server_port: int = 8502
+    # URL the browser uses to reach the media server; audio is sent as bytes if unset
+    media_base_url: Optional[str] = None
+    # How the music bed is fitted to the voice-over ("stretch" or "loop")
+    music_fit_mode: str = "stretch"
+    # Duck the music bed under the voice-over; off keeps the original flat mix
+    music_ducking: bool = False
+    # Integrated loudness of the final mix in LUFS, e.g. -16 (None, the default,
+    # leaves the mix level as it was)
+    target_lufs: Optional[float] = None
+    # Generation jobs the app runs at the same time across all sessions
+    background_workers: int = 4
+    # Speculatively generate the next random combination's "title" (or "title"
+    # and "script") after a trailer finished; "off" disables it
+    prefetch: str = "off"
+    # Speculative generations allowed per session
+    prefetch_budget: int = 5
+    # Pre-generated trailers kept ready per genre (0 disables the pool)
+    trailer_pool_size: int = 0
+    # Genres kept in the pool; empty means every genre
+    trailer_pool_genres: Tuple[str, ...] = ()
+    # LLM used for refills (defaults to openrouter_default_model)
+    trailer_pool_model: Optional[str] = None
+    # Local Ollama server (OpenAI-compatible endpoint) and the preselected model
+    ollama_base_url: str = "http://localhost:11434/v1"
+    ollama_api_key: str = "ollama"
+    ollama_default_model: str = "llama3.2:3b"
+    # How long Ollama keeps a model loaded after its last use ("30m", "-1" for
+    # ever), and overrides by model name
+    ollama_keep_alive: str = "30m"
+    ollama_keep_alive_models: Mapping[str, str] = field(default_factory=dict)
+    # Models loaded as soon as the app starts
+    ollama_preload_models: Tuple[str, ...] = ()
+    # The server's OLLAMA_NUM_PARALLEL / OLLAMA_MAX_LOADED_MODELS; requests are
+    # admitted within these limits (None reads the env vars, else 1)
+    ollama_num_parallel: Optional[int] = None
+    ollama_max_loaded_models: Optional[int] = None
+    # Models as good as ollama_default_model; whichever is loaded is preselected
+    ollama_acceptable_models: Tuple[str, ...] = ()
+    # Most combinations per bulk title request in batch runs (1 disables bulk)
+    title_batch_size: int = 16
+    # Token limits by model name, e.g. {"llama3.2:3b": {"context": 4096,
+    # "output": 1024}}; unlisted models get conservative defaults
+    model_token_limits: Mapping[str, Mapping[str, int]] = field(default_factory=dict)
 
     # Added OpenRouter model list and default
-    openrouter_model_list: List[str] = field(
-        default_factory=lambda: [
-            "deepseek/deepseek-chat-v3-0324:free",
-            "mistralai/mistral-small-3.1-24b-instruct:free",
-            "google/gemma-3-4b-it:free",
-        ]
+    openrouter_model_list: Tuple[str, ...] = (
+        "deepseek/deepseek-chat-v3-0324:free",
+        "mistralai/mistral-small-3.1-24b-instruct:free",
+        "google/gemma-3-4b-it:free",
     )
     openrouter_default_model: Optional[str] = "deepseek/deepseek-chat-v3-0324:free"
 
+    def __post_init__(self) -> None:
+        # Also covers values passed in by overrides and replace()
+        for f in dataclasses.fields(self):
+            object.__setattr__(self, f.name, _freeze(getattr(self, f.name)))
+
     @classmethod
-    def load(cls) -> "Config":
+    def load(
+        cls,
+        secrets: Optional[Mapping[str, Any]] = None,
+        env: Optional[Mapping[str, str]] = None,
+        overrides: Optional[Mapping[str, Any]] = None,
+        secrets_path: str = DEFAULT_SECRETS_PATH,
+    ) -> "Config":
         """
-        Load configuration settings, prioritizing environment variables over Streamlit secrets.
+        Builds a configuration snapshot from layered sources.
+
+        Later layers win: class defaults, then the secrets TOML file (the same
+        ``.streamlit/secrets.toml`` Streamlit reads), then environment variables,
+        then ``overrides`` (e.g. from the command line). Streamlit is not needed.
 
         Loads the following settings if available:
-        - openrouter_api_key: From OPENROUTER_API_KEY env var or st.secrets.openrouter_api_key.
-        - openrouter_model_list: From st.secrets.openrouter_model_list. Defaults factory if not found.
-        - openrouter_default_model: From st.secrets.openrouter_default_model, falling back
-          to the deprecated st.secrets.openrouter_model if necessary. Uses class default otherwise.
+        - openrouter_api_key: From OPENROUTER_API_KEY env var or the openrouter_api_key secret.
+        - openrouter_api_keys / elevenlabs_api_keys: Comma-separated from the
+          OPENROUTER_API_KEYS / ELEVENLABS_API_KEYS env vars or lists in the secrets.
+        - elevenlabs_api_key: From ELEVENLABS_API_KEY env var or secret.
+        - key_selection: From the key_selection secret.
+        - rate_limits: From the rate_limits secret, a table of providers holding
+          ``resource = [capacity, window_seconds]`` entries.
+        - openrouter_model_list: From the openrouter_model_list secret. Defaults factory if not found.
+        - openrouter_default_model: From the openrouter_default_model secret, falling back
+          to the deprecated openrouter_model secret if necessary. Uses class default otherwise.
+        - tts_output_format: From the tts_output_format secret.
+        - media_server_host / media_server_port: From the secrets.
+        - artifact_* settings and keep_intermediates: From the secrets; the S3
+          endpoint can also come from the ARTIFACT_S3_ENDPOINT_URL env var.
+        - media_base_url: From MEDIA_BASE_URL env var or the media_base_url secret.
+        - music_library_dir: From MUSIC_LIBRARY_DIR env var or the music_library_dir secret.
+        - music_fit_mode: From MUSIC_FIT_MODE env var or the music_fit_mode secret.
+        - music_ducking: From the music_ducking secret.
+        - target_lufs: From the target_lufs secret.
+        - background_workers: From the background_workers secret.
+        - prefetch / prefetch_budget: From the secrets.
+        - trailer_pool_size / trailer_pool_genres / trailer_pool_model: From the secrets.
+        - ollama_base_url / ollama_api_key: From the OLLAMA_BASE_URL /
+          OLLAMA_API_KEY env vars or the secrets.
+        - ollama_default_model / ollama_keep_alive / ollama_keep_alive_models /
+          ollama_preload_models / ollama_acceptable_models: From the secrets.
+        - ollama_num_parallel / ollama_max_loaded_models: From the
+          OLLAMA_NUM_PARALLEL / OLLAMA_MAX_LOADED_MODELS env vars or the secrets.
+        - title_batch_size / model_token_limits: From the secrets.
+
+        Args:
+            secrets (Mapping, optional): Secrets to use instead of reading secrets_path.
+            env (Mapping, optional): Environment to use instead of os.environ.
+            overrides (Mapping, optional): Field values that take precedence over
+                everything else.
+            secrets_path (str, optional): TOML file read when ``secrets`` is omitted.
 
         Returns:
             Config: An instance of the Config class populated with loaded settings.
         """
+        secrets = read_secrets(secrets_path) if secrets is None else secrets
+        env = os.environ if env is None else env
         config_data: Dict[str, Any] = {}
 
-        # --- API Key ---
-        # Try env var first
-        openrouter_key = os.getenv("OPENROUTER_API_KEY")
-        if openrouter_key:
-            config_data["openrouter_api_key"] = openrouter_key
-        # Fall back to secrets
-        elif hasattr(st.secrets, "openrouter_api_key"):
-            config_data["openrouter_api_key"] = st.secrets.openrouter_api_key
+        # --- API Keys ---
+        # Env var first, then secrets
+        for name, env_name, secret_name in (
+            ("openrouter_api_key", "OPENROUTER_API_KEY", "openrouter_api_key"),
+            ("elevenlabs_api_key", "ELEVENLABS_API_KEY", "ELEVENLABS_API_KEY"),
+        ):
+            if env.get(env_name):
+                config_data[name] = env[env_name]
+            elif secret_name in secrets:
+                config_data[name] = secrets[secret_name]
+
+        # --- Key pools ---
+        for name in ("openrouter_api_keys", "elevenlabs_api_keys"):
+            env_keys = env.get(name.upper())
+            if env_keys:
+                config_data[name] = [k.strip() for k in env_keys.split(",") if k.strip()]
+            elif isinstance(secrets.get(name), list):
+                config_data[name] = list(secrets[name])
 
         # --- Model List ---
-        # Load from secrets if available
-        if hasattr(st.secrets, "openrouter_model_list") and isinstance(
-            st.secrets.openrouter_model_list, list
-        ):
-            config_data["openrouter_model_list"] = st.secrets.openrouter_model_list
+        if isinstance(secrets.get("openrouter_model_list"), list):
+            config_data["openrouter_model_list"] = list(secrets["openrouter_model_list"])
 
         # --- Default Model ---
-        # Load from secrets if available
-        if hasattr(st.secrets, "openrouter_default_model"):
-            config_data["openrouter_default_model"] = (
-                st.secrets.openrouter_default_model
-            )
+        if "openrouter_default_model" in secrets:
+            config_data["openrouter_default_model"] = secrets["openrouter_default_model"]
         # Deprecated fallback (for backward compatibility)
-        elif hasattr(st.secrets, "openrouter_model"):
-            config_data["openrouter_default_model"] = st.secrets.openrouter_model
+        elif "openrouter_model" in secrets:
+            config_data["openrouter_default_model"] = secrets["openrouter_model"]
+
+        # --- Settings read from the secrets only ---
+        for name in (
+            "key_selection",
+            "artifact_backend",
+            "artifact_root",
+            "artifact_s3_bucket",
+            "artifact_s3_prefix",
+            "artifact_s3_endpoint_url",
+            "artifact_max_age_days",
+            "artifact_max_total_mb",
+            "keep_intermediates",
+            "media_server_host",
+            "media_base_url",
+            "tts_output_format",
+            "music_library_dir",
+            "music_fit_mode",
+            "target_lufs",
+            "prefetch",
+            "trailer_pool_model",
+            "ollama_base_url",
+            "ollama_api_key",
+            "ollama_default_model",
+        ):
+            if name in secrets:
+                config_data[name] = secrets[name]
+        if "media_server_port" in secrets:
+            config_data["media_server_port"] = int(secrets["media_server_port"])
+        for name in (
+            "trailer_pool_genres",
+            "ollama_preload_models",
+            "ollama_acceptable_models",
+        ):
+            if isinstance(secrets.get(name), list):
+                config_data[name] = list(secrets[name])
+        if "ollama_keep_alive" in secrets:
+            config_data["ollama_keep_alive"] = str(secrets["ollama_keep_alive"])
+        if isinstance(secrets.get("ollama_keep_alive_models"), Mapping):
+            config_data["ollama_keep_alive_models"] = {
+                model: str(keep_alive)
+                for model, keep_alive in secrets["ollama_keep_alive_models"].items()
+            }
+        if isinstance(secrets.get("rate_limits"), Mapping):
+            config_data["rate_limits"] = {
+                provider: {
+                    resource: (float(limit[0]), float(limit[1]))
+                    for resource, limit in resources.items()
+                }
+                for provider, resources in secrets["rate_limits"].items()
+            }
+        if isinstance(secrets.get("model_token_limits"), Mapping):
+            config_data["model_token_limits"] = {
+                model: {name: int(value) for name, value in limits.items()}
+                for model, limits in secrets["model_token_limits"].items()
+            }
+        for name in (
+            "background_workers",
+            "prefetch_budget",
+            "trailer_pool_size",
+            "title_batch_size",
+            "ollama_num_parallel",
+            "ollama_max_loaded_models",
+        ):
+            if name in secrets:
+                config_data[name] = int(secrets[name])
+        for name in ("ollama_num_parallel", "ollama_max_loaded_models"):
+            if env.get(name.upper()):
+                config_data[name] = int(env[name.upper()])
+        if "music_ducking" in secrets:
+            config_data["music_ducking"] = bool(secrets["music_ducking"])
 
+        # --- Settings that env vars can override ---
+        for name in (
+            "artifact_s3_endpoint_url",
+            "media_base_url",
+            "music_library_dir",
+            "music_fit_mode",
+            "ollama_base_url",
+            "ollama_api_key",
+        ):
+            if env.get(name.upper()):
+                config_data[name] = env[name.upper()]
+
+        config_data.update(overrides or {})
         return cls(**config_data)
 
+    def replace(self, **changes: Any) -> "Config":
+        """Returns a copy of this snapshot with some fields changed."""
+        return dataclasses.replace(self, **changes)
+
+    def retention_policy(self) -> RetentionPolicy:
+        """Returns the artifact retention limits as a RetentionPolicy."""
+        return RetentionPolicy(
+            max_age_seconds=(
+                self.artifact_max_age_days * 86400
+                if self.artifact_max_age_days is not None
+                else None
+            ),
+            max_total_bytes=(
+                int(self.artifact_max_total_mb * 1_000_000)
+                if self.artifact_max_total_mb is not None
+                else None
+            ),
+        )
+
+    def artifact_store(self) -> ArtifactStore:
+        """Returns the artifact store configured by the artifact_* settings."""
+        return create_store(
+            backend=self.artifact_backend,
+            root=self.artifact_root,
+            bucket=self.artifact_s3_bucket,
+            prefix=self.artifact_s3_prefix,
+            endpoint_url=self.artifact_s3_endpoint_url,
+        )
+
+    def key_pool(self, provider: str) -> KeyPool:
+        """
+        Returns the process-wide key pool of a provider, holding the single
+        configured key followed by the additional pooled keys.
+
+        Args:
+            provider (str): "openrouter" or "elevenlabs".
+        """
+        if provider == "openrouter":
+            keys = [self.openrouter_api_key, *self.openrouter_api_keys]
+        elif provider == "elevenlabs":
+            keys = [self.elevenlabs_api_key, *self.elevenlabs_api_keys]
+        else:
+            raise ValueError(f"Unknown provider: {provider}")
+        # Pools rank keys by the limiter's wait, so apply the limits first
+        self.rate_limiter()
+        return get_key_pool(provider, keys, self.key_selection)
+
+    def rate_limiter(self) -> RateLimiter:
+        """
+        Returns the process-wide rate limiter with the default limits updated by
+        the rate_limits setting.
+        """
+        return get_rate_limiter(merge_limits(self.rate_limits))
+
+    def ollama_manager(self) -> OllamaManager:
+        """
+        Returns the process-wide manager keeping models loaded on the configured
+        Ollama server.
+        """
+        return get_ollama_manager(
+            ollama_host(self.ollama_base_url),
+            self.ollama_keep_alive,
+            self.ollama_keep_alive_models,
+        )
+
+    def ollama_scheduler(self) -> OllamaScheduler:
+        """
+        Returns the process-wide scheduler of requests to the configured Ollama
+        server, with the configured parallelism limits.
+        """
+        return get_ollama_scheduler(
+            ollama_host(self.ollama_base_url),
+            self.ollama_num_parallel,
+            self.ollama_max_loaded_models,
+        )
+
     def is_valid(self) -> bool:
         """Check if the configuration is valid (primarily API key)."""
-        return bool(self.openrouter_api_key)
+        return bool(self.openrouter_api_key or self.openrouter_api_keys)
+
+
+def _freeze(value: Any) -> Any:
+    """Returns lists as tuples and dicts as read-only mappings, recursively."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    return value
+
+
+def read_secrets(path: str = DEFAULT_SECRETS_PATH) -> Dict[str, Any]:
+    """
+    Reads a secrets TOML file; a missing file gives no secrets.
+
+    Raises:
+        ValueError: If the file is not valid TOML. Falling back to no secrets
+            would silently drop every setting.
+    """
+    try:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"Could not parse {path}: {e}") from e
+
+
+_SECRET_LINE = re.compile(r"^\s*([A-Za-z0-9_-]+)\s*=")
+
+
+def update_secrets(values: Mapping[str, str], path: str = DEFAULT_SECRETS_PATH) -> None:
+    """
+    Sets top-level string secrets, leaving the rest of the file untouched.
+
+    Only the ``name = "value"`` lines for the given names are rewritten (or
+    added before the first table), so comments, lists and tables survive. The
+    result is parsed before it replaces the file.
+
+    Args:
+        values (Mapping): Secret names and their new string values.
+        path (str, optional): Secrets TOML file.
+
+    Raises:
+        ValueError: If the existing file or the updated one is not valid TOML.
+    """
+    read_secrets(path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = []
+
+    pending = dict(values)
+    first_table = len(lines)
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith("["):
+            first_table = i
+            break
+        match = _SECRET_LINE.match(line)
+        if match and match.group(1) in pending:
+            name = match.group(1)
+            lines[i] = f"{name} = {json.dumps(pending.pop(name))}"
+    lines[first_table:first_table] = [
+        f"{name} = {json.dumps(value)}" for name, value in pending.items()
+    ]
+
+    content = "\n".join(lines) + "\n"
+    try:
+        tomllib.loads(content)
+    except tomllib.TOMLDecodeError as e:
+        raise ValueError(f"Could not update {path}: {e}") from e
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".secrets-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def parse_overrides(items: List[str]) -> Dict[str, Any]:
+    """
+    Parses ``name=value`` command line overrides.
+
+    Values are read as TOML (``target_lufs=-14``, ``music_ducking=false``,
+    ``openrouter_api_keys=["a", "b"]``) and fall back to plain strings.
+    """
+    overrides = {}
+    for item in items:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Expected name=value, got: {item}")
+        name = name.strip()
+        if name not in {f.name for f in dataclasses.fields(Config)}:
+            raise ValueError(f"Unknown setting: {name}")
+        try:
+            overrides[name] = tomllib.loads(f"value = {value}")["value"]
+        except tomllib.TOMLDecodeError:
+            overrides[name] = value
+    return overrides
+
+
+_config: Optional[Config] = None
+_config_signature: Optional[tuple] = None
+_config_overrides: Dict[str, Any] = {}
+_config_lock = threading.Lock()
+_secrets_source: Optional[Callable[[], Optional[Mapping[str, Any]]]] = None
+
+
+def set_secrets_source(
+    source: Optional[Callable[[], Optional[Mapping[str, Any]]]],
+) -> None:
+    """
+    Makes get_config() and reload_config() take their secrets from ``source``
+    instead of reading the secrets file.
+
+    The Streamlit adapter registers st.secrets this way, which also covers
+    ``~/.streamlit/secrets.toml`` and secrets set in Streamlit Community Cloud.
+    When ``source`` returns None the secrets file is read as usual.
+    """
+    global _secrets_source
+    _secrets_source = source
+
+
+def _source_secrets() -> Optional[Mapping[str, Any]]:
+    return _secrets_source() if _secrets_source is not None else None
+
+
+def secrets_signature(path: str = DEFAULT_SECRETS_PATH) -> tuple:
+    """Returns a value that changes whenever the secrets file is edited."""
+    try:
+        stat = os.stat(path)
+        return (path, stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return (path, None, None)
+
+
+def get_config(secrets_path: str = DEFAULT_SECRETS_PATH) -> Config:
+    """
+    Returns the process-wide configuration snapshot.
+
+    The snapshot is built on first use and rebuilt only when the secrets file
+    changes (e.g. after the API Keys page saved it) or reload_config() is called.
+    """
+    global _config, _config_signature
+    signature = secrets_signature(secrets_path)
+    with _config_lock:
+        if _config is None or signature != _config_signature:
+            _config = Config.load(
+                secrets=_source_secrets(),
+                secrets_path=secrets_path,
+                overrides=_config_overrides,
+            )
+            _config_signature = signature
+        return _config
+
 
+def reload_config(
+    secrets_path: str = DEFAULT_SECRETS_PATH,
+    overrides: Optional[Mapping[str, Any]] = None,
+) -> Config:
+    """
+    Rebuilds the process-wide snapshot, e.g. after the environment changed.
 
-# Global configuration instance (Consider removing/refactoring)
-# config = Config.load() # Removing the global instance creation here
+    Args:
+        secrets_path (str, optional): Secrets TOML file.
+        overrides (Mapping, optional): Settings that win over every other source,
+            such as command line overrides for a headless run. They stay in
+            effect until the next reload_config() call.
+    """
+    global _config, _config_signature, _config_overrides
+    with _config_lock:
+        _config_overrides = dict(overrides or {})
+        _config_signature = secrets_signature(secrets_path)
+        _config = Config.load(
+            secrets=_source_secrets(),
+            secrets_path=secrets_path,
+            overrides=_config_overrides,
+        )
+        return _config
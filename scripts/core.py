@@ -0,0 +1,1006 @@
+"""
+Streamlit-free core of the trailer pipeline: trailer elements, title and
+script generation, TTS, mixing, artifact storage and generation history.
+
+Failures are raised as PipelineError subclasses instead of being shown in the
+UI, so workers, batch jobs and tests can use this module without importing
+Streamlit. scripts/functions.py adapts these functions for the app.
+"""
+
+import io
+import os
+import json
+import time
+import math
+import sqlite3
+import re
+from datetime import datetime
+import subprocess
+from scripts import (
+    music_library,
+    artifact_catalog,
+    artifact_store,
+    generation_log,
+    prompts,
+    rate_limiter,
+    script_validation,
+    single_flight,
+)
+from scripts import config as config_module
+from scripts.key_pool import NoAvailableKeyError
+from scripts.lazy_import import lazy_import
+from utils.llm_api import call_llm
+
+# Imported on first use to keep worker start-up fast
+requests = lazy_import("requests")
+pydub = lazy_import("pydub", "mixing audio")
+audio_engine = lazy_import("scripts.audio_engine")
+
+
+class PipelineError(Exception):
+    """Base class for errors of the generation pipeline."""
+
+
+class TTSError(PipelineError):
+    """Raised when speech synthesis fails."""
+
+
+class MixingError(PipelineError):
+    """Raised when the voice-over cannot be mixed with background music."""
+
+
+class OllamaError(PipelineError):
+    """Raised when the local Ollama installation cannot be used."""
+
+
+class GenerationError(PipelineError):
+    """Raised when the LLM returns no usable title or script."""
+
+
+def get_trailer_points():
+    """
+    Retrieves trailer elements from JSON files in the assets/data directory.
+
+    Returns:
+        list: A list of dictionaries, where each dictionary represents a trailer element
+              (genre, main_character, setting, conflict, plot_twist) and contains
+              its category and options.
+    """
+    category_order = ["genre", "main_character", "setting", "conflict", "plot_twist"]
+    trailer_points = []
+    data_dir = "assets/data"
+
+    for category in category_order:
+        filename = f"{category}.json"
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            trailer_points.append(json.load(f))
+
+    return trailer_points
+
+
+def generate_audio_with_elevenlabs(
+    text, voice_id="FF7KdobWPaiR0vkcALHF", output_format="mp3_44100_128", key_pool=None
+):
+    """
+    Generates speech audio from text using the ElevenLabs API.
+
+    Sends a request to the ElevenLabs text-to-speech endpoint with the provided
+    text and voice ID. Handles potential API errors and returns the audio content.
+
+    Args:
+        text (str): The text content to convert to speech.
+        voice_id (str, optional): The ElevenLabs voice ID to use.
+                                Defaults to "FF7KdobWPaiR0vkcALHF".
+        output_format (str, optional): ElevenLabs output format. "pcm_<rate>"
+                                returns raw 16-bit mono PCM that the mixer can use
+                                without decoding. Defaults to "mp3_44100_128".
+        key_pool (KeyPool, optional): Pool of ElevenLabs keys to spread the call
+                                over. Defaults to the pool from Config.
+
+    Concurrent requests for the same text, voice, format and key pool share
+    one call.
+
+    Returns:
+        bytes: The generated audio content.
+
+    Raises:
+        TTSError: If no key is available, the rate limit leaves no capacity or
+                  the request fails.
+    """
+    # Requests through different key pools are not shared, so one pool's
+    # quota errors never reach callers of another
+    pool_id = id(key_pool) if key_pool is not None else None
+    key = single_flight.request_key(
+        "elevenlabs", text, voice_id, output_format, pool_id
+    )
+    return single_flight.get_single_flight("tts").do(
+        key, _synthesize_speech, text, voice_id, output_format, key_pool
+    )
+
+
+def _synthesize_speech(text, voice_id, output_format, key_pool):
+    """Makes one ElevenLabs call for generate_audio_with_elevenlabs."""
+    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    config = config_module.get_config()
+    key_pool = key_pool or config.key_pool("elevenlabs")
+    data = {
+        "text": text,
+        "model_id": "eleven_turbo_v2_5",
+        "voice_settings": {"stability": 0.7, "similarity_boost": 0.6},
+    }
+
+    limiter = config.rate_limiter()
+    try:
+        # The lease reports 429/401/403 responses so exhausted keys cool down;
+        # a pacing timeout is not held against the key
+        with key_pool.lease() as api_key:
+            headers = {
+                "Accept": "audio/mpeg" if output_format.startswith("mp3") else "audio/*",
+                "Content-Type": "application/json",
+                "xi-api-key": api_key,
+            }
+            # Pace by requests and by the characters billed against the quota
+            limiter.acquire(
+                "elevenlabs",
+                api_key,
+                timeout=rate_limiter.DEFAULT_MAX_WAIT,
+                requests=1,
+                characters=len(text),
+            )
+            response = requests.post(
+                url,
+                json=data,
+                headers=headers,
+                params={"output_format": output_format},
+                timeout=60,
+            )
+            limiter.observe("elevenlabs", api_key, response.headers)
+            response.raise_for_status()
+            return response.content
+    except (
+        NoAvailableKeyError,
+        rate_limiter.RateLimitTimeout,
+        requests.exceptions.RequestException,
+    ) as e:
+        raise TTSError(f"Error generating audio: {e}") from e
+
+
+def final_key_for(voice_key):
+    """
+    Returns the file name of the final mix of a voice-over.
+
+    The "voiceover_" prefix becomes "final_"; other names get "final_" in front,
+    so the mix never shares the voice-over's name.
+    """
+    prefix = "voiceover_"
+    if voice_key.startswith(prefix):
+        voice_key = voice_key[len(prefix) :]
+    return f"final_{voice_key}"
+
+
+def save_audio_file(
+    audio_content, selected_points, movie_name, audio_format="mp3", store=None, key=None
+):
+    """Save voice-over audio with descriptive filename.
+
+    Args:
+        audio_content (bytes): The audio content to save
+        selected_points (dict): Dictionary of selected trailer elements
+        movie_name (str): Name of the movie
+        audio_format (str, optional): Format of audio_content. Raw PCM
+            ("pcm_<rate>") is encoded to MP3 so the artifact is always an MP3.
+        store (ArtifactStore, optional): Where to save the file. Defaults to a
+            filesystem store in generated_audio/.
+        key (str, optional): File name to save under instead of the timestamped
+            default, e.g. an idempotent name used by batch jobs.
+
+    Returns:
+        str: Path (or store location) of the saved audio file
+    """
+    store = store or artifact_store.FilesystemArtifactStore("generated_audio")
+
+    if key:
+        filename = key
+    else:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"voiceover_{movie_name}_{timestamp}.mp3"
+
+    if audio_engine.pcm_frame_rate(audio_format) is not None:
+        buffer = io.BytesIO()
+        audio_engine.segment_from_bytes(audio_content, audio_format).export(
+            buffer, format="mp3"
+        )
+        audio_content = buffer.getvalue()
+    location = store.put(filename, audio_content)
+
+    local_path = store.local_path(filename)
+    if local_path:
+        _record_artifact(
+            local_path, movie_name=movie_name, selected_points=selected_points
+        )
+    return location
+
+
+def _record_artifact(path, **kwargs):
+    """Adds a saved file to the artifact catalog without failing the save."""
+    try:
+        artifact_catalog.record_artifact(path, **kwargs)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: could not update artifact catalog for {path}: {e}")
+
+
+def _remove_from_catalog(paths):
+    """Removes deleted files from the artifact catalog without failing the caller."""
+    try:
+        artifact_catalog.remove_artifacts(paths)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Warning: could not update artifact catalog: {e}")
+
+
+_last_retention_run = 0.0
+
+
+def enforce_artifact_retention(store, policy, min_interval=3600):
+    """
+    Applies a retention policy to the artifact store, at most once per interval.
+
+    Listing a large store is not free, so this is throttled per process. The
+    artifact catalog is resynced when files were deleted.
+
+    Args:
+        store (ArtifactStore): The store to clean up.
+        policy (RetentionPolicy): Age and size limits.
+        min_interval (float, optional): Minimum seconds between runs.
+
+    Returns:
+        list[str]: Keys of the deleted artifacts.
+    """
+    global _last_retention_run
+    if policy.max_age_seconds is None and policy.max_total_bytes is None:
+        return []
+    if time.time() - _last_retention_run < min_interval:
+        return []
+    _last_retention_run = time.time()
+
+    deleted = store.enforce_retention(policy)
+    if deleted and isinstance(store, artifact_store.FilesystemArtifactStore):
+        try:
+            artifact_catalog.sync_directory(store.root)
+        except (sqlite3.Error, OSError) as e:
+            print(f"Warning: could not resync artifact catalog: {e}")
+    return deleted
+
+
+def save_movie_data(movie_name, script, selected_points=None, **details):
+    """
+    Appends a generated movie (name and script) to the generation history.
+
+    Earlier versions overwrote ``assets/data/movie_data.json`` with only the last
+    run; every generation is now kept in the append-only log.
+
+    Args:
+        movie_name (str): The name of the movie.
+        script (str): The movie trailer script.
+        selected_points (dict, optional): The trailer elements used.
+        **details: Further GenerationRecord fields (model, prompts, timings, token counts).
+
+    Returns:
+        str: The id of the logged generation.
+    """
+    record = generation_log.GenerationRecord(
+        elements=selected_points or {},
+        movie_name=movie_name,
+        script=script,
+        **details,
+    )
+    return generation_log.log_generation(record)
+
+
+def log_generation_artifact(generation_id, kind, path):
+    """
+    Links a saved artifact to its generation, without failing the caller.
+
+    Args:
+        generation_id (str): Id returned by save_movie_data.
+        kind (str): "voiceover" or "final".
+        path (str): Location of the artifact.
+    """
+    if not generation_id or not path:
+        return
+    try:
+        generation_log.log_artifact(generation_id, kind, path)
+    except sqlite3.Error as e:
+        print(f"Warning: could not log artifact {path}: {e}")
+
+
+def get_ollama_models():
+    """
+    Lists the Ollama models installed on the system.
+
+    Returns:
+        list: A list of strings, where each string is the name of an installed Ollama model.
+
+    Raises:
+        OllamaError: If Ollama is not installed or listing the models fails.
+    """
+    try:
+        result = subprocess.run(
+            ["ollama", "list"], capture_output=True, text=True, check=True
+        )
+        models = []
+        for line in result.stdout.splitlines():
+            if line.strip():
+                parts = line.split()
+                if len(parts) > 0:
+                    models.append(parts[0].strip())
+        return models
+    except FileNotFoundError as e:
+        raise OllamaError(
+            "Ollama is not installed. Please install Ollama and try again."
+        ) from e
+    except subprocess.CalledProcessError as e:
+        raise OllamaError(f"Error listing Ollama models: {e}") from e
+
+
+def apply_background_music(
+    audio_filepath,
+    fit_mode="stretch",
+    music_path=None,
+    ducking=False,
+    target_lufs=None,
+    genre=None,
+    music_dir=music_library.DEFAULT_MUSIC_DIR,
+    voice_audio=None,
+    voice_format="mp3",
+    store=None,
+    keep_intermediates=True,
+):
+    """Mix voice-over with background music, fitting the music to the voice-over length.
+
+    Args:
+        audio_filepath (str): Path to voice-over audio file
+        fit_mode (str, optional): How the music is fitted to the voice-over, one of
+            audio_engine.FIT_MODES. "stretch" resamples the whole bed, "loop" loops
+            and trims slices of the cached decoded bed without resampling.
+        music_path (str, optional): Path to the background music file. When omitted
+            a bed is picked from the music library by genre and duration.
+        ducking (bool, optional): Lower the music further while the voice-over is
+            speaking, on top of the flat background volume.
+        target_lufs (float, optional): Integrated loudness (LUFS) of the final mix.
+            When set, the bed is levelled against the voice-over using its cached
+            loudness and the mix is normalized to this target.
+        genre (str, optional): Genre element used to pick a bed from the library.
+        music_dir (str, optional): Directory of the music library.
+        voice_audio (bytes-like, optional): The voice-over as returned by the TTS
+            provider. When given it is mixed straight from memory and
+            audio_filepath is only used to name the output.
+        voice_format (str, optional): Format of voice_audio, e.g. "mp3" or
+            "pcm_44100".
+        store (ArtifactStore, optional): Where to save the mix. When omitted the
+            mix is written next to the voice-over file.
+        keep_intermediates (bool, optional): When False, the voice-over is deleted
+            from the store once the final mix has been saved.
+
+    Returns:
+        str: Path to mixed audio file
+
+    Raises:
+        MixingError: If no music bed is found, the voice-over is missing or
+            decoding, mixing or saving fails.
+    """
+    try:
+        if voice_audio is not None:
+            voice_over = audio_engine.segment_from_bytes(voice_audio, voice_format)
+        else:
+            voice_over = pydub.AudioSegment.from_mp3(audio_filepath)
+
+        tempo = None
+        if music_path is None:
+            track = music_library.select_track(
+                music_library.scan_library(music_dir),
+                genre=genre,
+                duration_ms=len(voice_over),
+            )
+            if track is None:
+                raise MixingError(f"No background music found in {music_dir}")
+            music_path, tempo = track.path, track.tempo
+
+        if fit_mode == "loop":
+            bed = audio_engine.load_music_bed(music_path)
+            if bed.frames == 0:
+                raise MixingError(f"Background music is empty: {music_path}")
+            target_frames = audio_engine.ms_to_frames(len(voice_over), bed.frame_rate)
+            stretched = audio_engine.buffer_to_segment(
+                audio_engine.fit_loop(bed, target_frames, tempo=tempo)
+            )
+        else:
+            background = pydub.AudioSegment.from_file(music_path)
+            if len(background) == 0:
+                raise MixingError(f"Background music is empty: {music_path}")
+
+            # Stretch background music to match voice-over length
+            ratio = len(voice_over) / len(background)
+            if ratio > 1:
+                # If voice-over is longer, slow down the background music
+                stretched = background._spawn(
+                    background.raw_data,
+                    overrides={"frame_rate": int(background.frame_rate * ratio)},
+                ).set_frame_rate(background.frame_rate)
+            else:
+                # If voice-over is shorter, speed up the background music
+                stretched = pydub.effects.speedup(background, playback_speed=1 / ratio)
+
+        # Lower the volume of background music to not overpower voice-over
+        background_volume = (
+            -5
+        )  # Adjust this value to control background music volume (in dB)
+
+        if ducking or target_lufs is not None:
+            voice_over, stretched = pydub.AudioSegment._sync(voice_over, stretched)
+            voice = audio_engine.segment_to_buffer(voice_over)
+            music = audio_engine.segment_to_buffer(stretched)
+            bed_gain = background_volume
+            if target_lufs is not None:
+                # Sit the bed background_volume dB under the voice-over, using the
+                # cached loudness of the bed instead of measuring it every time
+                voice_lufs = audio_engine.integrated_loudness(voice)
+                bed_lufs = audio_engine.bed_loudness(music_path)
+                if math.isfinite(voice_lufs) and math.isfinite(bed_lufs):
+                    bed_gain += voice_lufs - bed_lufs
+            music = audio_engine.apply_gain(music, bed_gain)
+            if ducking:
+                music = audio_engine.duck(music, voice)
+            mixed = audio_engine.mix(voice, music)
+            if target_lufs is not None:
+                mixed = audio_engine.normalize_loudness(mixed, target_lufs)
+            mixed = audio_engine.buffer_to_segment(mixed)
+        else:
+            mixed = voice_over.overlay(stretched + background_volume, position=0)
+
+        # Save the mix
+        if voice_audio is None and not os.path.exists(audio_filepath):
+            raise MixingError(f"Audio file not found: {audio_filepath}")
+
+        buffer = io.BytesIO()
+        mixed.export(buffer, format="mp3")
+        voice_key = os.path.basename(audio_filepath)
+        final_key = final_key_for(voice_key)
+        if store is not None:
+            output_path = store.put(final_key, buffer.getvalue())
+            local_path = store.local_path(final_key)
+        else:
+            output_path = local_path = os.path.join(
+                os.path.dirname(audio_filepath), final_key
+            )
+            with open(output_path, "wb") as f:
+                f.write(buffer.getvalue())
+
+        if local_path:
+            _record_artifact(
+                local_path, duration_ms=len(mixed), source_path=audio_filepath
+            )
+        if store is not None and not keep_intermediates:
+            if store.collect_intermediates(final_key, [voice_key]):
+                _remove_from_catalog([audio_filepath])
+        return output_path
+    except MixingError:
+        raise
+    except Exception as e:
+        raise MixingError(f"Error applying background music: {e}") from e
+
+
+def generate_script_with_ollama(prompt, model_name=None, config=None):
+    """
+    Generates text (e.g., a script) using a local Ollama model via its API.
+
+    Sends a request to the Ollama API's generate endpoint with the specified
+    model and prompt, with the configured keep_alive so the model stays loaded
+    for the next request. Handles potential API errors and returns the
+    generated text.
+
+    Args:
+        prompt (str): The input prompt to send to the Ollama model.
+        model_name (str, optional): Model to use. Defaults to
+            Config.ollama_default_model.
+        config (Config, optional): Server and keep_alive settings. Defaults to
+            the process-wide snapshot.
+
+    Returns:
+        str: The generated text response from Ollama.
+
+    Raises:
+        OllamaError: If the request fails.
+    """
+    config = config or config_module.get_config()
+    model_name = model_name or config.ollama_default_model
+    manager = config.ollama_manager()
+    url = f"{manager.host}/api/generate"
+    data = {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": manager.keep_alive_for(model_name),
+    }
+
+    try:
+        with config.ollama_scheduler().slot(model_name):
+            response = requests.post(url, json=data)
+        response.raise_for_status()
+        response_data = response.json()
+        return response_data.get("response", "")
+    except (requests.exceptions.RequestException, TimeoutError) as e:
+        raise OllamaError(f"Error calling Ollama API: {e}") from e
+
+
+def _report(report, progress, message):
+    if report is not None:
+        report(progress, message)
+
+
+# (base_url, model) pairs that rejected a JSON schema response_format
+_SCHEMALESS_MODELS = set()
+# How a provider's 400/422 says it does not take the schema, as opposed to
+# rejecting something else about the request
+_SCHEMA_REJECTION = re.compile(r"response_format|json_schema|schema", re.IGNORECASE)
+
+# Assumed when a model's limits are not configured; Ollama's default context
+# window is the smallest in use
+DEFAULT_CONTEXT_TOKENS = 4096
+DEFAULT_OUTPUT_TOKENS = 1024
+MAX_TITLE_BATCH = 16
+# Rough token cost of one combination in a bulk title prompt and its answer
+_BULK_ITEM_PROMPT_TOKENS = 60
+_BULK_ITEM_OUTPUT_TOKENS = 25
+
+
+def _add_usage(total, usage):
+    if total is not None:
+        for name, count in usage.items():
+            total[name] = total.get(name, 0) + count
+
+
+def _call_with_schema(response_format, structured, plain, request):
+    """
+    Calls call_llm with a JSON schema response_format, or without it for
+    models whose provider rejected schemas before.
+
+    Args:
+        response_format (dict): The schema response_format.
+        structured (tuple): (template, fields) used with the schema.
+        plain (tuple): (template, fields) used without it.
+        request (dict): The remaining call_llm arguments.
+    """
+    key = (request["base_url"], request["model_name"])
+    if key not in _SCHEMALESS_MODELS:
+        template, fields = structured
+        try:
+            return call_llm(
+                prompt=template.render(**fields),
+                system=template.system,
+                response_format=response_format,
+                **request,
+            )
+        except Exception as e:
+            # 400/422 naming the schema: the provider or model does not take it
+            if getattr(e, "status_code", None) not in (400, 422):
+                raise
+            if not _SCHEMA_REJECTION.search(f"{e} {getattr(e, 'body', '')}"):
+                raise
+            print(f"Warning: {key[1]} rejected structured output: {e}")
+            _SCHEMALESS_MODELS.add(key)
+    template, fields = plain
+    return call_llm(prompt=template.render(**fields), system=template.system, **request)
+
+
+def _request_title(elements, model_name, api_key, base_url, key_pool, usage, coalesce):
+    """
+    Asks for a title as MOVIE_TITLE_SCHEMA JSON, or as plain text from models
+    whose provider rejected the schema before.
+    """
+    fields = prompts.title_fields(elements)
+    return _call_with_schema(
+        prompts.title_response_format(),
+        (prompts.title_template(structured=True), fields),
+        (prompts.title_template(), fields),
+        dict(
+            model_name=model_name,
+            api_key=api_key,
+            base_url=base_url,
+            key_pool=key_pool,
+            usage=usage,
+            coalesce=coalesce,
+            temperature=0.7,
+            max_tokens=50,
+        ),
+    )
+
+
+def generate_title(elements, model_name, api_key, base_url, key_pool=None, usage=None):
+    """
+    Generates a movie title from the trailer elements.
+
+    The title is requested as JSON where the provider supports a schema and
+    parsed from plain text otherwise. An unusable title (empty, too long, a
+    placeholder) is requested once more before it is given up on.
+
+    Args:
+        elements (dict): The trailer elements by category.
+        model_name (str): LLM to use.
+        api_key (str): API key of the provider (ignored when key_pool is given).
+        base_url (str): OpenAI-compatible base URL of the provider.
+        key_pool (KeyPool, optional): Pool to take the API key from.
+        usage (dict, optional): Filled with the token counts of the calls.
+
+    Returns:
+        str: The title without quotes, labels or markdown.
+
+    Raises:
+        GenerationError: If the model returned no title.
+    """
+    title = ""
+    for attempt in range(2):
+        call_usage = {}
+        raw = _request_title(
+            elements,
+            model_name,
+            api_key,
+            base_url,
+            key_pool,
+            call_usage,
+            # A retry must not join the identical request it replaces
+            coalesce=attempt == 0,
+        )
+        _add_usage(usage, call_usage)
+        title = script_validation.parse_title(raw)
+        issues = script_validation.title_issues(title)
+        if not issues:
+            return title
+        print(f"Warning: unusable title {raw!r} ({'; '.join(issues)})")
+    if not title:
+        raise GenerationError("Movie name generation returned empty")
+    return title
+
+
+def title_batch_size(
+    context_tokens=DEFAULT_CONTEXT_TOKENS,
+    output_tokens=DEFAULT_OUTPUT_TOKENS,
+    max_batch=MAX_TITLE_BATCH,
+):
+    """
+    Returns how many combinations fit in one bulk title request.
+
+    Args:
+        context_tokens (int, optional): The model's context window; prompt and
+            answer both count against it.
+        output_tokens (int, optional): The model's completion limit.
+        max_batch (int, optional): Upper bound, since a long list makes models
+            skip or merge entries.
+
+    Returns:
+        int: The batch size, at least 1.
+    """
+    prefix_tokens = len(prompts.BULK_TITLE_TEMPLATE.system) // 4
+    by_context = (context_tokens - prefix_tokens) // (
+        _BULK_ITEM_PROMPT_TOKENS + _BULK_ITEM_OUTPUT_TOKENS
+    )
+    by_output = (output_tokens - _BULK_ITEM_OUTPUT_TOKENS) // _BULK_ITEM_OUTPUT_TOKENS
+    return max(1, min(max_batch, by_context, by_output))
+
+
+def generate_titles(
+    elements_list,
+    model_name,
+    api_key,
+    base_url,
+    key_pool=None,
+    usage=None,
+    batch_size=None,
+    report=None,
+):
+    """
+    Generates titles for many combinations, several per request.
+
+    Combinations are sent in numbered batches of MOVIE_TITLES_SCHEMA requests,
+    so the guidelines and request overhead are paid once per batch instead of
+    once per title. A batch that fails or comes back incomplete is not retried
+    here: its missing titles are returned as None for the caller to generate
+    one by one with generate_title.
+
+    Args:
+        elements_list (list[dict]): Trailer elements, one dict per title.
+        model_name, api_key, base_url, key_pool, usage: As for generate_title.
+        batch_size (int, optional): Combinations per request. Defaults to
+            title_batch_size() for the default token limits.
+        report (callable, optional): Called with (progress, message).
+
+    Returns:
+        list: One title or None per combination, in order.
+    """
+    batch_size = batch_size or title_batch_size()
+    titles = [None] * len(elements_list)
+    for start in range(0, len(elements_list), batch_size):
+        batch = elements_list[start : start + batch_size]
+        _report(
+            report,
+            start / len(elements_list),
+            f"Generating titles {start + 1}-{start + len(batch)}...",
+        )
+        fields = prompts.bulk_title_fields(batch)
+        template = prompts.BULK_TITLE_TEMPLATE
+        call_usage = {}
+        try:
+            raw = _call_with_schema(
+                prompts.titles_response_format(),
+                (template, fields),
+                (template, fields),
+                dict(
+                    model_name=model_name,
+                    api_key=api_key,
+                    base_url=base_url,
+                    key_pool=key_pool,
+                    usage=call_usage,
+                    temperature=0.7,
+                    max_tokens=_BULK_ITEM_OUTPUT_TOKENS * (len(batch) + 1),
+                ),
+            )
+        except Exception as e:
+            print(f"Warning: bulk title request failed: {e}")
+            continue
+        _add_usage(usage, call_usage)
+        for number, title in script_validation.parse_titles(raw, len(batch)).items():
+            if not script_validation.title_issues(title):
+                titles[start + number - 1] = title
+    missing = titles.count(None)
+    if missing:
+        print(f"Warning: {missing} of {len(titles)} bulk titles are missing")
+    return titles
+
+
+def generate_script(
+    title, elements, model_name, api_key, base_url, key_pool=None, usage=None
+):
+    """
+    Generates the voice-over script for a title.
+
+    The output is cleaned and checked by script_validation.validate_script. A
+    script that had to be cut down too far is generated once more; whatever
+    comes back is repaired, so the result always fits the word limit.
+
+    Args:
+        title (str): The movie title.
+        elements (dict): The trailer elements by category.
+        model_name, api_key, base_url, key_pool, usage: As for generate_title.
+
+    Returns:
+        str: The script, one paragraph per line, ending with the title.
+
+    Raises:
+        GenerationError: If the model returned nothing.
+    """
+    template = prompts.SCRIPT_TEMPLATE
+    prompt = template.render(**prompts.script_fields(title, elements))
+    report = None
+    for attempt in range(2):
+        call_usage = {}
+        text = call_llm(
+            model_name=model_name,
+            prompt=prompt,
+            system=template.system,
+            api_key=api_key,
+            base_url=base_url,
+            key_pool=key_pool,
+            usage=call_usage,
+            # A retry must not join the identical request it replaces
+            coalesce=attempt == 0,
+            temperature=0.7,
+            max_tokens=500,
+        )
+        _add_usage(usage, call_usage)
+        if not text:
+            raise GenerationError("Script generation returned empty")
+        report = script_validation.validate_script(text, title)
+        if not report.needs_regeneration:
+            break
+        print(
+            f"Warning: script for '{title}' scored {report.score}"
+            f" ({'; '.join(report.issues)}), regenerating"
+        )
+    if report.repairs:
+        print(f"Warning: repaired script for '{title}': {'; '.join(report.repairs)}")
+    return report.script
+
+
+def _generate_text_stages(
+    elements, model_name, api_key, base_url, key_pool, include_script, report, done=None
+):
+    """
+    Runs the title and (optionally) script stages, skipping those in ``done``.
+
+    Returns:
+        dict: ``movie_name``, ``title_ms``, ``title_usage`` and, with
+        include_script, ``script``, ``script_ms`` and ``script_usage``.
+    """
+    stages = dict(done or {})
+    if not stages.get("movie_name"):
+        _report(report, 0.0, "Generating movie name...")
+        stages["title_usage"] = {}
+        started = time.perf_counter()
+        stages["movie_name"] = generate_title(
+            elements,
+            model_name,
+            api_key,
+            base_url,
+            key_pool,
+            usage=stages["title_usage"],
+        )
+        stages["title_ms"] = (time.perf_counter() - started) * 1000
+
+    if include_script and not stages.get("script"):
+        _report(report, 0.4, "Generating voice-over script...")
+        stages["script_usage"] = {}
+        started = time.perf_counter()
+        stages["script"] = generate_script(
+            stages["movie_name"],
+            elements,
+            model_name,
+            api_key,
+            base_url,
+            key_pool,
+            usage=stages["script_usage"],
+        )
+        stages["script_ms"] = (time.perf_counter() - started) * 1000
+    return stages
+
+
+def generate_trailer_text(
+    elements, model_name, api_key, base_url, key_pool=None, report=None, prefetched=None
+):
+    """
+    Generates the title and script and logs them to the generation history.
+
+    Args:
+        elements (dict): The trailer elements by category.
+        model_name, api_key, base_url, key_pool: As for generate_title.
+        report (callable, optional): Called with (progress, message) as the
+            stages complete, e.g. Job.report of the job manager.
+        prefetched (dict, optional): Result of prefetch_trailer_text. Its title
+            (and script) are used instead of generating them again when it was
+            made for the same elements, model and provider.
+
+    Returns:
+        dict: ``movie_name``, ``script`` and ``generation_id`` (None if the
+        history could not be written).
+    """
+    done = None
+    if prefetched and prefetch_matches(prefetched, elements, model_name, base_url):
+        done = prefetched["stages"]
+    stages = _generate_text_stages(
+        elements, model_name, api_key, base_url, key_pool, True, report, done
+    )
+    title_usage = stages.get("title_usage", {})
+    script_usage = stages.get("script_usage", {})
+
+    _report(report, 0.9, "Saving to history...")
+    token_counts = {
+        key: title_usage.get(key, 0) + script_usage.get(key, 0)
+        for key in ("prompt_tokens", "completion_tokens")
+        if key in title_usage or key in script_usage
+    }
+    generation_id = None
+    try:
+        generation_id = save_movie_data(
+            stages["movie_name"],
+            stages["script"],
+            dict(elements),
+            provider=base_url,
+            model=model_name,
+            title_prompt=prompts.title_prompt(elements),
+            script_prompt=prompts.script_prompt(stages["movie_name"], elements),
+            title_ms=stages.get("title_ms"),
+            script_ms=stages.get("script_ms"),
+            **token_counts,
+        )
+    except Exception as e:
+        print(f"Warning: could not log generation: {e}")
+    return {
+        "movie_name": stages["movie_name"],
+        "script": stages["script"],
+        "generation_id": generation_id,
+    }
+
+
+def prefetch_trailer_text(
+    elements,
+    model_name,
+    api_key,
+    base_url,
+    key_pool=None,
+    include_script=False,
+    report=None,
+):
+    """
+    Speculatively generates the title (and script) for elements the user is
+    likely to pick next. Nothing is logged; pass the result to
+    generate_trailer_text as ``prefetched`` once the user accepts it.
+
+    Args:
+        elements (dict): The pre-sampled trailer elements.
+        model_name, api_key, base_url, key_pool: As for generate_title.
+        include_script (bool, optional): Also generate the script.
+        report (callable, optional): Called with (progress, message).
+
+    Returns:
+        dict: ``elements``, ``model_name``, ``base_url`` and the generated
+        ``stages``.
+    """
+    stages = _generate_text_stages(
+        elements, model_name, api_key, base_url, key_pool, include_script, report
+    )
+    return {
+        "elements": dict(elements),
+        "model_name": model_name,
+        "base_url": base_url,
+        "stages": stages,
+    }
+
+
+def prefetch_matches(prefetched, elements, model_name, base_url):
+    """Returns whether a prefetch result was made for this request."""
+    return (
+        prefetched.get("elements") == dict(elements)
+        and prefetched.get("model_name") == model_name
+        and prefetched.get("base_url") == base_url
+    )
+
+
+def generate_trailer_audio(
+    script, elements, movie_name, config, fit_mode=None, generation_id=None, report=None
+):
+    """
+    Voices the script, mixes it with background music and saves both.
+
+    Args:
+        script (str): The voice-over script.
+        elements (dict): The trailer elements; the genre picks the music bed.
+        movie_name (str): Used to name the files.
+        config (Config): TTS, storage and mixing settings.
+        fit_mode (str, optional): Overrides config.music_fit_mode.
+        generation_id (str, optional): History entry the files are linked to.
+        report (callable, optional): Called with (progress, message).
+
+    Returns:
+        str: Location of the final mix.
+
+    Raises:
+        TTSError: If speech synthesis fails.
+        MixingError: If mixing fails.
+    """
+    _report(report, 0.0, "Generating audio...")
+    audio = generate_audio_with_elevenlabs(
+        script,
+        output_format=config.tts_output_format,
+        key_pool=config.key_pool("elevenlabs"),
+    )
+    store = config.artifact_store()
+    _report(report, 0.5, "Saving voice-over...")
+    voiceover_path = save_audio_file(
+        audio, elements, movie_name, audio_format=config.tts_output_format, store=store
+    )
+    log_generation_artifact(generation_id, "voiceover", voiceover_path)
+
+    _report(report, 0.6, "Mixing background music...")
+    final_path = apply_background_music(
+        voiceover_path,
+        fit_mode=fit_mode or config.music_fit_mode,
+        ducking=config.music_ducking,
+        target_lufs=config.target_lufs,
+        genre=elements.get("Genre"),
+        music_dir=config.music_library_dir,
+        voice_audio=audio,
+        voice_format=config.tts_output_format,
+        store=store,
+        keep_intermediates=config.keep_intermediates,
+    )
+    log_generation_artifact(generation_id, "final", final_path)
+    enforce_artifact_retention(store, config.retention_policy())
+    return final_path
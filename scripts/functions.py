@@ -1,41 +1,67 @@
+"""
+Streamlit adapter for the app and its pages.
+
+The pipeline itself lives in scripts/core.py and reports failures as
+exceptions; the wrappers here show them with st.error and return None (or an
+empty list), which is what the UI code expects.
+"""
+
 import os
-import json
 import uuid
-from datetime import datetime
-from typing import Any
-import subprocess
-import requests
 import streamlit as st
-from scripts import prompts
+from scripts import core, media_server
+from scripts.job_manager import JobManager
+from scripts import config as config_module
+from scripts.core import (
+    get_trailer_points,
+    save_audio_file,
+    enforce_artifact_retention,
+    save_movie_data,
+    log_generation_artifact,
+)
+
+
+def _streamlit_secrets():
+    """Returns st.secrets as a dict, or None when Streamlit found no secrets."""
+    if not st.secrets.load_if_toml_exists():
+        return None
+    return st.secrets.to_dict()
 
 
-try:
-    from pydub import AudioSegment
-    from pydub.effects import speedup
-except ImportError:
-    AudioSegment = Any  # type: ignore
-    speedup = Any  # type: ignore
+@st.cache_resource(max_entries=1)
+def _cached_config(signature):
+    config_module.set_secrets_source(_streamlit_secrets)
+    return config_module.reload_config()
 
 
-def get_trailer_points():
+def app_config():
     """
-    Retrieves trailer elements from JSON files in the assets/data directory.
+    Returns the configuration snapshot shared by all sessions and reruns.
 
-    Returns:
-        list: A list of dictionaries, where each dictionary represents a trailer element
-              (genre, main_character, setting, conflict, plot_twist) and contains
-              its category and options.
+    The snapshot is cached once per process and rebuilt when the secrets file
+    changes, instead of re-reading secrets and env vars on every rerun. Secrets
+    come from st.secrets, so the global ~/.streamlit/secrets.toml and Streamlit
+    Community Cloud secrets are used as well as the project file.
     """
-    category_order = ["genre", "main_character", "setting", "conflict", "plot_twist"]
-    trailer_points = []
-    data_dir = "assets/data"
+    return _cached_config(config_module.secrets_signature())
 
-    for category in category_order:
-        filename = f"{category}.json"
-        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
-            trailer_points.append(json.load(f))
 
-    return trailer_points
+@st.cache_resource
+def job_manager():
+    """
+    Returns the background job manager shared by all sessions.
+
+    Generation runs on its thread pool so reruns never block on (or re-trigger)
+    LLM, TTS or mixing calls.
+    """
+    return JobManager(max_workers=app_config().background_workers)
+
+
+def session_id():
+    """Returns a stable id for the current browser session, used to key its jobs."""
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
 
 
 @st.cache_data
@@ -69,187 +95,172 @@ def card(category, option, color):
     )
 
 
-def generate_audio_with_elevenlabs(text, voice_id="FF7KdobWPaiR0vkcALHF"):
+def audio_player(
+    audio_path,
+    base_url=None,
+    host=media_server.DEFAULT_HOST,
+    port=media_server.DEFAULT_PORT,
+    key=None,
+    root=None,
+):
     """
-    Generates speech audio from text using the ElevenLabs API.
+    Displays an audio player and a download link for a generated audio file.
 
-    Sends a request to the ElevenLabs text-to-speech endpoint with the provided
-    text and voice ID. Handles potential API errors and returns the audio content.
+    By default the file bytes are sent to the browser with st.audio and
+    st.download_button. When base_url is set, the file is referenced by a URL
+    on the local media server instead, so the browser streams it with range
+    requests and caches it. Only the Streamlit port is forwarded in remote
+    setups such as Codespaces, so the media server is opt-in.
+
+    Files in an S3 artifact store are played from a presigned URL.
 
     Args:
-        text (str): The text content to convert to speech.
-        voice_id (str, optional): The ElevenLabs voice ID to use.
-                                Defaults to "FF7KdobWPaiR0vkcALHF".
+        audio_path (str): Path to a file in the artifact root, or its s3://
+            location.
+        base_url (str, optional): Public URL of the media server (the
+            media_base_url setting). Audio is sent as bytes when not set.
+        host (str, optional): Interface the media server binds to.
+        port (int, optional): Port the media server binds to.
+        key (str, optional): Widget key for the download button.
+        root (str, optional): Directory served by the media server. Defaults to
+            the configured artifact_root.
+    """
+    if audio_path.startswith("s3://"):
+        # Played and downloaded straight from the bucket via a presigned URL
+        url = app_config().artifact_store().url(audio_path.rsplit("/", 1)[-1])
+        if url is None:
+            st.success(f"Saved to {audio_path}")
+            return
+        st.audio(url, format="audio/mp3")
+        st.markdown(f"[Download]({url})")
+        return
+
+    root = root or app_config().artifact_root
+    if not base_url or media_server.ensure_media_server(root, host, port) is None:
+        st.audio(audio_path, format="audio/mp3")
+        with open(audio_path, "rb") as file:
+            st.download_button(
+                label="Download",
+                data=file,
+                file_name=os.path.basename(audio_path),
+                mime="audio/mp3",
+                key=key,
+            )
+        return
+
+    st.audio(media_server.media_url(audio_path, base_url, root), format="audio/mp3")
+    download_url = media_server.media_url(audio_path, base_url, root, download=True)
+    st.markdown(f"[Download]({download_url})")
+
+
+def generate_audio_with_elevenlabs(
+    text, voice_id="FF7KdobWPaiR0vkcALHF", output_format="mp3_44100_128", key_pool=None
+):
+    """
+    Generates speech with core.generate_audio_with_elevenlabs, showing errors in the UI.
 
     Returns:
-        bytes | None: The generated audio content as bytes if successful,
-                      otherwise None if an error occurred.
-    """
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-    headers = {
-        "Accept": "audio/mpeg",
-        "Content-Type": "application/json",
-        "xi-api-key": st.secrets.get("ELEVENLABS_API_KEY"),
-    }
-    data = {
-        "text": text,
-        "model_id": "eleven_turbo_v2_5",
-        "voice_settings": {"stability": 0.7, "similarity_boost": 0.6},
-    }
-
+        bytes | None: The generated audio, or None if an error occurred.
+    """
     try:
-        response = requests.post(url, json=data, headers=headers, timeout=60)
-        response.raise_for_status()
-        return response.content
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error generating audio: {str(e)}")
+        return core.generate_audio_with_elevenlabs(
+            text, voice_id=voice_id, output_format=output_format, key_pool=key_pool
+        )
+    except core.TTSError as e:
+        st.error(str(e))
         return None
 
 
-def save_audio_file(audio_content, selected_points, movie_name):
-    """Save voice-over audio with descriptive filename.
-
-    Args:
-        audio_content (bytes): The audio content to save
-        selected_points (dict): Dictionary of selected trailer elements
-        movie_name (str): Name of the movie
+def get_ollama_models():
+    """
+    Lists the installed Ollama models, showing errors in the UI.
 
     Returns:
-        str: Path to saved audio file
+        list: Model names; empty if Ollama is not installed or listing failed.
     """
-    os.makedirs("generated_audio", exist_ok=True)
+    try:
+        return core.get_ollama_models()
+    except core.OllamaError as e:
+        st.error(str(e))
+        return []
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"voiceover_{movie_name}_{timestamp}.mp3"
-    filepath = os.path.join("generated_audio", filename)
 
-    with open(filepath, "wb") as f:
-        f.write(audio_content)
-    return filepath
+def ollama_manager():
+    """Returns the Ollama model manager shared by all sessions."""
+    config = app_config()
+    # Registers the configured limits before any load is scheduled
+    config.ollama_scheduler()
+    return config.ollama_manager()
 
 
-def save_movie_data(movie_name, script, output_dir="assets/data"):
+def warm_ollama_models():
     """
-    Saves the movie data (name and script) to a JSON file in the assets/data directory.
-
-    Args:
-        movie_name (str): The name of the movie.
-        script (str): The movie trailer script.
-        output_dir (str, optional): The directory to save the movie data to. Defaults to "assets/data".
-
-    Returns:
-        str: The filepath of the saved movie data file.
+    Keeps ollama_default_model and ollama_preload_models loaded whenever an
+    Ollama server is reachable, in either mode, so the first local request
+    after switching to Ollama mode does not wait for a load.
     """
-    # Ensure the output directory exists
-    os.makedirs(output_dir, exist_ok=True)
-
-    # Create the data structure
-    movie_data = {
-        "movie_name": movie_name,
-        "script": script,
-    }
-
-    # Save movie data
-    movie_data_file = os.path.join(output_dir, "movie_data.json")
-    with open(movie_data_file, "w") as f:
-        json.dump(movie_data, f, indent=4)  # Use indent for pretty printing
-
-    return movie_data_file  # Return file path for confirmation
+    config = app_config()
+    models = dict.fromkeys([config.ollama_default_model, *config.ollama_preload_models])
+    ollama_manager().warm(models)
 
 
-def get_ollama_models():
+def ollama_model_status(model):
     """
-    Lists the Ollama models installed on the system.
+    Keeps the selected Ollama model warm and shows its load state in the sidebar.
 
-    Returns:
-        list: A list of strings, where each string is the name of an installed Ollama model.
-              Returns an empty list if Ollama is not installed or no models are found.
+    Args:
+        model (str): The model picked in the sidebar.
     """
-    try:
-        result = subprocess.run(
-            ["ollama", "list"], capture_output=True, text=True, check=True
+    manager = ollama_manager()
+    state = manager.ensure_warm(model)
+    if state.status == "loaded":
+        load = (
+            f", loaded in {state.load_seconds:.1f}s"
+            if state.load_seconds is not None
+            else ""
         )
-        models = []
-        for line in result.stdout.splitlines():
-            if line.strip():
-                parts = line.split()
-                if len(parts) > 0:
-                    models.append(parts[0].strip())
-        return models
-    except FileNotFoundError:
-        st.error("Ollama is not installed. Please install Ollama and try again.")
-        return []
-    except subprocess.CalledProcessError as e:
-        st.error(f"Error listing Ollama models: {e}")
-        return []
-
+        st.sidebar.caption(
+            f"🟢 {model} is loaded{load} (kept for {manager.keep_alive_for(model)})"
+        )
+    elif state.status == "loading":
+        st.sidebar.caption(f"⏳ Loading {model}... the first request waits for it")
+    elif state.status == "failed":
+        st.sidebar.caption(f"🔴 Could not load {model}: {state.error}")
+    queue = app_config().ollama_scheduler().status()
+    waiting = sum(entry["queued"] for entry in queue.values())
+    if waiting:
+        busy = ", ".join(
+            f"{name} ({entry['in_flight']} running)"
+            for name, entry in queue.items()
+            if entry["in_flight"]
+        )
+        st.sidebar.caption(f"🚦 {waiting} requests queued for Ollama; busy: {busy}")
 
-def apply_background_music(audio_filepath):
-    """Mix voice-over with background music, stretching music to match voice-over length.
 
-    Args:
-        audio_filepath (str): Path to voice-over audio file
+def apply_background_music(audio_filepath, **kwargs):
+    """
+    Mixes the voice-over with background music via core.apply_background_music,
+    showing errors in the UI. Takes the same keyword arguments.
 
     Returns:
-        str: Path to mixed audio file
+        str | None: Location of the mix, or None if an error occurred.
     """
     try:
-        voice_over = AudioSegment.from_mp3(audio_filepath)
-        background = AudioSegment.from_mp3("assets/audio/trailer_music.mp3")
-
-        # Stretch background music to match voice-over length
-        ratio = len(voice_over) / len(background)
-        if ratio > 1:
-            # If voice-over is longer, slow down the background music
-            stretched = background._spawn(
-                background.raw_data,
-                overrides={"frame_rate": int(background.frame_rate * ratio)},
-            ).set_frame_rate(background.frame_rate)
-        else:
-            # If voice-over is shorter, speed up the background music
-            stretched = speedup(background, playback_speed=1 / ratio)
-
-        # Lower the volume of background music to not overpower voice-over
-        background_volume = (
-            -5
-        )  # Adjust this value to control background music volume (in dB)
-        stretched = stretched + background_volume
-
-        # Mix audio and save
-        output_path = audio_filepath.replace("voiceover_", "final_")
-        if os.path.exists(audio_filepath):
-            voice_over.overlay(stretched, position=0).export(output_path, format="mp3")
-            return output_path
-        else:
-            st.error(f"Audio file not found: {audio_filepath}")
-            return None
-    except Exception as e:
-        st.error(f"Error applying background music: {str(e)}")
+        return core.apply_background_music(audio_filepath, **kwargs)
+    except core.MixingError as e:
+        st.error(str(e))
         return None
 
 
-def generate_script_with_ollama(prompt):
+def generate_script_with_ollama(prompt, model_name=None):
     """
-    Generates text (e.g., a script) using a local Ollama model via its API.
-
-    Sends a request to the Ollama API's generate endpoint with the specified
-    model and prompt. Handles potential API errors and returns the generated text.
-
-    Args:
-        prompt (str): The input prompt to send to the Ollama model.
+    Generates text with a local Ollama model, showing errors in the UI.
 
     Returns:
-        str | None: The generated text response from Ollama if successful,
-                    otherwise None if an error occurred.
+        str | None: The generated text, or None if an error occurred.
     """
-    url = "http://localhost:11434/api/generate"
-    data = {"model": "llama2", "prompt": prompt, "stream": False}
-
     try:
-        response = requests.post(url, json=data)
-        response.raise_for_status()
-        response_data = response.json()
-        return response_data.get("response", "")
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error calling Ollama API: {str(e)}")
+        return core.generate_script_with_ollama(prompt, model_name, app_config())
+    except core.OllamaError as e:
+        st.error(str(e))
         return None
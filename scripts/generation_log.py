@@ -0,0 +1,256 @@
+"""
+Append-only history of trailer generations.
+
+Each generation (elements, model, prompts, outputs, timings and token counts)
+is inserted once and never rewritten; artifacts produced later (voice-overs,
+final mixes) are appended as separate rows linked by generation id. Indexed
+columns support lookups by time, title, genre, model, prompt and artifact.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+from contextlib import closing
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+DEFAULT_DB_PATH = os.path.join("data", "history.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    movie_name TEXT,
+    genre TEXT,
+    elements TEXT NOT NULL,
+    provider TEXT,
+    model TEXT,
+    title_prompt TEXT,
+    title_prompt_hash TEXT,
+    script_prompt TEXT,
+    script_prompt_hash TEXT,
+    script TEXT,
+    title_ms REAL,
+    script_ms REAL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_generations_created ON generations (created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_movie ON generations (movie_name);
+CREATE INDEX IF NOT EXISTS idx_generations_genre ON generations (genre, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_model ON generations (model, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_title_prompt
+    ON generations (model, title_prompt_hash, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_generations_script_prompt
+    ON generations (model, script_prompt_hash, created_at DESC);
+
+CREATE TABLE IF NOT EXISTS generation_artifacts (
+    generation_id TEXT NOT NULL REFERENCES generations (id),
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_generation ON generation_artifacts (generation_id);
+CREATE INDEX IF NOT EXISTS idx_artifacts_path ON generation_artifacts (path);
+"""
+
+_COLUMNS = (
+    "id, created_at, movie_name, genre, elements, provider, model, "
+    "title_prompt, title_prompt_hash, script_prompt, script_prompt_hash, script, "
+    "title_ms, script_ms, prompt_tokens, completion_tokens"
+)
+
+
+@dataclass
+class GenerationRecord:
+    """One title + script generation."""
+
+    elements: Dict[str, str]
+    movie_name: Optional[str] = None
+    script: Optional[str] = None
+    provider: Optional[str] = None
+    model: Optional[str] = None
+    title_prompt: Optional[str] = None
+    script_prompt: Optional[str] = None
+    title_ms: Optional[float] = None
+    script_ms: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    created_at: float = field(default_factory=time.time)
+    artifacts: List[Dict[str, Any]] = field(default_factory=list)
+
+
+def prompt_hash(prompt: Optional[str]) -> Optional[str]:
+    """Returns the hash used to index prompts, or None for a missing prompt."""
+    if prompt is None:
+        return None
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Opens the history database, creating it and its schema if needed."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def log_generation(record: GenerationRecord, db_path: str = DEFAULT_DB_PATH) -> str:
+    """
+    Appends a generation to the history.
+
+    Args:
+        record (GenerationRecord): The generation to store.
+        db_path (str, optional): History database path.
+
+    Returns:
+        str: The generation id.
+    """
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute(
+            f"INSERT INTO generations ({_COLUMNS}) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record.id,
+                record.created_at,
+                record.movie_name,
+                record.elements.get("Genre"),
+                json.dumps(record.elements),
+                record.provider,
+                record.model,
+                record.title_prompt,
+                prompt_hash(record.title_prompt),
+                record.script_prompt,
+                prompt_hash(record.script_prompt),
+                record.script,
+                record.title_ms,
+                record.script_ms,
+                record.prompt_tokens,
+                record.completion_tokens,
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO generation_artifacts (generation_id, kind, path, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            [
+                (record.id, a["kind"], a["path"], a.get("created_at", record.created_at))
+                for a in record.artifacts
+            ],
+        )
+    return record.id
+
+
+def log_artifact(
+    generation_id: str, kind: str, path: str, db_path: str = DEFAULT_DB_PATH
+) -> None:
+    """Appends an artifact (e.g. kind "voiceover" or "final") to a generation."""
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute(
+            "INSERT INTO generation_artifacts (generation_id, kind, path, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (generation_id, kind, path, time.time()),
+        )
+
+
+def _to_record(conn: sqlite3.Connection, row: sqlite3.Row) -> GenerationRecord:
+    data = dict(row)
+    data.pop("title_prompt_hash")
+    data.pop("script_prompt_hash")
+    data.pop("genre")
+    data["elements"] = json.loads(data["elements"])
+    data["artifacts"] = [
+        dict(a)
+        for a in conn.execute(
+            "SELECT kind, path, created_at FROM generation_artifacts "
+            "WHERE generation_id = ? ORDER BY created_at",
+            (data["id"],),
+        )
+    ]
+    return GenerationRecord(**data)
+
+
+def get_generation(
+    generation_id: str, db_path: str = DEFAULT_DB_PATH
+) -> Optional[GenerationRecord]:
+    """Returns one generation with its artifacts, or None if it is unknown."""
+    with closing(connect(db_path)) as conn:
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM generations WHERE id = ?", (generation_id,)
+        ).fetchone()
+        return _to_record(conn, row) if row else None
+
+
+def recent_generations(
+    limit: int = 20,
+    offset: int = 0,
+    genre: Optional[str] = None,
+    model: Optional[str] = None,
+    movie_name: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> List[GenerationRecord]:
+    """
+    Returns generations newest first, optionally filtered.
+
+    Args:
+        limit (int, optional): Maximum number of results.
+        offset (int, optional): Number of results to skip.
+        genre (str, optional): Exact Genre element.
+        model (str, optional): Exact model name.
+        movie_name (str, optional): Exact movie title.
+        db_path (str, optional): History database path.
+    """
+    clauses, params = [], []
+    for column, value in (("genre", genre), ("model", model), ("movie_name", movie_name)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    with closing(connect(db_path)) as conn:
+        rows = conn.execute(
+            f"SELECT {_COLUMNS} FROM generations{where} "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        return [_to_record(conn, row) for row in rows]
+
+
+def find_by_prompt(
+    model: str, prompt: str, kind: str = "script", db_path: str = DEFAULT_DB_PATH
+) -> Optional[GenerationRecord]:
+    """
+    Returns the latest generation that sent ``prompt`` to ``model``.
+
+    Args:
+        model (str): Model name.
+        prompt (str): The exact prompt text.
+        kind (str, optional): "title" or "script" prompt.
+        db_path (str, optional): History database path.
+    """
+    if kind not in ("title", "script"):
+        raise ValueError(f"Unknown prompt kind: {kind}")
+    with closing(connect(db_path)) as conn:
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM generations "
+            f"WHERE model = ? AND {kind}_prompt_hash = ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (model, prompt_hash(prompt)),
+        ).fetchone()
+        return _to_record(conn, row) if row else None
+
+
+def find_by_artifact(
+    path: str, db_path: str = DEFAULT_DB_PATH
+) -> Optional[GenerationRecord]:
+    """Returns the generation that produced the artifact at ``path``."""
+    with closing(connect(db_path)) as conn:
+        row = conn.execute(
+            "SELECT generation_id FROM generation_artifacts WHERE path = ? LIMIT 1",
+            (path,),
+        ).fetchone()
+    return get_generation(row["generation_id"], db_path) if row else None
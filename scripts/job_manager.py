@@ -0,0 +1,160 @@
+"""
+Background execution of generation work for the app.
+
+LLM calls, TTS and mixing take seconds to minutes. Run inside a button handler
+they freeze the session, and every widget click during that time cancels or
+re-triggers the work. The JobManager runs them on a shared thread pool instead,
+keyed by session and kind of job ("text", "audio", ...). The UI polls a job's
+status and progress and copies its result into the session once it finished.
+
+Threads rather than processes: the work is mostly waiting on HTTP calls, the
+mixer's NumPy operations release the GIL, and the pipeline's key pools and rate
+limiters are process-wide state that worker processes would not share.
+"""
+
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+JOB_STATES = ("queued", "running", "done", "failed")
+
+# Finished jobs nobody collected (closed tabs) are dropped after this long
+DEFAULT_KEEP_SECONDS = 3600.0
+
+
+@dataclass
+class Job:
+    """One unit of background work and its progress."""
+
+    session_id: str
+    kind: str
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "queued"
+    progress: float = 0.0
+    message: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def report(self, progress: float, message: str = "") -> None:
+        """
+        Records progress; passed to the job function as ``report``.
+
+        Args:
+            progress (float): Fraction done, between 0 and 1.
+            message (str, optional): What the job is doing now.
+        """
+        self.progress = min(1.0, max(0.0, progress))
+        if message:
+            self.message = message
+
+
+class JobManager:
+    """
+    Runs jobs on a thread pool, at most one per session and kind.
+
+    Args:
+        max_workers (int, optional): Jobs run at the same time across all sessions.
+        keep_seconds (float, optional): How long uncollected finished jobs are kept.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        keep_seconds: float = DEFAULT_KEEP_SECONDS,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.keep_seconds = keep_seconds
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="trailer-job"
+        )
+        self._lock = threading.Lock()
+        self._jobs: Dict[Tuple[str, str], Job] = {}
+
+    def submit(
+        self,
+        session_id: str,
+        kind: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Job:
+        """
+        Starts ``fn(*args, report=job.report, **kwargs)`` in the background.
+
+        While a job of the same session and kind is unfinished it is returned
+        instead of starting another one, so reruns and repeated clicks do not
+        start the work twice. A finished job of that kind is replaced.
+
+        Returns:
+            Job: The new or still running job.
+        """
+        with self._lock:
+            self._prune()
+            key = (session_id, kind)
+            job = self._jobs.get(key)
+            if job is not None and not job.finished:
+                return job
+            job = self._jobs[key] = Job(session_id, kind, created_at=self.clock())
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: dict) -> None:
+        job.status = "running"
+        try:
+            result = fn(*args, report=job.report, **kwargs)
+        except Exception as e:
+            print(f"Warning: {job.kind} job {job.job_id} failed: {e}")
+            job.error = str(e)
+            status = "failed"
+        else:
+            job.result = result
+            job.progress = 1.0
+            status = "done"
+        # The status is set last: readers treat a finished job as complete
+        job.finished_at = self.clock()
+        job.status = status
+
+    def get(self, session_id: str, kind: str) -> Optional[Job]:
+        """Returns the session's job of that kind, finished or not."""
+        with self._lock:
+            return self._jobs.get((session_id, kind))
+
+    def pop_finished(self, session_id: str, kind: str) -> Optional[Job]:
+        """
+        Removes and returns the session's job of that kind once it finished,
+        so its result is delivered exactly once.
+        """
+        with self._lock:
+            job = self._jobs.get((session_id, kind))
+            if job is None or not job.finished:
+                return None
+            return self._jobs.pop((session_id, kind))
+
+    def active(self, session_id: Optional[str] = None) -> List[Job]:
+        """Returns unfinished jobs, optionally only those of one session."""
+        with self._lock:
+            return [
+                job
+                for job in self._jobs.values()
+                if not job.finished and session_id in (None, job.session_id)
+            ]
+
+    def _prune(self) -> None:
+        cutoff = self.clock() - self.keep_seconds
+        for key, job in list(self._jobs.items()):
+            if job.finished and job.finished_at < cutoff:
+                del self._jobs[key]
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stops accepting jobs; with ``wait`` blocks until running ones finish."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,246 @@
+"""
+Pools of API keys for one provider.
+
+Outbound calls lease a key from the pool instead of using a single configured
+key. Keys are picked round-robin or by least load (calls in flight, then the
+rate limiter's wait for that key), and their health is tracked: a key that hits
+its quota or rate limit cools down for a while, and a key rejected as invalid
+is parked for longer. Pools live for the whole process, so health survives
+Streamlit reruns.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+from scripts import rate_limiter
+
+SELECTION_STRATEGIES = ("round_robin", "least_loaded")
+
+# Cooldowns in seconds
+RATE_LIMIT_COOLDOWN = 60.0
+AUTH_FAILURE_COOLDOWN = 3600.0
+ERROR_COOLDOWN = 30.0
+# Consecutive errors (other than rate limits) before a key cools down
+MAX_CONSECUTIVE_ERRORS = 3
+
+
+class NoAvailableKeyError(RuntimeError):
+    """Raised when every key of a pool is missing or cooling down."""
+
+
+@dataclass
+class KeyHealth:
+    """Usage and health of one key."""
+
+    in_flight: int = 0
+    successes: int = 0
+    failures: int = 0
+    consecutive_errors: int = 0
+    cooldown_until: float = 0.0
+    last_used: float = 0.0
+    last_error: Optional[str] = None
+
+
+class KeyPool:
+    """
+    Selects API keys for a provider and tracks their health.
+
+    Args:
+        provider (str): Provider name, as used by the rate limiter.
+        keys (list[str]): The keys; empty entries are ignored.
+        strategy (str, optional): "round_robin" or "least_loaded".
+        limiter (RateLimiter, optional): Used by least_loaded to prefer keys with
+            quota left. Defaults to the process-wide limiter.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        keys: List[str],
+        strategy: str = "least_loaded",
+        limiter: Optional[rate_limiter.RateLimiter] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if strategy not in SELECTION_STRATEGIES:
+            raise ValueError(f"Unknown key selection strategy: {strategy}")
+        self.provider = provider
+        self.strategy = strategy
+        self.limiter = limiter or rate_limiter.get_rate_limiter()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._next = 0
+        self.health: Dict[str, KeyHealth] = {}
+        self.set_keys(keys)
+
+    def set_keys(self, keys: List[str]) -> None:
+        """Replaces the keys, keeping the health of keys that stay in the pool."""
+        with self._lock:
+            self.keys = list(dict.fromkeys(k for k in keys if k))
+            self.health = {k: self.health.get(k, KeyHealth()) for k in self.keys}
+
+    def available(self) -> List[str]:
+        """Returns the keys that are not cooling down."""
+        now = self.clock()
+        return [k for k in self.keys if self.health[k].cooldown_until <= now]
+
+    def acquire(self) -> str:
+        """
+        Picks a key and marks it as in use. Pair with release().
+
+        Raises:
+            NoAvailableKeyError: If the pool is empty or every key is cooling down.
+        """
+        with self._lock:
+            candidates = self.available()
+            if not candidates:
+                if not self.keys:
+                    raise NoAvailableKeyError(f"No {self.provider} API key configured")
+                retry = min(h.cooldown_until for h in self.health.values()) - self.clock()
+                raise NoAvailableKeyError(
+                    f"All {self.provider} API keys are cooling down "
+                    f"(next available in {retry:.0f}s)"
+                )
+            if self.strategy == "round_robin":
+                # Rotate through all keys so a recovered key rejoins in order
+                for offset in range(len(self.keys)):
+                    key = self.keys[(self._next + offset) % len(self.keys)]
+                    if key in candidates:
+                        self._next = (self.keys.index(key) + 1) % len(self.keys)
+                        break
+            else:
+                key = min(
+                    candidates,
+                    key=lambda k: (
+                        self.health[k].in_flight,
+                        self.limiter.wait_time(self.provider, k, requests=1),
+                        self.health[k].last_used,
+                    ),
+                )
+            health = self.health[key]
+            health.in_flight += 1
+            health.last_used = self.clock()
+            return key
+
+    def release(
+        self,
+        key: str,
+        success: Optional[bool] = True,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        error: Optional[str] = None,
+    ) -> None:
+        """
+        Returns a key to the pool and records the outcome of its call.
+
+        Args:
+            key (str): The key returned by acquire().
+            success (bool, optional): Whether the call succeeded; None if it was
+                never sent (e.g. the rate limiter gave up), which leaves the
+                key's health as it was.
+            status (int, optional): HTTP status of a failed call. 429 cools the key
+                down for ``retry_after`` (or RATE_LIMIT_COOLDOWN) seconds; 401, 402
+                and 403 (invalid key, quota or credits exhausted) for
+                AUTH_FAILURE_COOLDOWN.
+            retry_after (float, optional): Server-provided wait after a 429.
+            error (str, optional): Error message kept for the status display.
+        """
+        with self._lock:
+            health = self.health.get(key)
+            if health is None:
+                return
+            health.in_flight = max(0, health.in_flight - 1)
+            if success is None:
+                return
+            if success:
+                health.successes += 1
+                health.consecutive_errors = 0
+                return
+            health.failures += 1
+            health.last_error = error
+            now = self.clock()
+            if status == 429:
+                cooldown = retry_after or RATE_LIMIT_COOLDOWN
+            elif status in (401, 402, 403):
+                cooldown = AUTH_FAILURE_COOLDOWN
+            else:
+                health.consecutive_errors += 1
+                if health.consecutive_errors < MAX_CONSECUTIVE_ERRORS:
+                    return
+                health.consecutive_errors = 0
+                cooldown = ERROR_COOLDOWN
+            health.cooldown_until = max(health.cooldown_until, now + cooldown)
+
+    @contextmanager
+    def lease(self) -> Iterator[str]:
+        """
+        Context manager around acquire()/release() for calls whose failures are
+        reported as exceptions with an HTTP status (``status_code`` or
+        ``response.status_code``).
+        """
+        key = self.acquire()
+        try:
+            yield key
+        except rate_limiter.RateLimitTimeout:
+            # Our own pacing gave up before sending: says nothing about the key
+            self.release(key, success=None)
+            raise
+        except Exception as e:
+            response = getattr(e, "response", None)
+            status = getattr(e, "status_code", None) or getattr(response, "status_code", None)
+            headers = getattr(response, "headers", None) or {}
+            retry_after = headers.get("retry-after") if hasattr(headers, "get") else None
+            self.release(
+                key,
+                success=False,
+                status=status,
+                retry_after=rate_limiter.parse_duration(retry_after) if retry_after else None,
+                error=str(e),
+            )
+            raise
+        else:
+            self.release(key)
+
+    def status(self) -> List[Dict[str, object]]:
+        """Returns per-key health for display, with keys masked."""
+        now = self.clock()
+        return [
+            {
+                "key": f"…{key[-4:]}",
+                "in_flight": h.in_flight,
+                "successes": h.successes,
+                "failures": h.failures,
+                "cooldown_seconds": max(0.0, h.cooldown_until - now),
+                "last_error": h.last_error,
+            }
+            for key, h in self.health.items()
+        ]
+
+
+_pools: Dict[str, KeyPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_key_pool(
+    provider: str, keys: List[str], strategy: str = "least_loaded"
+) -> KeyPool:
+    """
+    Returns the process-wide pool of a provider, updated to ``keys``.
+
+    Args:
+        provider (str): Provider name, e.g. "openrouter" or "elevenlabs".
+        keys (list[str]): The configured keys.
+        strategy (str, optional): "round_robin" or "least_loaded".
+    """
+    if strategy not in SELECTION_STRATEGIES:
+        raise ValueError(f"Unknown key selection strategy: {strategy}")
+    with _pools_lock:
+        pool = _pools.get(provider)
+        if pool is None:
+            pool = _pools[provider] = KeyPool(provider, keys, strategy)
+        else:
+            pool.strategy = strategy
+            pool.set_keys(keys)
+        return pool
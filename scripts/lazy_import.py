@@ -0,0 +1,70 @@
+"""
+Deferred imports of heavy dependencies.
+
+openai, pydub, requests and the NumPy audio engine take a large share of the
+time it takes to start a worker, and many processes (listing files, serving
+media, running a single pipeline stage) never use some of them.
+``lazy_import`` returns a module object at once and runs the real import on
+first attribute access, so callers keep their module-level names and tests can
+still patch attributes on them.
+"""
+
+import sys
+import threading
+import importlib
+import importlib.util
+from types import ModuleType
+
+_lock = threading.Lock()
+
+
+class MissingModule(ModuleType):
+    """Stand-in for an optional dependency that is not installed."""
+
+    def __init__(self, name: str, purpose: str = ""):
+        super().__init__(name)
+        self._purpose = purpose
+
+    def __getattr__(self, attr: str):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        needed = f" for {self._purpose}" if self._purpose else ""
+        raise ImportError(f"{self.__name__} is required{needed}")
+
+    def __bool__(self) -> bool:
+        return False
+
+
+def lazy_import(name: str, purpose: str = "") -> ModuleType:
+    """
+    Returns a module whose import runs on first attribute access.
+
+    Args:
+        name (str): Absolute module name, e.g. "openai" or "scripts.audio_engine".
+        purpose (str, optional): What the module is needed for; used in the
+            ImportError raised when it is used but not installed.
+
+    Returns:
+        ModuleType: The module (already imported ones are returned as is), or a
+        falsy MissingModule if it cannot be found.
+    """
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        try:
+            spec = importlib.util.find_spec(name)
+        except ImportError:
+            spec = None
+        if spec is None or spec.loader is None:
+            return MissingModule(name, purpose)
+        loader = importlib.util.LazyLoader(spec.loader)
+        spec.loader = loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        loader.exec_module(module)
+        if "." in name:
+            # Bind the submodule on its package like a regular import would
+            parent, _, child = name.rpartition(".")
+            setattr(importlib.import_module(parent), child, module)
+        return module
@@ -0,0 +1,225 @@
+"""
+Local HTTP server for generated audio.
+
+Pages reference artifacts by URL instead of pushing their bytes through the
+Streamlit websocket. The server supports single HTTP Range requests (so
+browsers can stream and seek), ETag/Last-Modified validation and caching
+headers, and runs in a daemon thread shared by the whole process. Only audio
+files are served; anything else below the root (partial writes, stray files)
+is a 404.
+"""
+
+import os
+import re
+import shutil
+import mimetypes
+import threading
+from email.utils import formatdate
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8502
+CACHE_CONTROL = "public, max-age=3600"
+CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+# Extensions of the artifacts the app writes and plays
+AUDIO_EXTENSIONS = frozenset({".mp3", ".wav", ".ogg", ".m4a", ".aac", ".flac"})
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses a single-range ``Range`` header.
+
+    Args:
+        header (str): The header value, e.g. "bytes=0-1023" or "bytes=-500".
+        size (int): Size of the file in bytes.
+
+    Returns:
+        tuple[int, int] | None: Inclusive (start, end) byte positions, or None if
+        the range is malformed or cannot be satisfied.
+    """
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        return None
+    return first, last
+
+
+class MediaRequestHandler(BaseHTTPRequestHandler):
+    """Serves files below ``root`` with Range, ETag and caching support."""
+
+    root = os.path.abspath("generated_audio")
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def log_message(self, format, *args):
+        pass  # Keep the Streamlit console quiet
+
+    def _resolve(self, url_path: str) -> Optional[str]:
+        root = os.path.realpath(self.root)
+        full_path = os.path.realpath(os.path.join(root, unquote(url_path).lstrip("/")))
+        if not full_path.startswith(root + os.sep) or not os.path.isfile(full_path):
+            return None
+        relative = os.path.relpath(full_path, root)
+        # Hidden names cover the stores' temporary files (".tmp-...")
+        if any(part.startswith(".") for part in relative.split(os.sep)):
+            return None
+        if os.path.splitext(full_path)[1].lower() not in AUDIO_EXTENSIONS:
+            return None
+        return full_path
+
+    def _send_empty(self, status: int, headers: Optional[dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _serve(self, send_body: bool):
+        url = urlsplit(self.path)
+        path = self._resolve(url.path)
+        if path is None:
+            self._send_empty(HTTPStatus.NOT_FOUND)
+            return
+
+        stat = os.stat(path)
+        size = stat.st_size
+        etag = f'"{size:x}-{stat.st_mtime_ns:x}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
+
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match and etag in [t.strip() for t in if_none_match.split(",")]:
+            self._send_empty(HTTPStatus.NOT_MODIFIED, headers)
+            return
+
+        start, end = 0, size - 1
+        status = HTTPStatus.OK
+        range_header = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if range_header and (not if_range or if_range == etag):
+            requested = parse_range(range_header, size)
+            if requested is None:
+                headers["Content-Range"] = f"bytes */{size}"
+                self._send_empty(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, headers)
+                return
+            start, end = requested
+            status = HTTPStatus.PARTIAL_CONTENT
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+        if parse_qs(url.query).get("download") == ["1"]:
+            filename = quote(os.path.basename(path))
+            headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{filename}"
+
+        length = max(0, end - start + 1)
+        self.send_response(status)
+        self.send_header(
+            "Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream"
+        )
+        self.send_header("Content-Length", str(length))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+
+        if send_body and length:
+            with open(path, "rb") as f:
+                f.seek(start)
+                remaining = length
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+
+def start_media_server(
+    root: str = "generated_audio", host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> ThreadingHTTPServer:
+    """
+    Starts a media server for ``root`` in a daemon thread.
+
+    Args:
+        root (str, optional): Directory to serve.
+        host (str, optional): Interface to bind.
+        port (int, optional): Port to bind; 0 picks a free port.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+    os.makedirs(root, exist_ok=True)
+    handler = type("BoundMediaRequestHandler", (MediaRequestHandler,), {})
+    handler.root = os.path.abspath(root)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def ensure_media_server(
+    root: str = "generated_audio", host: str = DEFAULT_HOST, port: int = DEFAULT_PORT
+) -> Optional[ThreadingHTTPServer]:
+    """
+    Returns the process-wide media server, starting it on first use. A running
+    server is switched to ``root`` if the artifact root changed.
+
+    Returns:
+        ThreadingHTTPServer | None: The server, or None if it could not be started
+        (for example because the port is taken).
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            try:
+                _server = start_media_server(root, host, port)
+            except OSError as e:
+                print(f"Warning: could not start media server on {host}:{port}: {e}")
+                return None
+        else:
+            _server.RequestHandlerClass.root = os.path.abspath(root)
+        return _server
+
+
+def media_url(
+    path: str,
+    base_url: str,
+    root: str = "generated_audio",
+    download: bool = False,
+) -> str:
+    """
+    Returns the URL under which the media server serves ``path``.
+
+    Args:
+        path (str): File below ``root``.
+        base_url (str): Public base URL of the media server, e.g. "http://localhost:8502".
+        root (str, optional): Directory served by the media server.
+        download (bool, optional): Ask the server to send the file as an attachment.
+    """
+    relative = os.path.relpath(os.path.abspath(path), os.path.abspath(root))
+    url = f"{base_url.rstrip('/')}/{quote(relative.replace(os.sep, '/'))}"
+    return url + "?download=1" if download else url
@@ -0,0 +1,225 @@
+"""
+Indexed library of background music beds.
+
+Every audio file in the music directory is analysed once (duration, sample rate,
+loudness, tempo) and the results are persisted in a JSON index next to the
+files. Beds are then picked by genre tags and by how close their duration is
+to the voice-over, which also keeps stretching to a minimum. Scans are cached
+in memory until the directory changes, so mixing a trailer does not re-read
+the index.
+"""
+
+import os
+import re
+import json
+import tempfile
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+from scripts.lazy_import import lazy_import
+
+audio_engine = lazy_import("scripts.audio_engine")
+
+
+DEFAULT_MUSIC_DIR = os.path.join("assets", "audio")
+INDEX_FILENAME = "music_index.json"
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".flac", ".m4a")
+
+# Last scan per music directory, with the signature it was made at
+_scans: Dict[str, Tuple[tuple, List["Track"]]] = {}
+_scans_lock = threading.Lock()
+
+
+@dataclass
+class Track:
+    """Metadata for one music bed in the library."""
+
+    path: str
+    mtime: float
+    duration_ms: float
+    frame_rate: int
+    channels: int
+    loudness_lufs: float
+    tempo: Optional[float]
+    cache_path: str
+    # Lowercase genre keywords, e.g. ["horror", "western"]. Taken from the file
+    # name on first scan; edits made in the index file are kept on rescans.
+    tags: List[str] = field(default_factory=list)
+
+
+def _words(text: str) -> List[str]:
+    """Splits text into lowercase alphanumeric words."""
+    return [w for w in re.split(r"[^a-z0-9]+", text.lower()) if w]
+
+
+def index_path_for(music_dir: str) -> str:
+    """Returns the location of the index file for a music directory."""
+    return os.path.join(music_dir, INDEX_FILENAME)
+
+
+def load_index(music_dir: str = DEFAULT_MUSIC_DIR) -> List[Track]:
+    """
+    Loads the persisted library index without touching the audio files.
+
+    Returns:
+        list[Track]: Indexed tracks, or an empty list if there is no index yet.
+    """
+    index_path = index_path_for(music_dir)
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path, "r", encoding="utf-8") as f:
+        return [Track(**entry) for entry in json.load(f).get("tracks", [])]
+
+
+def save_index(tracks: List[Track], music_dir: str = DEFAULT_MUSIC_DIR) -> str:
+    """
+    Writes the library index and returns its path.
+
+    The index is written to a temporary file of its own and moved into place,
+    so concurrent writers never interleave and readers never see a partial file.
+    """
+    index_path = index_path_for(music_dir)
+    with tempfile.NamedTemporaryFile(
+        "w",
+        dir=music_dir,
+        prefix=f".{INDEX_FILENAME}-",
+        suffix=".tmp",
+        delete=False,
+        encoding="utf-8",
+    ) as f:
+        tmp_path = f.name
+        try:
+            json.dump({"tracks": [asdict(t) for t in tracks]}, f, indent=4)
+        except BaseException:
+            f.close()
+            os.remove(tmp_path)
+            raise
+    os.replace(tmp_path, index_path)
+    return index_path
+
+
+def _signature(music_dir: str) -> tuple:
+    """Changes when files are added, removed or renamed, or the index is edited."""
+    try:
+        index = os.stat(index_path_for(music_dir))
+        index_state = (index.st_mtime_ns, index.st_size)
+    except FileNotFoundError:
+        index_state = None
+    return (os.stat(music_dir).st_mtime_ns, index_state)
+
+
+def analyse_track(path: str, cache_dir: Optional[str] = None) -> Track:
+    """
+    Decodes and analyses one music file.
+
+    Decoding goes through the audio engine cache, so the decoded PCM and loudness
+    are reused by the mixer afterwards.
+    """
+    cache_dir = cache_dir or audio_engine.DEFAULT_CACHE_DIR
+    bed = audio_engine.load_music_bed(path, cache_dir)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return Track(
+        path=path,
+        mtime=os.path.getmtime(path),
+        duration_ms=bed.duration_ms,
+        frame_rate=bed.frame_rate,
+        channels=bed.channels,
+        loudness_lufs=audio_engine.bed_loudness(path, cache_dir),
+        tempo=audio_engine.estimate_tempo(bed),
+        cache_path=audio_engine.cache_path_for(path, cache_dir),
+        tags=_words(stem),
+    )
+
+
+def scan_library(
+    music_dir: str = DEFAULT_MUSIC_DIR,
+    cache_dir: Optional[str] = None,
+    refresh: bool = False,
+) -> List[Track]:
+    """
+    Brings the library index up to date with the music directory.
+
+    Unchanged files keep their index entry; new or modified files are analysed
+    and removed files are dropped. The index is only rewritten when it changed.
+    The result is reused until the directory's or the index's mtime changes;
+    a file replaced in place without either is picked up with ``refresh``.
+
+    Args:
+        music_dir (str, optional): Directory holding the music beds.
+        cache_dir (str, optional): Directory for decoded PCM caches. Defaults to
+            the audio engine's cache directory.
+        refresh (bool, optional): Check every file even if the directory did
+            not change.
+
+    Returns:
+        list[Track]: All tracks in the library, sorted by path.
+    """
+    if not os.path.isdir(music_dir):
+        return []
+
+    key = os.path.abspath(music_dir)
+    # One scan at a time: concurrent mixes wait for it instead of repeating it
+    with _scans_lock:
+        cached = _scans.get(key)
+        if cached and not refresh and cached[0] == _signature(music_dir):
+            return list(cached[1])
+        tracks = _scan(music_dir, cache_dir)
+        _scans[key] = (_signature(music_dir), tracks)
+        return list(tracks)
+
+
+def _scan(music_dir: str, cache_dir: Optional[str]) -> List[Track]:
+    indexed = {t.path: t for t in load_index(music_dir)}
+    tracks = []
+    changed = False
+    for name in sorted(os.listdir(music_dir)):
+        if not name.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        path = os.path.join(music_dir, name)
+        track = indexed.pop(path, None)
+        if track is None or track.mtime != os.path.getmtime(path):
+            tags = track.tags if track else None
+            track = analyse_track(path, cache_dir)
+            if tags:
+                track.tags = tags
+            changed = True
+        tracks.append(track)
+
+    if changed or indexed:
+        save_index(tracks, music_dir)
+    return tracks
+
+
+def select_track(
+    tracks: List[Track],
+    genre: Optional[str] = None,
+    duration_ms: Optional[float] = None,
+) -> Optional[Track]:
+    """
+    Picks the best bed for a trailer.
+
+    Tracks sharing the most words with ``genre`` are preferred (for example a
+    track tagged "horror" for "Cosmic Horror Comedy"). Ties, or all tracks when
+    nothing matches the genre, are broken by the closest duration to the
+    voice-over.
+
+    Args:
+        tracks (list[Track]): Candidate tracks.
+        genre (str, optional): The selected Genre element.
+        duration_ms (float, optional): Voice-over length in milliseconds.
+
+    Returns:
+        Track | None: The chosen track, or None if the library is empty.
+    """
+    if not tracks:
+        return None
+
+    genre_words = set(_words(genre or ""))
+
+    def score(track: Track):
+        matches = len(genre_words.intersection(track.tags))
+        distance = abs(track.duration_ms - duration_ms) if duration_ms else 0.0
+        return (-matches, distance, track.path)
+
+    return min(tracks, key=score)
@@ -0,0 +1,315 @@
+"""
+Keeps local Ollama models loaded between sparse requests.
+
+Ollama unloads a model OLLAMA_KEEP_ALIVE (5 minutes by default) after its last
+request, and loading it again takes seconds, or minutes on CPU-only boxes. In
+local mode that cold load is most of the wait. The manager preloads the model
+picked in the sidebar with an empty request to the native /api/generate
+endpoint carrying a per-model ``keep_alive``, records how long the load took,
+and re-arms the keep_alive before it runs out. Generation requests go through
+the OpenAI-compatible endpoint, which cannot pass keep_alive and resets the
+timer to the server default.
+
+The configured models are warmed as soon as the app starts and whenever a
+server becomes reachable, so switching to local mode does not wait for a load.
+"""
+
+import re
+import time
+import threading
+from datetime import datetime
+from dataclasses import dataclass, replace
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional
+
+from scripts.lazy_import import lazy_import
+
+requests = lazy_import("requests", "talking to Ollama")
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_KEEP_ALIVE = "30m"
+# Loading a large model on a CPU box can take minutes
+LOAD_TIMEOUT = 600.0
+# /api/ps is asked at most this often
+RUNNING_TTL = 5.0
+# A failed load is not retried before this (Ollama down, unknown model)
+RETRY_FAILED_AFTER = 30.0
+
+MODEL_STATES = ("unloaded", "loading", "loaded", "failed")
+
+_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+@dataclass
+class ModelState:
+    """Load state of one model as far as this process knows."""
+
+    model: str
+    status: str = "unloaded"
+    # How long the last load took
+    load_seconds: Optional[float] = None
+    loaded_at: Optional[float] = None
+    # When Ollama will unload the model unless it is used or re-armed
+    expires_at: Optional[float] = None
+    error: Optional[str] = None
+    failed_at: Optional[float] = None
+
+
+def ollama_host(base_url: Optional[str]) -> str:
+    """Returns the native API host for an OpenAI-compatible Ollama base URL."""
+    host = (base_url or DEFAULT_HOST).rstrip("/")
+    return host[: -len("/v1")] if host.endswith("/v1") else host
+
+
+def keep_alive_seconds(keep_alive) -> float:
+    """
+    Converts an Ollama keep_alive ("30m", "1h30m", "90s", 300, "-1") to seconds.
+
+    Returns:
+        float: Seconds; infinity for a negative value (keep loaded forever).
+
+    Raises:
+        ValueError: If the value is not a duration.
+    """
+    if isinstance(keep_alive, (int, float)):
+        seconds = float(keep_alive)
+    else:
+        text = str(keep_alive).strip()
+        try:
+            seconds = float(text)
+        except ValueError:
+            parts = _DURATION.findall(text)
+            if not parts or "".join(n + u for n, u in parts) != text:
+                raise ValueError(f"Invalid keep_alive: {keep_alive!r}") from None
+            seconds = sum(float(n) * _UNIT_SECONDS[u] for n, u in parts)
+    return float("inf") if seconds < 0 else seconds
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """Parses an /api/ps ``expires_at`` (RFC 3339, nanosecond precision)."""
+    if not value:
+        return None
+    # fromisoformat takes at most microseconds
+    value = re.sub(r"(\.\d{6})\d+", r"\1", value).replace("Z", "+00:00")
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+class OllamaManager:
+    """
+    Preloads models on one Ollama server and keeps them loaded.
+
+    Args:
+        host (str, optional): Native API host, e.g. "http://localhost:11434".
+        keep_alive (str, optional): How long Ollama keeps a model loaded.
+        model_keep_alive (dict, optional): keep_alive overrides by model name.
+    """
+
+    def __init__(
+        self,
+        host: str = DEFAULT_HOST,
+        keep_alive: str = DEFAULT_KEEP_ALIVE,
+        model_keep_alive: Optional[Dict[str, str]] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.host = host
+        self.keep_alive = keep_alive
+        self.model_keep_alive = dict(model_keep_alive or {})
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._states: Dict[str, ModelState] = {}
+        self._running: Dict[str, Optional[float]] = {}
+        self._running_checked = float("-inf")
+        self._installed: Optional[List[str]] = None
+        self._installed_checked = float("-inf")
+        self._warming = False
+        # Set by ollama_scheduler: loads then wait for the model's turn
+        self.scheduler = None
+
+    def keep_alive_for(self, model: str) -> str:
+        """Returns the keep_alive used for a model."""
+        return self.model_keep_alive.get(model, self.keep_alive)
+
+    def state(self, model: str) -> ModelState:
+        """Returns a snapshot of a model's load state."""
+        with self._lock:
+            return replace(self._states.get(model) or ModelState(model))
+
+    def running(self, refresh: bool = False) -> Dict[str, Optional[float]]:
+        """
+        Returns the models Ollama has loaded and when each will be unloaded.
+
+        The answer of /api/ps is reused for RUNNING_TTL seconds. An unreachable
+        server has no models loaded.
+        """
+        now = self.clock()
+        if refresh or now - self._running_checked >= RUNNING_TTL:
+            try:
+                response = requests.get(f"{self.host}/api/ps", timeout=5)
+                response.raise_for_status()
+                self._running = {
+                    entry["name"]: _timestamp(entry.get("expires_at"))
+                    for entry in response.json().get("models", [])
+                }
+            except (requests.exceptions.RequestException, ValueError) as e:
+                print(f"Warning: could not list loaded Ollama models: {e}")
+                self._running = {}
+            self._running_checked = now
+        return dict(self._running)
+
+    def installed(self) -> Optional[List[str]]:
+        """
+        Returns the models pulled on the server (asked at most every
+        RUNNING_TTL seconds), or None if the server is not reachable.
+        """
+        now = self.clock()
+        if now - self._installed_checked >= RUNNING_TTL:
+            try:
+                response = requests.get(f"{self.host}/api/tags", timeout=5)
+                response.raise_for_status()
+                self._installed = [
+                    entry["name"] for entry in response.json().get("models", [])
+                ]
+            except (requests.exceptions.RequestException, ValueError):
+                # No server is a normal state; nothing to warn about
+                self._installed = None
+            self._installed_checked = now
+        return None if self._installed is None else list(self._installed)
+
+    def warm(self, models: Iterable[str]) -> None:
+        """
+        Keeps ``models`` loaded if the server is reachable, skipping models that
+        are not pulled. Runs in the background, so it is cheap enough to call on
+        every rerun whichever mode the app is in.
+        """
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = True
+        threading.Thread(
+            target=self._warm, args=(tuple(models),), name="ollama-warm", daemon=True
+        ).start()
+
+    def _warm(self, models) -> None:
+        try:
+            installed = self.installed()
+            if installed is None:
+                return
+            for model in models:
+                if model in installed or f"{model}:latest" in installed:
+                    self.ensure_warm(model)
+        finally:
+            with self._lock:
+                self._warming = False
+
+    def load(self, model: str) -> ModelState:
+        """
+        Loads a model (or re-arms its keep_alive) and waits for it.
+
+        Returns:
+            ModelState: The model's state afterwards; "failed" with the error if
+            Ollama could not load it.
+        """
+        keep_alive = self.keep_alive_for(model)
+        with self._lock:
+            state = self._states.setdefault(model, ModelState(model))
+            state.status, state.error = "loading", None
+            # Loading a new model may evict one that is serving requests;
+            # re-arming a loaded one does not
+            slot = (
+                self.scheduler.slot(model)
+                if self.scheduler is not None and model not in self._running
+                else nullcontext()
+            )
+        try:
+            with slot:
+                started = self.clock()
+                response = requests.post(
+                    f"{self.host}/api/generate",
+                    json={"model": model, "keep_alive": keep_alive},
+                    timeout=LOAD_TIMEOUT,
+                )
+            response.raise_for_status()
+            # load_duration is 0 when the model was already loaded
+            load_ns = response.json().get("load_duration") or 0
+        except (requests.exceptions.RequestException, ValueError, TimeoutError) as e:
+            print(f"Warning: could not load Ollama model {model}: {e}")
+            with self._lock:
+                state.status, state.error = "failed", str(e)
+                state.failed_at = self.clock()
+                return replace(state)
+        now = self.clock()
+        with self._lock:
+            if load_ns or state.load_seconds is None:
+                state.load_seconds = load_ns / 1e9 if load_ns else now - started
+                state.loaded_at = now
+            state.status = "loaded"
+            state.expires_at = now + keep_alive_seconds(keep_alive)
+            self._running[model] = state.expires_at
+            return replace(state)
+
+    def ensure_warm(self, model: str) -> ModelState:
+        """
+        Starts loading a model in the background unless it is loaded and more
+        than half of its keep_alive is left. Cheap enough to call on every rerun.
+
+        Returns:
+            ModelState: The model's state, "loading" if a load was started.
+        """
+        with self._lock:
+            state = self._states.setdefault(model, ModelState(model))
+            if state.status == "loading" or (
+                state.status == "failed"
+                and self.clock() - state.failed_at < RETRY_FAILED_AFTER
+            ):
+                return replace(state)
+        running = self.running()
+        now = self.clock()
+        remaining = float("-inf")
+        if model in running:
+            expires_at = running[model]
+            remaining = float("inf") if expires_at is None else expires_at - now
+        with self._lock:
+            if state.status == "loading":
+                return replace(state)
+            if remaining > keep_alive_seconds(self.keep_alive_for(model)) / 2:
+                state.status = "loaded"
+                state.expires_at = running[model]
+                return replace(state)
+            state.status, state.error = "loading", None
+            snapshot = replace(state)
+        threading.Thread(
+            target=self.load, args=(model,), name=f"ollama-load-{model}", daemon=True
+        ).start()
+        return snapshot
+
+
+_managers: Dict[str, OllamaManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_ollama_manager(
+    host: str = DEFAULT_HOST,
+    keep_alive: Optional[str] = None,
+    model_keep_alive: Optional[Dict[str, str]] = None,
+) -> OllamaManager:
+    """
+    Returns the process-wide manager of an Ollama host, updated to the given
+    keep_alive settings. Without ``keep_alive`` the settings are left as they
+    are (or the defaults, for a new manager).
+    """
+    if keep_alive is not None:
+        keep_alive_seconds(keep_alive)
+    with _managers_lock:
+        manager = _managers.get(host)
+        if manager is None:
+            manager = _managers[host] = OllamaManager(
+                host, keep_alive or DEFAULT_KEEP_ALIVE, model_keep_alive
+            )
+        elif keep_alive is not None:
+            manager.keep_alive = keep_alive
+            manager.model_keep_alive = dict(model_keep_alive or {})
+        return manager
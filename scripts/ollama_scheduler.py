@@ -0,0 +1,255 @@
+"""
+Client-side scheduling of requests to a local Ollama server.
+
+Ollama serves OLLAMA_NUM_PARALLEL requests per loaded model and keeps at most
+OLLAMA_MAX_LOADED_MODELS models in memory; everything else queues inside the
+server. When sessions pick different models, each request for another model
+evicts the loaded one and the next request loads it back, so a CPU-only box
+spends its time loading models instead of generating.
+
+The scheduler admits requests within those limits and decides who goes next
+when a slot frees up:
+
+- requests for a model that is already running go first, so requests are
+  served in per-model batches instead of alternating models;
+- then requests for models Ollama has loaded;
+- then the oldest request.
+
+So that a busy model cannot starve the others, a model that was admitted
+``batch_limit`` times in a row gives way as soon as another model is waiting.
+"""
+
+import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+from urllib.parse import urlsplit
+
+from scripts.ollama_manager import DEFAULT_HOST, get_ollama_manager, ollama_host
+
+# Ollama's port; other base URLs are only scheduled once registered
+OLLAMA_PORT = 11434
+DEFAULT_BATCH_LIMIT = 8
+# Generous: a request may queue behind several slow CPU generations
+DEFAULT_QUEUE_TIMEOUT = 600.0
+
+
+class OllamaBusyError(TimeoutError):
+    """Raised when a request does not get a slot within the timeout."""
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        return default
+
+
+@dataclass
+class _Waiter:
+    model: str
+    seq: int
+
+
+class OllamaScheduler:
+    """
+    Admits requests to one Ollama server within its parallelism limits.
+
+    Args:
+        num_parallel (int, optional): Requests per model at a time. Defaults to
+            OLLAMA_NUM_PARALLEL, or 1.
+        max_loaded_models (int, optional): Models in use at a time. Defaults to
+            OLLAMA_MAX_LOADED_MODELS, or 1.
+        loaded_models (callable, optional): Returns the models Ollama has loaded.
+        batch_limit (int, optional): Admissions in a row for one model before
+            it gives way to a waiting model.
+    """
+
+    def __init__(
+        self,
+        num_parallel: Optional[int] = None,
+        max_loaded_models: Optional[int] = None,
+        loaded_models: Optional[Callable[[], Iterable[str]]] = None,
+        batch_limit: int = DEFAULT_BATCH_LIMIT,
+    ):
+        self.num_parallel = num_parallel or _env_int("OLLAMA_NUM_PARALLEL", 1)
+        self.max_loaded_models = max_loaded_models or _env_int(
+            "OLLAMA_MAX_LOADED_MODELS", 1
+        )
+        self.loaded_models = loaded_models
+        self.batch_limit = batch_limit
+        self._cond = threading.Condition()
+        self._active: Dict[str, int] = {}
+        self._waiting: List[_Waiter] = []
+        self._loaded: Set[str] = set()
+        self._streak_model: Optional[str] = None
+        self._streak = 0
+        self._seq = itertools.count()
+
+    @property
+    def max_in_flight(self) -> int:
+        """Requests admitted at a time across all models."""
+        return self.num_parallel * self.max_loaded_models
+
+    def _refresh_loaded(self) -> None:
+        # Outside the lock: the manager may ask the server
+        if self.loaded_models is not None:
+            loaded = set(self.loaded_models())
+            with self._cond:
+                self._loaded = loaded
+
+    def _can_start(self, model: str) -> bool:
+        if sum(self._active.values()) >= self.max_in_flight:
+            return False
+        if model in self._active:
+            return self._active[model] < self.num_parallel
+        return len(self._active) < self.max_loaded_models
+
+    def _next(self) -> Optional[_Waiter]:
+        """Returns the waiter to admit next, or None if none can start."""
+        waiting_models = {w.model for w in self._waiting}
+        yielding = (
+            self._streak_model
+            if self._streak >= self.batch_limit and len(waiting_models) > 1
+            else None
+        )
+        candidates = [
+            w
+            for w in self._waiting
+            if w.model != yielding and self._can_start(w.model)
+        ]
+        if not candidates:
+            return None
+        return min(
+            candidates,
+            key=lambda w: (
+                w.model not in self._active,
+                w.model not in self._loaded,
+                w.seq,
+            ),
+        )
+
+    def acquire(self, model: str, timeout: float = DEFAULT_QUEUE_TIMEOUT) -> None:
+        """
+        Waits for a slot for a request to ``model``.
+
+        Raises:
+            OllamaBusyError: If no slot became free within ``timeout`` seconds.
+        """
+        self._refresh_loaded()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            waiter = _Waiter(model, next(self._seq))
+            self._waiting.append(waiter)
+            while self._next() is not waiter:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(waiter)
+                    self._cond.notify_all()
+                    raise OllamaBusyError(
+                        f"Ollama is busy: no slot for {model} within {timeout:.0f}s"
+                    )
+                self._cond.wait(remaining)
+            self._waiting.remove(waiter)
+            self._active[model] = self._active.get(model, 0) + 1
+            if model == self._streak_model:
+                self._streak += 1
+            else:
+                self._streak_model, self._streak = model, 1
+            # A model in use is loaded from now on
+            self._loaded.add(model)
+            # More slots may be free for the next waiters
+            self._cond.notify_all()
+
+    def release(self, model: str) -> None:
+        """Frees the slot of a finished request to ``model``."""
+        with self._cond:
+            self._active[model] -= 1
+            if not self._active[model]:
+                del self._active[model]
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(
+        self, model: str, timeout: float = DEFAULT_QUEUE_TIMEOUT
+    ) -> Iterator[None]:
+        """Holds a slot for a request to ``model`` while the block runs."""
+        self.acquire(model, timeout)
+        try:
+            yield
+        finally:
+            self.release(model)
+
+    def pick_model(self, candidates: List[str]) -> Optional[str]:
+        """
+        Picks from interchangeable models the one that is cheapest to use now:
+        one serving requests, then one Ollama has loaded, then the first.
+        """
+        if not candidates:
+            return None
+        self._refresh_loaded()
+        with self._cond:
+            return min(
+                candidates,
+                key=lambda m: (m not in self._active, m not in self._loaded),
+            )
+
+    def status(self) -> Dict[str, Dict[str, int]]:
+        """Returns in-flight and queued requests by model."""
+        with self._cond:
+            models = set(self._active) | {w.model for w in self._waiting}
+            return {
+                model: {
+                    "in_flight": self._active.get(model, 0),
+                    "queued": sum(1 for w in self._waiting if w.model == model),
+                }
+                for model in models
+            }
+
+
+_schedulers: Dict[str, OllamaScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_ollama_scheduler(
+    host: str = DEFAULT_HOST,
+    num_parallel: Optional[int] = None,
+    max_loaded_models: Optional[int] = None,
+) -> OllamaScheduler:
+    """
+    Returns the process-wide scheduler of an Ollama host, updated to the given
+    limits (None keeps the current ones). It learns which models are loaded
+    from the host's OllamaManager, whose preloads it schedules as well.
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(host)
+        if scheduler is None:
+            manager = get_ollama_manager(host)
+            scheduler = _schedulers[host] = OllamaScheduler(
+                num_parallel,
+                max_loaded_models,
+                loaded_models=lambda: manager.running().keys(),
+            )
+            manager.scheduler = scheduler
+        else:
+            if num_parallel:
+                scheduler.num_parallel = num_parallel
+            if max_loaded_models:
+                scheduler.max_loaded_models = max_loaded_models
+        return scheduler
+
+
+def scheduler_for(base_url: str) -> Optional[OllamaScheduler]:
+    """
+    Returns the scheduler for requests to ``base_url``: the registered one of
+    its host, or a new one for hosts on Ollama's port. None for other APIs.
+    """
+    host = ollama_host(base_url)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(host)
+    if scheduler is None and urlsplit(host).port == OLLAMA_PORT:
+        scheduler = get_ollama_scheduler(host)
+    return scheduler
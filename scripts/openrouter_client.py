@@ -1,10 +1,10 @@
-import requests
-import streamlit as st
 from typing import List, Dict, Any, Optional
-from scripts.config import Config
+from scripts.config import Config, get_config
 from scripts import prompts
+from scripts.lazy_import import lazy_import
 import socket
-from requests.exceptions import RequestException
+
+requests = lazy_import("requests")
 
 
 class OpenRouterClient:
@@ -16,14 +16,14 @@ class OpenRouterClient:
         """Initialize the OpenRouter client.
 
         Args:
-            config: Optional Config instance. If not provided, will load from environment.
+            config: Optional Config instance. If not provided, the shared snapshot is used.
         """
-        self.config = config or Config.load()
+        self.config = config or get_config()
         if not self.config.is_valid():
             raise ValueError("OpenRouter API key not configured")
 
         self.headers = {
-            "Authorization": f"Bearer {st.secrets.OPENROUTER_API_KEY}",
+            "Authorization": f"Bearer {self.config.openrouter_api_key}",
             "Content-Type": "application/json",
             "X-Title": "Stupid Movie Trailer Generator",
         }
@@ -89,7 +89,7 @@ class OpenRouterClient:
             return result["choices"][0]["message"]["content"]
 
         except Exception as e:
-            raise RequestException(f"OpenRouter API request failed: {str(e)}")
+            raise requests.exceptions.RequestException(f"OpenRouter API request failed: {str(e)}")
 
     def get_available_models(self) -> List[Dict[str, Any]]:
         """Get list of available models from OpenRouter.
@@ -114,7 +114,7 @@ class OpenRouterClient:
             return result["data"]
 
         except Exception as e:
-            raise RequestException(f"Failed to fetch models: {str(e)}")
+            raise requests.exceptions.RequestException(f"Failed to fetch models: {str(e)}")
 
     def check_health(self) -> bool:
         """Check if OpenRouter API is accessible."""
@@ -0,0 +1,110 @@
+"""
+Compiled prompt templates with a static, cacheable prefix.
+
+Providers cache prompts by prefix: OpenAI and DeepSeek do it automatically,
+Anthropic and Gemini models on OpenRouter when the prefix carries a
+``cache_control`` marker, and Ollama reuses the KV cache of a loaded model for
+the tokens a request shares with the previous one. A cached prefix is neither
+re-processed (time to first token) nor, by most providers, billed in full.
+
+A template therefore keeps everything static (persona, rules, examples) in a
+system message that is byte-for-byte identical on every call, and only the
+variable fields in the user message after it. Templates are compiled once at
+import: the field names are extracted and the system prefix is checked to be
+free of fields.
+"""
+
+import re
+import string
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+# Model families that only cache a prefix marked with cache_control
+_CACHE_MARKER_MODELS = ("anthropic/", "google/gemini")
+_PLACEHOLDER = re.compile(r"(?<!\{)\{[A-Za-z_]\w*\}(?!\})")
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A static system prefix and a user message template."""
+
+    name: str
+    system: str
+    user: str
+    fields: Tuple[str, ...]
+
+    def render(self, **values: Any) -> str:
+        """
+        Fills in the user message.
+
+        Raises:
+            KeyError: If a field of the template is missing from ``values``.
+        """
+        missing = [name for name in self.fields if name not in values]
+        if missing:
+            raise KeyError(f"{self.name} prompt is missing {', '.join(missing)}")
+        return self.user.format(**values)
+
+    def text(self, **values: Any) -> str:
+        """Returns the whole prompt as one string, e.g. for logging."""
+        return f"{self.system}\n\n{self.render(**values)}"
+
+
+def compile_template(name: str, system: str, user: str) -> PromptTemplate:
+    """
+    Compiles a template.
+
+    Args:
+        name (str): Name used in error messages.
+        system (str): Static instructions, sent first and never formatted.
+        user (str): ``str.format`` template of the variable part.
+
+    Returns:
+        PromptTemplate: The compiled template.
+
+    Raises:
+        ValueError: If the system prefix contains a ``{field}``, which would make
+            it differ between calls.
+    """
+    # The prefix is sent as is, so literal braces (JSON examples) are fine
+    if _PLACEHOLDER.search(system):
+        raise ValueError(f"System prefix of the {name} prompt must be static")
+    fields = tuple(
+        dict.fromkeys(
+            field for _, field, _, _ in string.Formatter().parse(user) if field
+        )
+    )
+    return PromptTemplate(name=name, system=system, user=user, fields=fields)
+
+
+def supports_cache_marker(base_url: str, model_name: str) -> bool:
+    """Returns whether a provider and model need an explicit cache marker."""
+    return "openrouter.ai" in (base_url or "") and (model_name or "").startswith(
+        _CACHE_MARKER_MODELS
+    )
+
+
+def build_messages(
+    prompt: str, system: Optional[str] = None, cache_marker: bool = False
+) -> List[Dict[str, Any]]:
+    """
+    Builds chat messages: the system prefix (if any) followed by the prompt.
+
+    Args:
+        prompt (str): The user message.
+        system (str, optional): Static system prefix.
+        cache_marker (bool, optional): Mark the system prefix for prompt caching.
+
+    Returns:
+        list[dict]: OpenAI-style chat messages.
+    """
+    messages: List[Dict[str, Any]] = []
+    if system:
+        content: Any = system
+        if cache_marker:
+            content = [
+                {"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}
+            ]
+        messages.append({"role": "system", "content": content})
+    messages.append({"role": "user", "content": prompt})
+    return messages
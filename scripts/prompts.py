@@ -2,19 +2,14 @@
 Centralized storage for all prompts and system messages used in the application.
 """
 
+from scripts.prompt_templates import compile_template
+
 # Movie Title Generation
 MOVIE_TITLE_SYSTEM_PROMPT = """You are a creative movie title generator. Output ONLY the movie title as plain text. 
     Do not include any formatting, quotes, brackets, or explanations."""
 
-MOVIE_TITLE_USER_PROMPT = """Based on the following movie elements:
-Genre: {genre}
-Main Character: {main_character}
-Setting: {setting}
-Conflict: {conflict}
-Plot Twist: {plot_twist}
-generate a catchy and appropriate movie title.
-
-Guidelines:
+# Static rules; sent in the system prefix so providers can cache them
+MOVIE_TITLE_GUIDELINES = """Guidelines:
 - The title should be short and memorable (1-5 words)
 - It should reflect the genre, tone, and main elements of the movie
 - Be creative and avoid generic titles
@@ -28,19 +23,59 @@ Blade Runner
 The Matrix
 Inception"""
 
-# Script Generation
-SCRIPT_SYSTEM_PROMPT = """You are a professional movie-trailer voice artist. Output ONLY the spoken script, optimized for text-to-speech and strictly limited to 60 words."""
-
-SCRIPT_USER_PROMPT = """
-# Movie Elements
-Title: {title}
+MOVIE_TITLE_ELEMENTS_PROMPT = """Based on the following movie elements:
 Genre: {genre}
+Main Character: {main_character}
 Setting: {setting}
-Main Character: {character}
 Conflict: {conflict}
 Plot Twist: {plot_twist}
+generate a catchy and appropriate movie title."""
+
+MOVIE_TITLE_USER_PROMPT = MOVIE_TITLE_ELEMENTS_PROMPT + "\n\n" + MOVIE_TITLE_GUIDELINES
+
+# Structured title output: providers that support JSON schema (OpenAI-compatible
+# `response_format`, which Ollama maps to its `format` option) are held to it.
+# Only keywords strict mode accepts are used; title length is checked by
+# script_validation.title_issues
+MOVIE_TITLE_SCHEMA = {
+    "type": "object",
+    "properties": {"title": {"type": "string"}},
+    "required": ["title"],
+    "additionalProperties": False,
+}
+
+MOVIE_TITLE_JSON_INSTRUCTION = """Respond with JSON only, in the form {"title": "<the title>"}"""
+
+# Bulk titles: several numbered combinations in one request
+MOVIE_TITLES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "titles": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "id": {"type": "integer"},
+                    "title": {"type": "string"},
+                },
+                "required": ["id", "title"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["titles"],
+    "additionalProperties": False,
+}
+
+MOVIE_TITLES_INSTRUCTION = """You will get several numbered sets of movie elements. Generate one title per set, following the guidelines for each.
+Respond with JSON only, in the form {"titles": [{"id": 1, "title": "<title for set 1>"}, {"id": 2, "title": "<title for set 2>"}]}, with one entry per set."""
 
-# Output Rules
+MOVIE_TITLES_ITEM_PROMPT = """{id}. Genre: {genre} | Main Character: {main_character} | Setting: {setting} | Conflict: {conflict} | Plot Twist: {plot_twist}"""
+
+# Script Generation
+SCRIPT_SYSTEM_PROMPT = """You are a professional movie-trailer voice artist. Output ONLY the spoken script, optimized for text-to-speech and strictly limited to 60 words."""
+
+SCRIPT_RULES = """# Output Rules
 1. CONTENT:
    - Pure spoken text only
    - No scene descriptions, camera directions, or sound effects
@@ -59,10 +94,113 @@ Plot Twist: {plot_twist}
    - Maximum 60 words total
    - Optimize for text-to-speech clarity
 
-# Example Output:
-"In a world of ENDLESS possibilities, one TRUTH remains. The path ahead is DANGEROUS - but the cost of failure? UNIMAGINABLE. {title}."
+# Example Output (for the title "The Matrix"):
+"In a world of ENDLESS possibilities, one TRUTH remains. The path ahead is DANGEROUS - but the cost of failure? UNIMAGINABLE. The Matrix."
+"""
+
+SCRIPT_ELEMENTS_PROMPT = """# Movie Elements
+Title: {title}
+Genre: {genre}
+Setting: {setting}
+Main Character: {character}
+Conflict: {conflict}
+Plot Twist: {plot_twist}
 """
 
+SCRIPT_USER_PROMPT = "\n" + SCRIPT_ELEMENTS_PROMPT + "\n" + SCRIPT_RULES
+
 # OpenRouter specific prompts (for compatibility)
 OPENROUTER_SCRIPT_SYSTEM_PROMPT = SCRIPT_SYSTEM_PROMPT
 OPENROUTER_SCRIPT_USER_PROMPT = SCRIPT_USER_PROMPT
+
+# Compiled once: static instructions first, variable fields last
+TITLE_TEMPLATE = compile_template(
+    "title",
+    MOVIE_TITLE_SYSTEM_PROMPT + "\n\n" + MOVIE_TITLE_GUIDELINES,
+    MOVIE_TITLE_ELEMENTS_PROMPT,
+)
+STRUCTURED_TITLE_TEMPLATE = compile_template(
+    "structured title",
+    TITLE_TEMPLATE.system + "\n\n" + MOVIE_TITLE_JSON_INSTRUCTION,
+    MOVIE_TITLE_ELEMENTS_PROMPT,
+)
+BULK_TITLE_TEMPLATE = compile_template(
+    "bulk title",
+    TITLE_TEMPLATE.system + "\n\n" + MOVIE_TITLES_INSTRUCTION,
+    "{combinations}",
+)
+SCRIPT_TEMPLATE = compile_template(
+    "script", SCRIPT_SYSTEM_PROMPT + "\n\n" + SCRIPT_RULES, SCRIPT_ELEMENTS_PROMPT
+)
+
+
+def title_template(structured=False):
+    """Returns the compiled title template, asking for JSON with ``structured``."""
+    return STRUCTURED_TITLE_TEMPLATE if structured else TITLE_TEMPLATE
+
+
+def title_fields(elements):
+    """Returns the title template fields for the trailer elements."""
+    return {
+        "genre": elements["Genre"],
+        "main_character": elements["Main Character"],
+        "setting": elements["Setting"],
+        "conflict": elements["Conflict"],
+        "plot_twist": elements["Plot Twist"],
+    }
+
+
+def title_prompt(elements, structured=False):
+    """Returns the whole title prompt (system prefix and elements) as text."""
+    return title_template(structured).text(**title_fields(elements))
+
+
+def title_response_format():
+    """Returns the OpenAI ``response_format`` holding titles to MOVIE_TITLE_SCHEMA."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "movie_title",
+            "strict": True,
+            "schema": MOVIE_TITLE_SCHEMA,
+        },
+    }
+
+
+def bulk_title_fields(elements_list):
+    """Returns the bulk title template fields, numbering the combinations from 1."""
+    return {
+        "combinations": "\n".join(
+            MOVIE_TITLES_ITEM_PROMPT.format(id=number, **title_fields(elements))
+            for number, elements in enumerate(elements_list, start=1)
+        )
+    }
+
+
+def titles_response_format():
+    """Returns the OpenAI ``response_format`` for MOVIE_TITLES_SCHEMA answers."""
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "movie_titles",
+            "strict": True,
+            "schema": MOVIE_TITLES_SCHEMA,
+        },
+    }
+
+
+def script_fields(title, elements):
+    """Returns the script template fields for a title and trailer elements."""
+    return {
+        "title": title,
+        "genre": elements["Genre"],
+        "setting": elements["Setting"],
+        "character": elements["Main Character"],
+        "conflict": elements["Conflict"],
+        "plot_twist": elements["Plot Twist"],
+    }
+
+
+def script_prompt(title, elements):
+    """Returns the whole script prompt (system prefix and elements) as text."""
+    return SCRIPT_TEMPLATE.text(**script_fields(title, elements))
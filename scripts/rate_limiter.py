@@ -0,0 +1,337 @@
+"""
+Token-bucket pacing of outbound API calls per provider and API key.
+
+Each (provider, key) pair has one bucket per limited resource: "requests",
+"tokens" (LLM tokens) or "characters" (TTS characters). Callers acquire what a
+call will cost before sending it and wait while a bucket is empty, instead of
+sending the call and backing off after a 429. Limits start from configured
+defaults and are corrected from the ``x-ratelimit-*`` (and ``retry-after``)
+headers of every response.
+"""
+
+import re
+import time
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+SECONDS_PER_MONTH = 30 * 24 * 3600
+# Longest a caller waits for capacity before giving up
+DEFAULT_MAX_WAIT = 300.0
+
+# Starting limits as (capacity, window in seconds); headers refine them and
+# the rate_limits setting overrides them. OpenRouter free models allow 20
+# requests per minute. ElevenLabs character quotas depend on the plan, are
+# billed per account and month and are not reported in headers, so they are
+# only paced when configured, e.g. (10_000, SECONDS_PER_MONTH) on the free tier.
+DEFAULT_LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "openrouter": {"requests": (20, 60)},
+    "elevenlabs": {"requests": (60, 60)},
+}
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimitTimeout(TimeoutError):
+    """Raised when capacity does not become available within the timeout."""
+
+
+@dataclass
+class TokenBucket:
+    """
+    A bucket holding up to ``capacity`` tokens, refilled continuously at
+    ``refill_rate`` tokens per second.
+    """
+
+    capacity: float
+    refill_rate: float
+    tokens: Optional[float] = None
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    updated: float = field(default=0.0, repr=False)
+    blocked_until: float = field(default=0.0, repr=False)
+
+    def __post_init__(self):
+        if self.tokens is None:
+            self.tokens = self.capacity
+        self.updated = self.clock()
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Returns how long to wait until ``amount`` tokens are available."""
+        now = self.clock()
+        self._refill(now)
+        blocked = max(0.0, self.blocked_until - now)
+        # A single call larger than the bucket only waits for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return blocked
+        if self.refill_rate <= 0:
+            return float("inf")
+        return max(blocked, (amount - self.tokens) / self.refill_rate)
+
+    def consume(self, amount: float) -> None:
+        """Takes ``amount`` tokens; the level may go negative for oversized calls."""
+        self._refill(self.clock())
+        self.tokens -= amount
+
+    def observe(self, limit: float, remaining: float, reset_seconds: Optional[float]) -> None:
+        """
+        Adopts the limit reported by the server.
+
+        The bucket holds ``remaining`` tokens and refills so that it is full
+        again ``reset_seconds`` from now.
+        """
+        self._refill(self.clock())
+        self.capacity = limit
+        self.tokens = min(remaining, limit)
+        if reset_seconds and reset_seconds > 0 and remaining < limit:
+            self.refill_rate = (limit - remaining) / reset_seconds
+
+    def block_for(self, seconds: float) -> None:
+        """Blocks the bucket, e.g. for the ``retry-after`` of a 429 response."""
+        self.blocked_until = max(self.blocked_until, self.clock() + seconds)
+
+
+def parse_duration(value: str, now: Optional[float] = None) -> Optional[float]:
+    """
+    Parses a reset header into seconds from now.
+
+    Accepts plain seconds ("1.5"), Go-style durations ("6m0s", "20ms") and epoch
+    timestamps in seconds or milliseconds (as sent by OpenRouter).
+    """
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts or "".join(n + u for n, u in parts) != value:
+            return None
+        return sum(float(n) * _UNIT_SECONDS[u] for n, u in parts)
+    now = time.time() if now is None else now
+    if number > 1e12:
+        return max(0.0, number / 1000 - now)
+    if number > 1e9:
+        return max(0.0, number - now)
+    return number
+
+
+def parse_rate_limit_headers(
+    headers: Mapping[str, str], now: Optional[float] = None
+) -> Dict[str, Tuple[float, float, Optional[float]]]:
+    """
+    Extracts limits from ``x-ratelimit-*`` headers.
+
+    Handles the OpenAI style (``x-ratelimit-limit-requests``,
+    ``x-ratelimit-remaining-tokens``, ``x-ratelimit-reset-requests``, ...) and the
+    unsuffixed OpenRouter style (``X-RateLimit-Limit``, ``X-RateLimit-Remaining``,
+    ``X-RateLimit-Reset``), which counts requests.
+
+    Returns:
+        dict: Resource name -> (limit, remaining, reset seconds or None).
+    """
+    values: Dict[str, Dict[str, str]] = {}
+    for name, value in headers.items():
+        name = name.lower()
+        if not name.startswith("x-ratelimit-"):
+            continue
+        field_name, _, resource = name[len("x-ratelimit-") :].partition("-")
+        values.setdefault(resource or "requests", {})[field_name] = value
+
+    limits = {}
+    for resource, fields in values.items():
+        try:
+            limit = float(fields["limit"])
+            remaining = float(fields["remaining"])
+        except (KeyError, ValueError):
+            continue
+        reset = parse_duration(fields["reset"], now) if "reset" in fields else None
+        limits[resource] = (limit, remaining, reset)
+    return limits
+
+
+def merge_limits(
+    overrides: Optional[Mapping[str, Mapping[str, Tuple[float, float]]]] = None,
+) -> Dict[str, Dict[str, Tuple[float, float]]]:
+    """
+    Returns DEFAULT_LIMITS updated with configured limits.
+
+    Args:
+        overrides (Mapping, optional): Provider -> resource -> (capacity, window
+            in seconds). A capacity of 0 or less removes the limit.
+    """
+    limits = {
+        provider: dict(resources) for provider, resources in DEFAULT_LIMITS.items()
+    }
+    for provider, resources in (overrides or {}).items():
+        merged = limits.setdefault(provider, {})
+        for resource, (capacity, window) in resources.items():
+            if capacity <= 0:
+                merged.pop(resource, None)
+            else:
+                merged[resource] = (float(capacity), float(window))
+    return limits
+
+
+def provider_for(base_url: str) -> str:
+    """Returns the provider name for an API base URL, e.g. "openrouter"."""
+    host = urlsplit(base_url).hostname or base_url
+    for provider in DEFAULT_LIMITS:
+        if provider in host:
+            return provider
+    return host
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Returns a short, non-reversible id for an API key."""
+    return hashlib.sha1((api_key or "").encode("utf-8")).hexdigest()[:12]
+
+
+class RateLimiter:
+    """
+    Paces calls across threads with token buckets per provider and key.
+
+    Providers without configured limits (e.g. a local Ollama) are not paced
+    until their responses report limits.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, Dict[str, Tuple[float, float]]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.limits = DEFAULT_LIMITS if limits is None else limits
+        self.clock = clock
+        self.sleep = sleep
+        self._buckets: Dict[Tuple[str, str], Dict[str, TokenBucket]] = {}
+        self._lock = threading.Lock()
+
+    def set_limits(self, limits: Dict[str, Dict[str, Tuple[float, float]]]) -> None:
+        """
+        Replaces the configured limits. Buckets of providers whose limits changed
+        start over; the others keep what they learned from headers.
+        """
+        with self._lock:
+            changed = {
+                provider
+                for provider in set(self.limits) | set(limits)
+                if self.limits.get(provider) != limits.get(provider)
+            }
+            self.limits = limits
+            for ident in [i for i in self._buckets if i[0] in changed]:
+                del self._buckets[ident]
+
+    def buckets(self, provider: str, api_key: Optional[str]) -> Dict[str, TokenBucket]:
+        """Returns the buckets of a provider and key, creating them on first use."""
+        ident = (provider, key_id(api_key))
+        if ident not in self._buckets:
+            self._buckets[ident] = {
+                resource: TokenBucket(capacity, capacity / window, clock=self.clock)
+                for resource, (capacity, window) in self.limits.get(provider, {}).items()
+            }
+        return self._buckets[ident]
+
+    def wait_time(self, provider: str, api_key: Optional[str], **costs: float) -> float:
+        """Returns how long a call costing ``costs`` would have to wait."""
+        with self._lock:
+            return self._wait_time(self.buckets(provider, api_key), costs)
+
+    @staticmethod
+    def _wait_time(buckets: Dict[str, TokenBucket], costs: Mapping[str, float]) -> float:
+        waits = [buckets[r].wait_time(amount) for r, amount in costs.items() if r in buckets]
+        return max(waits, default=0.0)
+
+    def acquire(
+        self,
+        provider: str,
+        api_key: Optional[str],
+        timeout: Optional[float] = None,
+        **costs: float,
+    ) -> float:
+        """
+        Waits until every bucket can pay for a call, then takes the tokens.
+
+        Args:
+            provider (str): Provider name, see provider_for.
+            api_key (str): The key the call is sent with.
+            timeout (float, optional): Maximum seconds to wait.
+            **costs: Amount per resource, e.g. ``requests=1, tokens=550``.
+
+        Returns:
+            float: Seconds spent waiting.
+
+        Raises:
+            RateLimitTimeout: If the call cannot be paid for within ``timeout``.
+        """
+        started = self.clock()
+        while True:
+            with self._lock:
+                buckets = self.buckets(provider, api_key)
+                wait = self._wait_time(buckets, costs)
+                if wait <= 0:
+                    for resource, amount in costs.items():
+                        if resource in buckets:
+                            buckets[resource].consume(amount)
+                    return self.clock() - started
+            waited = self.clock() - started
+            if wait == float("inf") or (timeout is not None and waited + wait > timeout):
+                raise RateLimitTimeout(
+                    f"{provider} rate limit: no capacity for {costs} within {timeout}s"
+                )
+            self.sleep(wait)
+
+    def observe(
+        self, provider: str, api_key: Optional[str], headers: Mapping[str, str]
+    ) -> None:
+        """Updates the buckets from the rate-limit headers of a response."""
+        limits = parse_rate_limit_headers(headers)
+        retry_after = headers.get("retry-after") or headers.get("Retry-After")
+        with self._lock:
+            buckets = self.buckets(provider, api_key)
+            for resource, (limit, remaining, reset) in limits.items():
+                if resource not in buckets:
+                    # Assume a per-minute window until a reset header says otherwise
+                    buckets[resource] = TokenBucket(limit, limit / 60, clock=self.clock)
+                buckets[resource].observe(limit, remaining, reset)
+            seconds = parse_duration(retry_after) if retry_after else None
+            if seconds:
+                self._block(buckets, seconds)
+
+    def penalize(self, provider: str, api_key: Optional[str], seconds: float) -> None:
+        """Blocks a provider and key for ``seconds`` (e.g. after an unexpected 429)."""
+        with self._lock:
+            self._block(self.buckets(provider, api_key), seconds)
+
+    def _block(self, buckets: Dict[str, TokenBucket], seconds: float) -> None:
+        if not buckets:
+            buckets["requests"] = TokenBucket(1, 1.0, clock=self.clock)
+        for bucket in buckets.values():
+            bucket.block_for(seconds)
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    limits: Optional[Dict[str, Dict[str, Tuple[float, float]]]] = None,
+) -> RateLimiter:
+    """
+    Returns the process-wide rate limiter shared by all outbound calls, updated
+    to ``limits`` (see merge_limits). Without ``limits`` the current ones are
+    kept (or DEFAULT_LIMITS, for a new limiter).
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(limits)
+        elif limits is not None and limits != _limiter.limits:
+            _limiter.set_limits(limits)
+        return _limiter
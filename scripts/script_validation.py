@@ -0,0 +1,378 @@
+"""
+Deterministic clean-up and validation of generated titles and scripts.
+
+Titles are parsed from JSON or plain output and checked for length and
+placeholders; the caller retries an unusable title once.
+
+SCRIPT_USER_PROMPT asks for pure spoken text of at most 60 words that ends with
+the title and uses one or two UPPERCASE emphasis words per sentence. Models
+follow this loosely, and TTS is billed per character, so scripts are checked
+and repaired here before they are voiced:
+
+- markdown, stage directions, speaker labels and preambles are stripped
+  (parentheses that are not recognisably directions are kept and flagged);
+- over-long scripts lose whole sentences from the end (keeping the title);
+- a missing closing title is appended;
+- surplus emphasis words are lowercased.
+
+Each script gets a compliance score for the raw model output and a verdict on
+whether the repair went so far that the script should be regenerated.
+All patterns are compiled once at import.
+"""
+
+import re
+import json
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+MAX_WORDS = 60
+MAX_EMPHASIS_PER_SENTENCE = 2
+# Regenerate instead of repairing when more of the content had to be cut
+MAX_TRIMMED_FRACTION = 0.3
+# The prompt asks for 1-5 words; a little slack before a title is retried
+MAX_TITLE_WORDS = 8
+MAX_TITLE_CHARS = 60
+# Models sometimes echo the field name instead of filling it in
+_PLACEHOLDER_TITLES = {"title", "movie title", "the title", "untitled"}
+
+_PREAMBLE = re.compile(
+    r"\A\s*(?:sure|certainly|okay|ok|here(?:'s| is)|below is)\b[^\n]*:[ \t]*\n",
+    re.IGNORECASE,
+)
+_HEADING = re.compile(r"^[ \t]{0,3}#{1,6}[ \t]*", re.MULTILINE)
+_BULLET = re.compile(r"^[ \t]*(?:[-*•>]|\d+[.)])[ \t]+", re.MULTILINE)
+_SPEAKER = re.compile(
+    r"^[ \t]*(?:narrator|announcer|voice[- ]?over|v\.?o\.?|trailer voice|script|title)"
+    r"[ \t]*(?:\([^)\n]*\))?[ \t]*:[ \t]*",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Upper-case cues ("CUT TO BLACK") or labelled ones ("Music: swells"), so
+# spoken lines such as "Sound the alarm" are kept
+_DIRECTION_LINE = re.compile(
+    r"^[ \t]*(?:(?:SCENE|CUT TO|FADE (?:IN|OUT)|SFX|SOUND|MUSIC|CAMERA|TRANSITION"
+    r"|INT\.|EXT\.)\b|(?i:scene|sfx|sound(?: effects?)?|music|camera|transition)"
+    r"[ \t]*:)[^\n]*$",
+    re.MULTILINE,
+)
+# Square brackets and braces are never spoken; parentheses only count as a
+# direction in screenplay forms ("(V.O.)", "(BEAT)", "(whispering)") or when
+# they name a delivery or sound cue, since an aside in parentheses is speech
+_BRACKETED = re.compile(r"\[[^\]\n]*\]|\{[^}\n]*\}")
+_DIRECTION_PARENTHETICAL = re.compile(
+    r"\((?:[A-Z][A-Z0-9 .,'’/-]*|[a-z]+(?:ing|ly)"
+    r"|(?i:[^)\n]*\b(?:whisper\w*|pause[sd]?|beat|sfx|music|sound|voice[- ]?over"
+    r"|narrator|off[- ]?screen|dramatic\w*|ominous\w*|softly|quietly|slowly"
+    r"|laugh\w*|sigh\w*|gasp\w*|shout\w*|echo\w*)\b[^)\n]*))\)"
+)
+_PARENTHETICAL = re.compile(r"\([^)\n]*\)")
+# *action* spans are sound effects or directions; **bold** keeps its text
+_ACTION = re.compile(r"(?<!\*)\*(?!\*)[^*\n]+\*(?!\*)")
+_BOLD = re.compile(r"(\*\*|__)(.+?)\1")
+_BACKTICKS = re.compile(r"`+")
+_ITALIC_MARKS = re.compile(r"[*_]+")
+# Timecodes in brackets ("[00:03]", "(0:03-0:05)") or leading a line with a
+# separator ("0:03 - "); times in the text ("3:10 to Yuma") are spoken
+_TIME = r"\d{1,2}:\d{2}(?::\d{2})?"
+_TIMESTAMP = re.compile(
+    rf"[\[(]{_TIME}(?:[ \t]*[-–—][ \t]*{_TIME})?[\])]"
+    rf"|^[ \t]*{_TIME}(?:[ \t]*[-–—][ \t]*{_TIME})?[ \t]*[-–—|:][ \t]*",
+    re.MULTILINE,
+)
+_QUOTES = '"“”‘’\'`'
+_SPACES = re.compile(r"[ \t]{2,}")
+_SPACE_BEFORE_PUNCTUATION = re.compile(r"[ \t]+([,.!?;:])")
+_WORD = re.compile(r"[A-Za-z0-9]+(?:['’-][A-Za-z0-9]+)*")
+_EMPHASIS = re.compile(r"\b[A-Z][A-Z'’-]*[A-Z]\b")
+_SENTENCE = re.compile(r"[^.!?…]+(?:[.!?…]+|$)")
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+_JSON_OBJECT = re.compile(r"\{.*\}", re.DOTALL)
+_NUMBERED_LINE = re.compile(r"^[ \t]*(\d+)[ \t]*[.):-][ \t]*(.+)$", re.MULTILINE)
+
+
+@dataclass
+class ScriptReport:
+    """The repaired script and how the raw model output measured up."""
+
+    script: str
+    word_count: int
+    score: float
+    needs_regeneration: bool
+    issues: List[str] = field(default_factory=list)
+    repairs: List[str] = field(default_factory=list)
+
+
+def count_words(text: str) -> int:
+    """Returns the number of spoken words in a text."""
+    return len(_WORD.findall(text))
+
+
+def _normalize(text: str) -> str:
+    return _NON_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def _strip_quotes(text: str) -> str:
+    text = text.strip()
+    while len(text) >= 2 and text[0] in _QUOTES and text[-1] in _QUOTES:
+        text = text[1:-1].strip()
+    return text
+
+
+def clean_title(raw: str) -> str:
+    """
+    Cleans a generated title: first non-empty line, without markdown, labels
+    or surrounding quotes.
+    """
+    text = _PREAMBLE.sub("", raw or "")
+    text = _BOLD.sub(r"\2", text)
+    text = _HEADING.sub("", text)
+    text = _SPEAKER.sub("", text)
+    text = _BACKTICKS.sub("", _ITALIC_MARKS.sub("", text))
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines:
+        return ""
+    title = _strip_quotes(lines[0]).replace('"', "")
+    return _SPACES.sub(" ", title).rstrip(".").strip()
+
+
+def parse_title(raw: str) -> str:
+    """
+    Extracts the title from structured (``{"title": ...}``) or plain output
+    and cleans it with clean_title.
+    """
+    text = raw or ""
+    match = _JSON_OBJECT.search(text)
+    if match:
+        try:
+            data = json.loads(match.group())
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("title"), str):
+            text = data["title"]
+    return clean_title(text)
+
+
+def parse_titles(raw: str, count: int) -> Dict[int, str]:
+    """
+    Extracts numbered titles from a bulk answer: MOVIE_TITLES_SCHEMA JSON, or
+    "1. Title" lines from models that ignored the format.
+
+    Args:
+        raw (str): The model output.
+        count (int): Number of combinations that were sent.
+
+    Returns:
+        dict: Cleaned, non-empty titles by combination number (1 to ``count``).
+        Numbers the model skipped, repeated or invented are left out.
+    """
+    pairs: List[Tuple[object, object]] = []
+    match = _JSON_OBJECT.search(raw or "")
+    if match:
+        try:
+            data = json.loads(match.group())
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and isinstance(data.get("titles"), list):
+            pairs = [
+                (entry.get("id"), entry.get("title"))
+                for entry in data["titles"]
+                if isinstance(entry, dict)
+            ]
+    if not pairs:
+        pairs = [(int(n), text) for n, text in _NUMBERED_LINE.findall(raw or "")]
+
+    titles: Dict[int, str] = {}
+    seen = set()
+    for number, text in pairs:
+        if not isinstance(number, int) or not isinstance(text, str):
+            continue
+        if number in seen:
+            # Two answers for one combination: trust neither
+            titles.pop(number, None)
+            continue
+        seen.add(number)
+        title = clean_title(text)
+        if 1 <= number <= count and title:
+            titles[number] = title
+    return titles
+
+
+def title_issues(title: str) -> List[str]:
+    """
+    Checks a cleaned title.
+
+    Returns:
+        list[str]: What is wrong with it; empty for a usable title.
+    """
+    if not title:
+        return ["empty"]
+    issues = []
+    words = count_words(title)
+    if words > MAX_TITLE_WORDS:
+        issues.append(f"{words} words")
+    if len(title) > MAX_TITLE_CHARS:
+        issues.append(f"{len(title)} characters")
+    if _normalize(title) in _PLACEHOLDER_TITLES:
+        issues.append("placeholder")
+    if any(c in title for c in "{}[]<>"):
+        issues.append("markup")
+    return issues
+
+
+def clean_script(raw: str) -> str:
+    """
+    Strips everything that is not meant to be spoken and puts each line in its
+    own paragraph.
+    """
+    text = _PREAMBLE.sub("", raw or "")
+    text = _BOLD.sub(r"\2", text)
+    text = _DIRECTION_LINE.sub("", text)
+    text = _HEADING.sub("", text)
+    text = _BULLET.sub("", text)
+    text = _SPEAKER.sub("", text)
+    text = _ACTION.sub("", text)
+    text = _TIMESTAMP.sub("", text)
+    text = _BRACKETED.sub("", text)
+    text = _DIRECTION_PARENTHETICAL.sub("", text)
+    text = _BACKTICKS.sub("", text)
+    lines = []
+    for line in text.splitlines():
+        line = _SPACE_BEFORE_PUNCTUATION.sub(r"\1", _SPACES.sub(" ", line))
+        line = _strip_quotes(line)
+        if _WORD.search(line):
+            lines.append(line)
+    return "\n\n".join(lines)
+
+
+def _sentences(script: str) -> List[Tuple[int, str]]:
+    """Splits a script into (paragraph index, sentence) pairs."""
+    return [
+        (index, match.group().strip())
+        for index, paragraph in enumerate(script.split("\n\n"))
+        for match in _SENTENCE.finditer(paragraph)
+        if _WORD.search(match.group())
+    ]
+
+
+def _join(sentences: List[Tuple[int, str]]) -> str:
+    paragraphs: List[List[str]] = []
+    last = None
+    for index, sentence in sentences:
+        if index != last:
+            paragraphs.append([])
+            last = index
+        paragraphs[-1].append(sentence)
+    return "\n\n".join(" ".join(p) for p in paragraphs)
+
+
+def _emphasis_words(sentence: str, title_words: set) -> List[str]:
+    return [w for w in _EMPHASIS.findall(sentence) if _normalize(w) not in title_words]
+
+
+def ends_with_title(script: str, title: str) -> bool:
+    """Returns whether the script's last words are the title."""
+    wanted = _normalize(title)
+    return bool(wanted) and _normalize(script).endswith(wanted)
+
+
+def validate_script(raw: str, title: str, max_words: int = MAX_WORDS) -> ScriptReport:
+    """
+    Cleans, checks and repairs a generated script.
+
+    Args:
+        raw (str): The model output.
+        title (str): The movie title the script must end with.
+        max_words (int, optional): Word limit, title included.
+
+    Returns:
+        ScriptReport: The repaired script (never longer than ``max_words``), the
+        compliance score of the raw output between 0 and 1, the issues found,
+        the repairs made and whether a regeneration is advisable.
+    """
+    issues: List[str] = []
+    repairs: List[str] = []
+    script = clean_script(raw)
+    if _normalize(script) != _normalize(raw or ""):
+        issues.append("markup or stage directions")
+        repairs.append("stripped markup and stage directions")
+    # Kept, as they may be spoken, but a script should not need them
+    asides = _PARENTHETICAL.findall(script)
+    if asides:
+        issues.append(f"unrecognised parenthetical {asides[0]}")
+
+    title_words = set(_normalize(title).split())
+    sentences = _sentences(script)
+    has_title = ends_with_title(script, title)
+    if not has_title:
+        issues.append("does not end with the title")
+    if has_title and sentences:
+        closing = sentences.pop()
+    else:
+        closing = (len(script.split("\n\n")), f"{title}.")
+
+    # Emphasis: one or two UPPERCASE words per sentence
+    emphasised = surplus = 0
+    for position, (index, sentence) in enumerate(sentences):
+        words = _emphasis_words(sentence, title_words)
+        if 1 <= len(words) <= MAX_EMPHASIS_PER_SENTENCE:
+            emphasised += 1
+        elif len(words) > MAX_EMPHASIS_PER_SENTENCE:
+            surplus += 1
+            for word in words[MAX_EMPHASIS_PER_SENTENCE:]:
+                sentence = re.sub(rf"\b{re.escape(word)}\b", word.lower(), sentence, 1)
+            sentences[position] = (index, sentence)
+    emphasis_score = emphasised / len(sentences) if sentences else 0.0
+    if surplus:
+        issues.append("too many emphasis words")
+        repairs.append("lowercased surplus emphasis words")
+    elif sentences and not emphasised:
+        issues.append("no emphasis words")
+
+    content_words = sum(count_words(s) for _, s in sentences)
+    raw_words = content_words + count_words(closing[1])
+    if raw_words > max_words:
+        issues.append(f"{raw_words} words (limit {max_words})")
+
+    # Cut whole sentences from the end until the script fits
+    budget = max_words - count_words(closing[1])
+    kept = list(sentences)
+    while kept and sum(count_words(s) for _, s in kept) > budget:
+        kept.pop()
+    truncated = False
+    if not kept and sentences and budget > 0:
+        # A single run-on sentence: keep as many of its words as fit
+        index, sentence = sentences[0]
+        words = sentence.split()
+        while words and count_words(" ".join(words)) > budget:
+            words.pop()
+        if words:
+            kept = [(index, " ".join(words).rstrip(",;:-—") + "...")]
+            truncated = True
+    kept_words = sum(count_words(s) for _, s in kept)
+    if kept_words < content_words:
+        repairs.append(f"trimmed to {kept_words + count_words(closing[1])} words")
+    if not has_title:
+        repairs.append("appended the title")
+
+    repaired = _join(kept + [closing])
+    trimmed = 1 - kept_words / content_words if content_words else 0.0
+    needs_regeneration = (
+        not (kept or content_words == 0 and has_title)
+        or truncated
+        or trimmed > MAX_TRIMMED_FRACTION
+        or bool(asides)
+    )
+
+    checks = [
+        "markup or stage directions" not in issues,
+        raw_words <= max_words,
+        has_title,
+    ]
+    score = (sum(checks) + emphasis_score) / (len(checks) + 1)
+    return ScriptReport(
+        script=repaired,
+        word_count=count_words(repaired),
+        score=round(score, 3),
+        needs_regeneration=needs_regeneration,
+        issues=issues,
+        repairs=repairs,
+    )
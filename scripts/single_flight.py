@@ -0,0 +1,140 @@
+"""
+Coalescing of identical in-flight requests.
+
+When several sessions or batch jobs ask for the same completion or voice-over
+at the same time, only the first caller (the leader) calls the provider; the
+others wait for its result and get the same value or exception. Nothing is
+cached: once the call finishes, the next identical request goes out again.
+
+Callers on an asyncio loop use ``await group.do_async(key, coro_fn)``: they
+share the same in-flight calls as threads but wait without blocking the loop.
+"""
+
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def request_key(*parts: Any) -> str:
+    """
+    Returns a stable key for a request made of JSON-serialisable parts.
+
+    Args:
+        *parts: What makes two requests identical, e.g. endpoint, model, prompt
+            and sampling parameters. Dict order does not matter.
+    """
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Shares one in-flight call per key between concurrent callers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        """Returns the future of ``key`` and whether the caller leads the call."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        return future, leader
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def do(self, key: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Runs ``fn(*args, **kwargs)`` unless an identical call is in flight, in
+        which case its result is returned (or its exception raised) instead.
+
+        Args:
+            key (str): Identifies identical calls, see request_key().
+            fn (callable): The call to make.
+
+        Returns:
+            The result of the leader's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key)
+
+    async def do_async(
+        self, key: str, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any
+    ) -> Any:
+        """
+        Awaits ``fn(*args, **kwargs)`` unless an identical call is in flight
+        (from a thread or a task), in which case its outcome is awaited instead.
+
+        A follower that is cancelled stops waiting without cancelling the call;
+        if the leader is cancelled, its followers get the CancelledError.
+
+        Args:
+            key (str): Identifies identical calls, see request_key().
+            fn (callable): Coroutine function making the call.
+
+        Returns:
+            The result of the leader's call.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._finish(key)
+
+    def future(self, key: str) -> Optional[Future]:
+        """Returns the future of the in-flight call for ``key``, if any."""
+        with self._lock:
+            return self._calls.get(key)
+
+    def in_flight(self) -> int:
+        """Returns the number of distinct calls in flight."""
+        with self._lock:
+            return len(self._calls)
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """
+    Returns the process-wide group for one kind of request, e.g. "llm" or "tts".
+    """
+    with _groups_lock:
+        group = _groups.get(name)
+        if group is None:
+            group = _groups[name] = SingleFlight()
+        return group
@@ -0,0 +1,390 @@
+"""
+Pool of pre-generated trailers, served without any generation latency.
+
+Kiosk and demo deployments keep a number of fully rendered trailers (title,
+script and final mix) per genre ready. Serving one takes it out of the pool;
+refills run through the resumable batch pipeline (scripts/batch_jobs.py), so an
+interrupted refill continues where it stopped instead of paying for the same
+trailers again.
+
+Keep the pool topped up from the command line with
+``python -m scripts.trailer_pool refill --watch 300``, or let the app refill it
+in the background after serving.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import argparse
+from contextlib import closing
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from scripts import batch_jobs
+
+DEFAULT_DB_PATH = os.path.join("data", "trailer_pool.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pool_trailers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    genre TEXT NOT NULL,
+    elements TEXT NOT NULL,
+    movie_name TEXT NOT NULL,
+    script TEXT NOT NULL,
+    audio_path TEXT NOT NULL,
+    job_id TEXT,
+    item_id INTEGER,
+    created_at REAL NOT NULL,
+    served_at REAL,
+    UNIQUE (job_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS pool_trailers_ready ON pool_trailers (genre, served_at, id);
+CREATE TABLE IF NOT EXISTS pool_refills (
+    job_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    collected_at REAL
+);
+"""
+
+
+@dataclass
+class PooledTrailer:
+    """A rendered trailer waiting in the pool."""
+
+    id: int
+    genre: str
+    elements: Dict[str, str]
+    movie_name: str
+    script: str
+    audio_path: str
+    created_at: float
+
+
+def connect(db_path: str = DEFAULT_DB_PATH) -> sqlite3.Connection:
+    """Opens the pool database, creating it and its schema if needed."""
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def add_trailer(
+    elements: Dict[str, str],
+    movie_name: str,
+    script: str,
+    audio_path: str,
+    job_id: Optional[str] = None,
+    item_id: Optional[int] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> bool:
+    """
+    Adds a rendered trailer to the pool. A batch item is only added once.
+
+    Args:
+        elements (dict): The trailer elements; "Genre" files it under its genre.
+        movie_name (str): The title.
+        script (str): The voice-over script.
+        audio_path (str): Location of the final mix.
+        job_id (str, optional): Batch job that produced it.
+        item_id (int, optional): Item of that batch job.
+        db_path (str, optional): Pool database path.
+
+    Returns:
+        bool: False if the batch item was already in the pool.
+    """
+    with closing(connect(db_path)) as conn, conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO pool_trailers (genre, elements, movie_name, script,"
+            " audio_path, job_id, item_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                elements.get("Genre", ""),
+                json.dumps(elements),
+                movie_name,
+                script,
+                audio_path,
+                job_id,
+                item_id,
+                time.time(),
+            ),
+        )
+        return cursor.rowcount == 1
+
+
+def ready_counts(db_path: str = DEFAULT_DB_PATH) -> Dict[str, int]:
+    """Returns the number of unserved trailers per genre."""
+    with closing(connect(db_path)) as conn:
+        return {
+            row["genre"]: row["ready"]
+            for row in conn.execute(
+                "SELECT genre, COUNT(*) AS ready FROM pool_trailers"
+                " WHERE served_at IS NULL GROUP BY genre"
+            )
+        }
+
+
+def take_trailer(
+    genre: Optional[str] = None,
+    is_available: Optional[Callable[[str], bool]] = None,
+    db_path: str = DEFAULT_DB_PATH,
+) -> Optional[PooledTrailer]:
+    """
+    Takes the oldest ready trailer out of the pool.
+
+    Args:
+        genre (str, optional): Only take a trailer of this genre.
+        is_available (callable, optional): Checks that the audio still exists
+            (retention may have deleted it); unavailable trailers are dropped.
+        db_path (str, optional): Pool database path.
+
+    Returns:
+        PooledTrailer: The trailer, or None if the pool has none ready.
+    """
+    query = "SELECT * FROM pool_trailers WHERE served_at IS NULL"
+    params: tuple = ()
+    if genre is not None:
+        query += " AND genre = ?"
+        params = (genre,)
+    query += " ORDER BY id LIMIT 1"
+
+    with closing(connect(db_path)) as conn:
+        while True:
+            # IMMEDIATE: two sessions must never be served the same trailer
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+            conn.execute(
+                "UPDATE pool_trailers SET served_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            conn.commit()
+            if is_available is None or is_available(row["audio_path"]):
+                return PooledTrailer(
+                    id=row["id"],
+                    genre=row["genre"],
+                    elements=json.loads(row["elements"]),
+                    movie_name=row["movie_name"],
+                    script=row["script"],
+                    audio_path=row["audio_path"],
+                    created_at=row["created_at"],
+                )
+            print(f"Warning: pooled trailer {row['audio_path']} is gone, skipping it")
+
+
+def deficits(
+    target: int, genres: List[str], db_path: str = DEFAULT_DB_PATH
+) -> Dict[str, int]:
+    """Returns how many trailers each genre is short of ``target``."""
+    ready = ready_counts(db_path)
+    return {
+        genre: target - ready.get(genre, 0)
+        for genre in genres
+        if ready.get(genre, 0) < target
+    }
+
+
+def _collect(job_id: str, jobs_db_path: str, db_path: str, max_attempts: int) -> int:
+    """
+    Moves the finished items of a refill job into the pool.
+
+    The refill is only marked collected once no item has a stage left to run
+    or retry, so a run that stopped early is resumed by the next refill.
+    """
+    added = 0
+    for item in batch_jobs.load_items(job_id, jobs_db_path):
+        if item.next_stage() is None:
+            added += add_trailer(
+                item.elements,
+                item.outputs["title"],
+                item.outputs["script"],
+                item.outputs["mix"],
+                job_id=job_id,
+                item_id=item.item_id,
+                db_path=db_path,
+            )
+    summary = batch_jobs.job_summary(job_id, jobs_db_path, max_attempts=max_attempts)
+    if summary["pending"] == 0:
+        with closing(connect(db_path)) as conn, conn:
+            conn.execute(
+                "UPDATE pool_refills SET collected_at = ? WHERE job_id = ?",
+                (time.time(), job_id),
+            )
+    return added
+
+
+def refill(
+    target: int,
+    genres: List[str],
+    handlers: Dict[str, batch_jobs.StageHandler],
+    max_attempts: int = 3,
+    db_path: str = DEFAULT_DB_PATH,
+    jobs_db_path: str = batch_jobs.DEFAULT_DB_PATH,
+    report: Optional[Callable[[float, str], None]] = None,
+    bulk_handlers: Optional[Dict[str, batch_jobs.BulkHandler]] = None,
+) -> int:
+    """
+    Tops every genre up to ``target`` ready trailers.
+
+    Refills that were interrupted or still have items to retry are resumed
+    first; the remaining shortfall is generated as a new batch job of random
+    elements with the genre fixed.
+
+    Args:
+        target (int): Ready trailers wanted per genre.
+        genres (list[str]): Genres to keep in the pool.
+        handlers (dict): Stage handlers, see batch_jobs.pipeline_handlers().
+        max_attempts (int, optional): Attempts per stage before an item is dropped.
+        db_path (str, optional): Pool database path.
+        jobs_db_path (str, optional): Batch job database path.
+        report (callable, optional): Called with (progress, message).
+        bulk_handlers (dict, optional): See batch_jobs.pipeline_bulk_handlers().
+
+    Returns:
+        int: Trailers added to the pool.
+    """
+    with closing(connect(db_path)) as conn:
+        pending = [
+            row["job_id"]
+            for row in conn.execute(
+                "SELECT job_id FROM pool_refills WHERE collected_at IS NULL"
+                " ORDER BY created_at"
+            )
+        ]
+    added = 0
+    for job_id in pending:
+        if report:
+            report(0.0, "Resuming an interrupted refill...")
+        batch_jobs.run_job(
+            job_id,
+            handlers,
+            max_attempts=max_attempts,
+            db_path=jobs_db_path,
+            bulk_handlers=bulk_handlers,
+        )
+        added += _collect(job_id, jobs_db_path, db_path, max_attempts)
+
+    missing = deficits(target, genres, db_path)
+    if not missing:
+        return added
+    elements_list = [
+        dict(elements, Genre=genre)
+        for genre, count in missing.items()
+        for elements in batch_jobs.random_elements(count)
+    ]
+    job_id = batch_jobs.create_job(elements_list, db_path=jobs_db_path)
+    with closing(connect(db_path)) as conn, conn:
+        conn.execute(
+            "INSERT INTO pool_refills (job_id, created_at) VALUES (?, ?)",
+            (job_id, time.time()),
+        )
+    if report:
+        report(0.1, f"Rendering {len(elements_list)} trailers...")
+    batch_jobs.run_job(
+        job_id,
+        handlers,
+        max_attempts=max_attempts,
+        db_path=jobs_db_path,
+        bulk_handlers=bulk_handlers,
+    )
+    return added + _collect(job_id, jobs_db_path, db_path, max_attempts)
+
+
+def pool_genres(config) -> List[str]:
+    """Returns the configured pool genres, or every genre when none are set."""
+    if config.trailer_pool_genres:
+        return list(config.trailer_pool_genres)
+    from scripts import core
+
+    for point in core.get_trailer_points():
+        if point["category"] == "Genre":
+            return list(point["options"])
+    return []
+
+
+def refill_from_config(
+    config,
+    model_name: Optional[str] = None,
+    db_path: str = DEFAULT_DB_PATH,
+    report: Optional[Callable[[float, str], None]] = None,
+) -> int:
+    """
+    Refills the pool with the configured size, genres and OpenRouter keys.
+
+    Args:
+        config (Config): Pool, storage and audio settings.
+        model_name (str, optional): LLM to use. Defaults to trailer_pool_model,
+            then openrouter_default_model.
+        db_path (str, optional): Pool database path.
+        report (callable, optional): Called with (progress, message).
+
+    Returns:
+        int: Trailers added to the pool.
+    """
+    llm = dict(
+        model_name=model_name
+        or config.trailer_pool_model
+        or config.openrouter_default_model,
+        api_key=config.openrouter_api_key,
+        base_url="https://openrouter.ai/api/v1",
+        key_pool=config.key_pool("openrouter"),
+    )
+    handlers = batch_jobs.pipeline_handlers(
+        store=config.artifact_store(), config=config, **llm
+    )
+    return refill(
+        config.trailer_pool_size,
+        pool_genres(config),
+        handlers,
+        db_path=db_path,
+        report=report,
+        bulk_handlers=batch_jobs.pipeline_bulk_handlers(config=config, **llm),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point: refill the pool or show what is ready."""
+    from scripts.config import parse_overrides, reload_config
+
+    parser = argparse.ArgumentParser(description="Pool of pre-generated trailers")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Pool database path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fill = commands.add_parser("refill", help="Top the pool up")
+    fill.add_argument("--model", help="LLM model (defaults to the configured one)")
+    fill.add_argument(
+        "--watch",
+        type=float,
+        metavar="SECONDS",
+        help="Keep refilling, checking the pool every SECONDS",
+    )
+    fill.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="Override a setting, e.g. --set trailer_pool_size=3",
+    )
+    commands.add_parser("status", help="Show ready trailers per genre")
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for genre, ready in sorted(ready_counts(args.db).items()):
+            print(f"{genre}: {ready}")
+        return
+
+    config = reload_config(overrides=parse_overrides(args.set))
+    if config.trailer_pool_size <= 0:
+        parser.error("trailer_pool_size is 0; set it to the trailers wanted per genre")
+    while True:
+        added = refill_from_config(config, model_name=args.model, db_path=args.db)
+        print(f"Added {added} trailers to the pool")
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import os
+import pytest
+from scripts import artifact_catalog
+
+
+@pytest.fixture
+def audio_dir(tmp_path):
+    directory = tmp_path / "generated_audio"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "catalog.sqlite3")
+
+
+def write_file(directory, name, size=10, mtime=None):
+    path = directory / name
+    path.write_bytes(b"\0" * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_parse_filename():
+    """Test extraction of kind and movie from generated file names."""
+    assert artifact_catalog.parse_filename("final_Moon Mold_20250101_120000.mp3") == {
+        "kind": "final",
+        "movie": "Moon Mold",
+    }
+    assert artifact_catalog.parse_filename("voiceover_Moon Mold_0123456789abcdef.mp3") == {
+        "kind": "voiceover",
+        "movie": "Moon Mold",
+    }
+    assert artifact_catalog.parse_filename("random.mp3") == {
+        "kind": "other",
+        "movie": None,
+    }
+
+
+def test_record_and_query(audio_dir, db_path):
+    """Test recording artifacts and querying them newest first."""
+    points = {"Genre": "Horror", "Setting": "Sentient IKEA"}
+    voice = write_file(audio_dir, "voiceover_Flat Pack_20250101_120000.mp3", mtime=100)
+    artifact_catalog.record_artifact(
+        voice, movie_name="Flat Pack", selected_points=points, db_path=db_path
+    )
+    final = write_file(audio_dir, "final_Flat Pack_20250101_120000.mp3", mtime=200)
+    artifact_catalog.record_artifact(
+        final, duration_ms=30000, source_path=voice, db_path=db_path
+    )
+
+    rows = artifact_catalog.query_artifacts(db_path=db_path)
+    assert [r["kind"] for r in rows] == ["final", "voiceover"]
+    # The final mix inherits title and elements from its voice-over
+    assert rows[0]["movie"] == "Flat Pack"
+    assert rows[0]["genre"] == "Horror"
+    assert rows[0]["elements"] == points
+    assert rows[0]["duration_ms"] == 30000
+
+
+def test_search_and_pagination(audio_dir, db_path):
+    """Test searching by title or genre and paging through results."""
+    for i in range(25):
+        genre = "Western" if i % 2 else "Horror"
+        path = write_file(audio_dir, f"final_Movie {i}_20250101_1200{i:02d}.mp3", mtime=i)
+        artifact_catalog.record_artifact(
+            path, selected_points={"Genre": genre}, db_path=db_path
+        )
+
+    assert artifact_catalog.count_artifacts(db_path=db_path) == 25
+    assert artifact_catalog.count_artifacts(search="western", db_path=db_path) == 12
+    assert artifact_catalog.count_artifacts(search="Movie 2", db_path=db_path) == 6
+
+    page = artifact_catalog.query_artifacts(limit=10, offset=20, db_path=db_path)
+    assert [r["movie"] for r in page] == [f"Movie {i}" for i in range(4, -1, -1)]
+
+
+def test_sync_directory_is_incremental(audio_dir, db_path):
+    """Test that sync adds new files, skips unchanged ones and drops deleted ones."""
+    first = write_file(audio_dir, "final_One_20250101_120000.mp3", mtime=10)
+    second = write_file(audio_dir, "voiceover_Two_20250101_120000.mp3", mtime=20)
+    write_file(audio_dir, "notes.txt")
+
+    assert artifact_catalog.sync_directory(str(audio_dir), db_path) == 2
+    assert artifact_catalog.sync_directory(str(audio_dir), db_path) == 0
+
+    os.remove(first)
+    os.utime(second, (30, 30))
+    assert artifact_catalog.sync_directory(str(audio_dir), db_path) == 2
+
+    rows = artifact_catalog.query_artifacts(db_path=db_path)
+    assert [(r["movie"], r["kind"], r["mtime"]) for r in rows] == [("Two", "voiceover", 30)]
+
+
+def test_sync_keeps_recorded_metadata(audio_dir, db_path):
+    """Test that a rescan of a modified file keeps its recorded elements."""
+    path = write_file(audio_dir, "final_Kept_20250101_120000.mp3", mtime=10)
+    artifact_catalog.record_artifact(
+        path, selected_points={"Genre": "Noir"}, db_path=db_path
+    )
+    os.utime(path, (50, 50))
+    artifact_catalog.sync_directory(str(audio_dir), db_path)
+
+    row = artifact_catalog.query_artifacts(db_path=db_path)[0]
+    assert row["genre"] == "Noir"
+    assert row["mtime"] == 50
@@ -0,0 +1,186 @@
+import os
+import io
+import pytest
+from datetime import datetime, timezone
+from scripts import artifact_store
+from scripts.artifact_store import (
+    FilesystemArtifactStore,
+    RetentionPolicy,
+    S3ArtifactStore,
+)
+
+
+class MissingObject(Exception):
+    """Error shaped like botocore's ClientError for a missing object."""
+
+    def __init__(self):
+        super().__init__("Not Found")
+        self.response = {"Error": {"Code": "404"}}
+
+
+class LocalS3:
+    """In-memory stand-in for an S3-compatible server (the calls boto3 makes)."""
+
+    def __init__(self, page_size=2):
+        self.objects = {}
+        self.page_size = page_size
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[(Bucket, Key)] = (bytes(Body), datetime.now(timezone.utc))
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObject()
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise MissingObject()
+        return {}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return f"https://s3.local/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start : start + self.page_size]
+        response = {
+            "Contents": [
+                {
+                    "Key": k,
+                    "Size": len(self.objects[(Bucket, k)][0]),
+                    "LastModified": self.objects[(Bucket, k)][1],
+                }
+                for k in page
+            ],
+            "IsTruncated": start + self.page_size < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+
+@pytest.fixture(params=["filesystem", "s3"])
+def store(request, tmp_path):
+    if request.param == "filesystem":
+        return FilesystemArtifactStore(str(tmp_path / "generated_audio"))
+    return S3ArtifactStore("trailers", prefix="audio", client=LocalS3())
+
+
+def test_put_get_delete(store):
+    """Test the basic store operations on every backend."""
+    store.put("final_A_20250101_120000.mp3", b"abc")
+    assert store.exists("final_A_20250101_120000.mp3")
+    assert store.get("final_A_20250101_120000.mp3") == b"abc"
+    assert [a.key for a in store.list()] == ["final_A_20250101_120000.mp3"]
+
+    assert store.delete("final_A_20250101_120000.mp3")
+    assert not store.delete("final_A_20250101_120000.mp3")
+    assert not store.exists("final_A_20250101_120000.mp3")
+    with pytest.raises(KeyError):
+        store.get("final_A_20250101_120000.mp3")
+
+
+def test_list_spans_shards_and_pages(store):
+    """Test that listing covers every shard (and every S3 page)."""
+    keys = {f"final_M{i}_20250101_1200{i:02d}.mp3" for i in range(7)}
+    for key in keys:
+        store.put(key, b"x")
+    assert {a.key for a in store.list()} == keys
+
+
+def test_collect_intermediates(store):
+    """Test that intermediates are only deleted once the final mix exists."""
+    store.put("voiceover_A_1.mp3", b"voice")
+    assert store.collect_intermediates("final_A_1.mp3", ["voiceover_A_1.mp3"]) == []
+    assert store.exists("voiceover_A_1.mp3")
+
+    store.put("final_A_1.mp3", b"mix")
+    assert store.collect_intermediates("final_A_1.mp3", ["voiceover_A_1.mp3"]) == [
+        "voiceover_A_1.mp3"
+    ]
+    assert not store.exists("voiceover_A_1.mp3")
+
+    # A final key listed among the intermediates is kept
+    assert store.collect_intermediates("final_A_1.mp3", ["final_A_1.mp3"]) == []
+    assert store.exists("final_A_1.mp3")
+
+
+def test_presigned_url(tmp_path):
+    """Test that S3 artifacts get a fetchable URL and local files do not."""
+    store = S3ArtifactStore("trailers", prefix="audio", client=LocalS3())
+    url = store.url("final_A_1.mp3", expires_in=60)
+    assert url.startswith("https://s3.local/trailers/audio/")
+    assert url.endswith("/final_A_1.mp3?expires=60")
+    assert FilesystemArtifactStore(str(tmp_path)).url("final_A_1.mp3") is None
+
+
+def test_filesystem_shards_and_atomic_writes(tmp_path):
+    """Test sharded layout and that no temporary files are left behind."""
+    store = FilesystemArtifactStore(str(tmp_path))
+    path = store.put("final_A_20250101_120000.mp3", b"abc")
+
+    shard = artifact_store.shard_for("final_A_20250101_120000.mp3")
+    assert path == os.path.join(str(tmp_path), *shard, "final_A_20250101_120000.mp3")
+    assert os.listdir(os.path.dirname(path)) == ["final_A_20250101_120000.mp3"]
+
+
+def test_filesystem_finds_legacy_flat_files(tmp_path):
+    """Test that files written flat into the root are still served and listed."""
+    (tmp_path / "final_Old_20240101_120000.mp3").write_bytes(b"old")
+    (tmp_path / "catalog.sqlite3").write_bytes(b"db")
+    store = FilesystemArtifactStore(str(tmp_path))
+
+    assert store.get("final_Old_20240101_120000.mp3") == b"old"
+    assert [a.key for a in store.list()] == ["final_Old_20240101_120000.mp3"]
+
+
+def test_retention_by_age_and_size(tmp_path):
+    """Test deleting by age first, then oldest-first until the size fits."""
+    store = FilesystemArtifactStore(str(tmp_path))
+    for i, age_days in enumerate([40, 20, 10, 5, 1]):
+        path = store.put(f"final_{i}.mp3", b"x" * 100)
+        mtime = 1_000_000_000 - age_days * 86400
+        os.utime(path, (mtime, mtime))
+
+    deleted = store.enforce_retention(
+        RetentionPolicy(max_age_seconds=30 * 86400, max_total_bytes=250),
+        now=1_000_000_000,
+    )
+    assert deleted == ["final_0.mp3", "final_1.mp3", "final_2.mp3"]
+    assert sorted(a.key for a in store.list()) == ["final_3.mp3", "final_4.mp3"]
+
+
+def test_create_store():
+    """Test building stores from configuration values."""
+    assert isinstance(artifact_store.create_store(), FilesystemArtifactStore)
+    with pytest.raises(ValueError):
+        artifact_store.create_store(backend="s3")
+    with pytest.raises(ValueError):
+        artifact_store.create_store(backend="ftp")
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(
+    not os.getenv("ARTIFACT_S3_TEST_ENDPOINT"),
+    reason="Set ARTIFACT_S3_TEST_ENDPOINT (e.g. a local MinIO) to run",
+)
+def test_s3_store_against_server():
+    """Test the S3 backend against a real S3-compatible server."""
+    boto3 = pytest.importorskip("boto3")
+    client = boto3.client("s3", endpoint_url=os.environ["ARTIFACT_S3_TEST_ENDPOINT"])
+    bucket = os.getenv("ARTIFACT_S3_TEST_BUCKET", "trailer-tests")
+    try:
+        client.create_bucket(Bucket=bucket)
+    except client.exceptions.BucketAlreadyOwnedByYou:
+        pass
+
+    store = S3ArtifactStore(bucket, prefix="pytest", client=client)
+    store.put("final_S3_20250101_120000.mp3", b"data")
+    assert store.get("final_S3_20250101_120000.mp3") == b"data"
+    assert store.delete("final_S3_20250101_120000.mp3")
+    assert not store.exists("final_S3_20250101_120000.mp3")
@@ -0,0 +1,284 @@
+import os
+import pytest
+import numpy as np
+from pydub import AudioSegment
+from scripts import audio_engine
+from scripts.audio_engine import PCMBuffer
+
+
+FRAME_RATE = 8000
+
+
+def click_track(bpm, seconds, frame_rate=FRAME_RATE):
+    """Create a stereo buffer with a short click on every beat."""
+    frames = int(seconds * frame_rate)
+    samples = np.zeros((frames, 2), dtype=np.float32)
+    beat = int(round(60.0 / bpm * frame_rate))
+    for start in range(0, frames, beat):
+        samples[start : start + 40] = 0.8
+    return PCMBuffer(samples=samples, frame_rate=frame_rate)
+
+
+@pytest.fixture
+def ramp_bed():
+    """A 4-second bed whose sample values encode their own position."""
+    frames = 4 * FRAME_RATE
+    ramp = np.linspace(-1.0, 1.0, frames, dtype=np.float32)
+    return PCMBuffer(samples=np.stack([ramp, ramp], axis=1), frame_rate=FRAME_RATE)
+
+
+def test_segment_round_trip():
+    """Test conversion between pydub segments and PCM buffers."""
+    segment = AudioSegment.silent(duration=500, frame_rate=FRAME_RATE).set_channels(2)
+    buffer = audio_engine.segment_to_buffer(segment)
+    assert buffer.channels == 2
+    assert buffer.frame_rate == FRAME_RATE
+    assert buffer.frames == FRAME_RATE // 2
+
+    back = audio_engine.buffer_to_segment(buffer)
+    assert len(back) == len(segment)
+    assert back.channels == 2
+
+
+def test_estimate_tempo():
+    """Test tempo detection on a click track."""
+    tempo = audio_engine.estimate_tempo(click_track(120, 10))
+    assert tempo == pytest.approx(120, rel=0.03)
+
+
+def test_estimate_tempo_silence():
+    """Test that silence has no tempo."""
+    silence = PCMBuffer(np.zeros((FRAME_RATE * 4, 1), np.float32), FRAME_RATE)
+    assert audio_engine.estimate_tempo(silence) is None
+
+
+def test_fit_loop_trims_without_resampling(ramp_bed):
+    """Test that a shorter target is a slice of the bed plus a fade-out."""
+    target = FRAME_RATE * 2
+    fitted = audio_engine.fit_loop(ramp_bed, target, fade_out_ms=100)
+
+    assert fitted.frames == target
+    assert fitted.frame_rate == ramp_bed.frame_rate
+    np.testing.assert_array_equal(
+        fitted.samples[: target - 800], ramp_bed.samples[: target - 800]
+    )
+    assert abs(fitted.samples[-1, 0]) < 1e-3
+
+
+def test_fit_loop_extends_bed(ramp_bed):
+    """Test that a longer target is built by looping the bed."""
+    target = FRAME_RATE * 10
+    fitted = audio_engine.fit_loop(ramp_bed, target, crossfade_ms=50, fade_out_ms=0)
+
+    assert fitted.frames == target
+    # The first pass is untouched
+    np.testing.assert_array_equal(
+        fitted.samples[: ramp_bed.frames - 400], ramp_bed.samples[: -400]
+    )
+    # After the crossfade the loop restarts from the beginning of the bed
+    np.testing.assert_array_equal(
+        fitted.samples[ramp_bed.frames : ramp_bed.frames + 100],
+        ramp_bed.samples[400:500],
+    )
+
+
+def test_fit_loop_skips_intro_on_phrase_boundaries():
+    """Test that repeats start on the second phrase when a tempo is known."""
+    bed = click_track(120, 32)  # 4 phrases of 8 seconds
+    phrase = 8 * FRAME_RATE
+    bed.samples[:phrase] = 0.25  # mark the intro
+
+    fitted = audio_engine.fit_loop(bed, 80 * FRAME_RATE, tempo=120, fade_out_ms=0)
+    assert fitted.frames == 80 * FRAME_RATE
+    # No repeat of the intro after the first pass
+    assert not np.any(fitted.samples[bed.frames + FRAME_RATE :] == 0.25)
+
+
+def test_fit_loop_rejects_empty_bed():
+    """Test that an empty bed is an error instead of an endless loop."""
+    empty = PCMBuffer(np.zeros((0, 2), np.float32), FRAME_RATE)
+    with pytest.raises(ValueError):
+        audio_engine.fit_loop(empty, FRAME_RATE)
+    assert audio_engine.fit_loop(empty, 0).frames == 0
+
+    one_frame = PCMBuffer(np.full((1, 2), 0.5, np.float32), FRAME_RATE)
+    fitted = audio_engine.fit_loop(one_frame, 100, crossfade_ms=0, fade_out_ms=0)
+    assert fitted.frames == 100
+    assert np.allclose(fitted.samples, 0.5)
+
+
+def test_load_music_bed_uses_cache(tmp_path, monkeypatch):
+    """Test that a bed is decoded once and then served from the caches."""
+    path = tmp_path / "bed.wav"
+    AudioSegment.silent(duration=1000, frame_rate=FRAME_RATE).export(
+        str(path), format="wav"
+    )
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(audio_engine, "_BED_CACHE", {})
+
+    bed = audio_engine.load_music_bed(str(path), cache_dir=cache_dir)
+    assert bed.frames == FRAME_RATE
+    assert audio_engine.read_cache_metadata(str(path), cache_dir)["frame_rate"] == FRAME_RATE
+
+    # A fresh process reads the memory-mapped .npy instead of decoding again
+    monkeypatch.setattr(audio_engine, "_BED_CACHE", {})
+    monkeypatch.setattr(
+        audio_engine.pydub.AudioSegment, "from_file", pytest.fail, raising=True
+    )
+    cached = audio_engine.load_music_bed(str(path), cache_dir=cache_dir)
+    assert isinstance(cached.samples, np.memmap)
+    assert cached.frames == bed.frames
+
+
+def test_bed_cache_is_bounded(tmp_path, monkeypatch):
+    """Test that only the most recently used beds stay in memory."""
+    monkeypatch.setattr(audio_engine, "_BED_CACHE", {})
+    monkeypatch.setattr(audio_engine, "BED_CACHE_SIZE", 2)
+    cache_dir = str(tmp_path / "cache")
+    paths = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / f"{name}.wav"
+        AudioSegment.silent(duration=100, frame_rate=FRAME_RATE).export(
+            str(path), format="wav"
+        )
+        paths.append(str(path))
+
+    audio_engine.load_music_bed(paths[0], cache_dir=cache_dir)
+    audio_engine.load_music_bed(paths[1], cache_dir=cache_dir)
+    audio_engine.load_music_bed(paths[0], cache_dir=cache_dir)
+    audio_engine.load_music_bed(paths[2], cache_dir=cache_dir)
+
+    cached = [key[0] for key in audio_engine._BED_CACHE]
+    assert cached == [os.path.abspath(paths[0]), os.path.abspath(paths[2])]
+    assert not [p for p in os.listdir(cache_dir) if p.endswith(".tmp")]
+
+
+def test_rms_envelope_blocks():
+    """Test block-wise RMS of a constant signal."""
+    buffer = PCMBuffer(np.full((FRAME_RATE, 2), 0.5, np.float32), FRAME_RATE)
+    envelope = audio_engine.rms_envelope(buffer, block_ms=10)
+    assert len(envelope) == 100
+    np.testing.assert_allclose(envelope, 0.5, rtol=1e-5)
+
+
+def test_duck_lowers_music_under_voice():
+    """Test that the music is ducked while the voice speaks and recovers after."""
+    frames = 4 * FRAME_RATE
+    music = PCMBuffer(np.full((frames, 2), 0.5, np.float32), FRAME_RATE)
+    voice_samples = np.zeros((frames, 1), np.float32)
+    voice_samples[FRAME_RATE : 2 * FRAME_RATE] = 0.5  # one second of "speech"
+    voice = PCMBuffer(voice_samples, FRAME_RATE)
+
+    ducked = audio_engine.duck(
+        music, voice, depth_db=-12, attack_ms=10, release_ms=200
+    ).samples[:, 0]
+
+    assert ducked.shape[0] == frames
+    # Untouched before the voice starts
+    assert ducked[FRAME_RATE // 2] == pytest.approx(0.5, rel=1e-3)
+    # Fully ducked in the middle of the speech
+    assert ducked[3 * FRAME_RATE // 2] == pytest.approx(0.5 * 10 ** (-12 / 20), rel=0.02)
+    # Release is slower than attack but the music comes back
+    assert ducked[2 * FRAME_RATE + 400] < 0.45
+    # One release time constant after the speech: e^-1 of the depth is left
+    released_gain = 0.5 * 10 ** (-12 * np.exp(-1) / 20)
+    assert ducked[2 * FRAME_RATE + FRAME_RATE // 5] == pytest.approx(released_gain, rel=0.03)
+    assert ducked[-1] == pytest.approx(0.5, rel=0.01)
+
+
+def sine(frequency, seconds, amplitude, frame_rate=48000, channels=2):
+    """Create a sine tone buffer."""
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    tone = (amplitude * np.sin(2 * np.pi * frequency * t)).astype(np.float32)
+    return PCMBuffer(np.repeat(tone[:, None], channels, axis=1), frame_rate)
+
+
+def test_k_weighting_matches_bs1770_coefficients():
+    """Test that the 48 kHz K-weighting stages match the BS.1770 reference."""
+    (shelf_b, shelf_a), (hp_b, hp_a) = audio_engine._k_weighting_filters(48000)
+    np.testing.assert_allclose(shelf_b, [1.53512486, -2.69169619, 1.19839281], atol=1e-7)
+    np.testing.assert_allclose(shelf_a, [1.0, -1.69065929, 0.73248077], atol=1e-7)
+    np.testing.assert_allclose(hp_b, [1.0, -2.0, 1.0])
+    np.testing.assert_allclose(hp_a, [1.0, -1.99004745, 0.99007225], atol=1e-7)
+
+
+@pytest.mark.parametrize("frame_rate", [44100, 48000])
+def test_integrated_loudness_reference_tone(frame_rate):
+    """Test the EBU reference: a stereo 1 kHz tone at -20 dBFS reads -20 LUFS."""
+    tone = sine(997, 10, 0.1, frame_rate=frame_rate)
+    assert audio_engine.integrated_loudness(tone) == pytest.approx(-20.0, abs=0.1)
+
+
+def test_integrated_loudness_gates_silence():
+    """Test that silence is gated out of the measurement."""
+    tone = sine(997, 5, 0.1)
+    padded = PCMBuffer(
+        np.concatenate([tone.samples, np.zeros_like(tone.samples)]), tone.frame_rate
+    )
+    assert audio_engine.integrated_loudness(padded) == pytest.approx(
+        audio_engine.integrated_loudness(tone), abs=0.25
+    )
+    assert audio_engine.integrated_loudness(
+        PCMBuffer(np.zeros((48000, 2), np.float32), 48000)
+    ) == float("-inf")
+
+
+def test_normalize_loudness_hits_target():
+    """Test normalization to a target and the peak ceiling."""
+    quiet = sine(997, 5, 0.05)
+    normalized = audio_engine.normalize_loudness(quiet, target_lufs=-16.0)
+    assert audio_engine.integrated_loudness(normalized) == pytest.approx(-16.0, abs=0.1)
+
+    capped = audio_engine.normalize_loudness(quiet, target_lufs=0.0, peak_ceiling_db=-1.0)
+    assert np.max(np.abs(capped.samples)) == pytest.approx(10 ** (-1 / 20), rel=1e-3)
+
+
+def test_bed_loudness_is_cached(tmp_path, monkeypatch):
+    """Test that the bed loudness is stored next to the decoded PCM cache."""
+    path = tmp_path / "bed.wav"
+    audio_engine.buffer_to_segment(sine(997, 2, 0.1, frame_rate=FRAME_RATE)).export(
+        str(path), format="wav"
+    )
+    cache_dir = str(tmp_path / "cache")
+    monkeypatch.setattr(audio_engine, "_BED_CACHE", {})
+
+    loudness = audio_engine.bed_loudness(str(path), cache_dir=cache_dir)
+    assert audio_engine.read_cache_metadata(str(path), cache_dir)["loudness_lufs"] == loudness
+
+    monkeypatch.setattr(audio_engine, "integrated_loudness", pytest.fail)
+    assert audio_engine.bed_loudness(str(path), cache_dir=cache_dir) == loudness
+
+
+def test_mix_spreads_mono_voice():
+    """Test that mixing keeps the voice length and spreads mono to stereo."""
+    voice = PCMBuffer(np.full((100, 1), 0.25, np.float32), FRAME_RATE)
+    music = PCMBuffer(np.full((60, 2), 0.5, np.float32), FRAME_RATE)
+    mixed = audio_engine.mix(voice, music)
+    assert mixed.samples.shape == (100, 2)
+    np.testing.assert_allclose(mixed.samples[:60], 0.75)
+    np.testing.assert_allclose(mixed.samples[60:], 0.25)
+
+
+def test_pcm_frame_rate():
+    """Test parsing of ElevenLabs output formats."""
+    assert audio_engine.pcm_frame_rate("pcm_44100") == 44100
+    assert audio_engine.pcm_frame_rate("mp3_44100_128") is None
+
+
+def test_segment_from_pcm_bytes():
+    """Test that raw PCM from the TTS provider is used without decoding."""
+    pcm = (np.arange(2400, dtype="<i2") - 1200).tobytes()
+    segment = audio_engine.segment_from_bytes(memoryview(pcm), "pcm_24000")
+    assert segment.frame_rate == 24000
+    assert segment.channels == 1
+    assert len(segment) == 100
+    assert segment.raw_data == pcm
+
+
+def test_segment_from_encoded_bytes():
+    """Test decoding encoded audio from memory."""
+    original = AudioSegment.silent(duration=250, frame_rate=FRAME_RATE)
+    data = original.export(format="wav").read()
+    segment = audio_engine.segment_from_bytes(data, "wav")
+    assert len(segment) == 250
+    assert segment.frame_rate == FRAME_RATE
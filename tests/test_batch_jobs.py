@@ -0,0 +1,151 @@
+import pytest
+from unittest.mock import patch
+from types import SimpleNamespace
+from scripts import batch_jobs, core
+from scripts.artifact_store import FilesystemArtifactStore
+
+ELEMENTS = {
+    "Genre": "Horror",
+    "Main Character": "A retired mime",
+    "Setting": "Sentient IKEA",
+    "Conflict": "Missing screws",
+    "Plot Twist": "It was flat-packed all along",
+}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+
+def counting_handlers(calls, fail=None):
+    """Handlers that record their calls; ``fail`` maps (item_id, stage) to a count of failures."""
+    fail = dict(fail or {})
+
+    def make(stage):
+        def handler(item):
+            calls.append((item.item_id, stage))
+            if fail.get((item.item_id, stage), 0) > 0:
+                fail[(item.item_id, stage)] -= 1
+                raise RuntimeError("provider down")
+            return f"{stage}-{item.item_id}"
+
+        return handler
+
+    return {stage: make(stage) for stage in batch_jobs.STAGES}
+
+
+def test_run_job_completes_all_stages(db_path):
+    """Test that every stage of every item runs once and is checkpointed."""
+    job_id = batch_jobs.create_job([ELEMENTS, ELEMENTS], db_path=db_path)
+    calls = []
+    summary = batch_jobs.run_job(job_id, counting_handlers(calls), db_path=db_path)
+
+    assert summary == {"total": 2, "done": 2, "failed": 0, "pending": 0}
+    assert len(calls) == 8
+    items = batch_jobs.load_items(job_id, db_path)
+    assert items[1].outputs == {stage: f"{stage}-1" for stage in batch_jobs.STAGES}
+    assert items[0].elements == ELEMENTS
+
+
+def test_resume_skips_completed_stages(db_path):
+    """Test that a rerun only retries the failed stage and what follows it."""
+    job_id = batch_jobs.create_job([ELEMENTS, ELEMENTS], db_path=db_path)
+    calls = []
+    summary = batch_jobs.run_job(
+        job_id, counting_handlers(calls, fail={(0, "tts"): 1}), db_path=db_path
+    )
+    assert summary == {"total": 2, "done": 1, "failed": 1, "pending": 0}
+    assert batch_jobs.load_items(job_id, db_path)[0].errors == {"tts": "provider down"}
+
+    calls.clear()
+    summary = batch_jobs.run_job(job_id, counting_handlers(calls), db_path=db_path)
+    assert summary["done"] == 2
+    assert calls == [(0, "tts"), (0, "mix")]
+
+
+def test_max_attempts(db_path):
+    """Test that a stage is not retried after max_attempts failures."""
+    job_id = batch_jobs.create_job([ELEMENTS], db_path=db_path)
+    calls = []
+    handlers = counting_handlers(calls, fail={(0, "title"): 10})
+    for _ in range(4):
+        batch_jobs.run_job(job_id, handlers, max_attempts=2, db_path=db_path)
+    assert calls == [(0, "title"), (0, "title")]
+    assert batch_jobs.job_summary(job_id, db_path)["failed"] == 1
+
+
+def test_outage_stops_run_early(db_path):
+    """Test that consecutive failures stop the run without touching later items."""
+    job_id = batch_jobs.create_job([ELEMENTS] * 10, db_path=db_path)
+    calls = []
+    handlers = counting_handlers(calls, fail={(i, "title"): 1 for i in range(10)})
+    summary = batch_jobs.run_job(
+        job_id, handlers, max_consecutive_failures=3, db_path=db_path
+    )
+    assert calls == [(0, "title"), (1, "title"), (2, "title")]
+    assert summary == {"total": 10, "done": 0, "failed": 3, "pending": 7}
+
+
+def test_idempotency_key_is_stable():
+    """Test that idempotency keys depend only on job, item and stage."""
+    a = batch_jobs.JobItem("job", 1, ELEMENTS)
+    b = batch_jobs.JobItem("job", 1, {}, outputs={"title": "x"})
+    assert a.idempotency_key("tts") == b.idempotency_key("tts")
+    assert a.idempotency_key("tts") != a.idempotency_key("mix")
+    assert a.idempotency_key("tts") != batch_jobs.JobItem("job", 2, ELEMENTS).idempotency_key("tts")
+
+
+def test_tts_is_not_billed_twice(tmp_path, db_path):
+    """Test that a voice-over saved before a crash is reused instead of regenerated."""
+    store = FilesystemArtifactStore(str(tmp_path / "audio"))
+    config = SimpleNamespace(
+        tts_output_format="mp3_44100_128", key_pool=lambda provider: None
+    )
+    handlers = batch_jobs.pipeline_handlers("model", "key", "http://llm", store, config)
+    item = batch_jobs.JobItem(
+        "job", 0, ELEMENTS, outputs={"title": "Flat Pack", "script": "In a world..."}
+    )
+
+    with patch.object(
+        core, "generate_audio_with_elevenlabs", return_value=b"mp3 data"
+    ) as tts, patch.object(core, "_record_artifact"):
+        key = handlers["tts"](item)
+        # The process died before the checkpoint was written; the rerun reuses it
+        assert handlers["tts"](item) == key
+
+    assert tts.call_count == 1
+    assert store.get(key) == b"mp3 data"
+    assert key == f"voiceover_Flat Pack_{item.idempotency_key('tts')}.mp3"
+
+
+def test_bulk_titles_fall_back_per_item(db_path):
+    """Test that titles the bulk handler misses are generated one by one."""
+    job_id = batch_jobs.create_job([ELEMENTS] * 3, db_path=db_path)
+    calls, bulk_calls = [], []
+
+    def titles(items):
+        bulk_calls.append([item.item_id for item in items])
+        return {0: "Bulk 0", 2: "Bulk 2"}
+
+    summary = batch_jobs.run_job(
+        job_id,
+        counting_handlers(calls),
+        db_path=db_path,
+        bulk_handlers={"title": titles},
+    )
+    assert summary["done"] == 3
+    assert bulk_calls == [[0, 1, 2]]
+    assert [call for call in calls if call[1] == "title"] == [(1, "title")]
+    items = batch_jobs.load_items(job_id, db_path)
+    assert [item.outputs["title"] for item in items] == ["Bulk 0", "title-1", "Bulk 2"]
+
+    # A failed bulk call is not counted as an attempt of the items
+    job_id = batch_jobs.create_job([ELEMENTS], db_path=db_path)
+    batch_jobs.run_job(
+        job_id,
+        counting_handlers([]),
+        db_path=db_path,
+        bulk_handlers={"title": lambda items: 1 / 0},
+    )
+    assert batch_jobs.load_items(job_id, db_path)[0].attempts["title"] == 1
@@ -1,6 +1,7 @@
+import dataclasses
 import pytest
+from scripts import config as config_module
 from scripts.config import Config
-import streamlit as st
 
 
 def test_config_default_values():
@@ -14,14 +15,13 @@ def test_config_default_values():
 def test_config_load_from_secrets(monkeypatch):
     """Test loading configuration from Streamlit secrets."""
 
-    # Mock streamlit secrets
-    class MockSecrets:
-        openrouter_api_key = "test-api-key"
-        openrouter_model = "test-model"
+    secrets = {
+        "openrouter_api_key": "test-api-key",
+        "openrouter_model": "test-model",
+    }
+    monkeypatch.delenv("OPENROUTER_API_KEY", raising=False)
 
-    monkeypatch.setattr(st, "secrets", MockSecrets())
-
-    config = Config.load()
+    config = Config.load(secrets=secrets)
     assert config.openrouter_api_key == "test-api-key"
     assert config.openrouter_model == "test-model"
     assert config.background_music_path == "assets/audio/trailer_music.mp3"
@@ -32,5 +32,162 @@ def test_config_validation():
     config = Config()
     assert not config.is_valid()  # Should be invalid without API key
 
-    config.openrouter_api_key = "test-key"
+    config = config.replace(openrouter_api_key="test-key")
     assert config.is_valid()  # Should be valid with API key
+
+
+def test_config_key_pools(monkeypatch):
+    """Test loading key pools from env vars and building the shared pools."""
+
+    secrets = {
+        "openrouter_api_key": "primary",
+        "elevenlabs_api_keys": ["voice-1", "voice-2"],
+    }
+    env = {"OPENROUTER_API_KEYS": "extra-1, extra-2,"}
+
+    config = Config.load(secrets=secrets, env=env)
+    assert config.openrouter_api_keys == ("extra-1", "extra-2")
+    assert config.key_pool("openrouter").keys == ["primary", "extra-1", "extra-2"]
+    assert config.key_pool("elevenlabs").keys == ["voice-1", "voice-2"]
+
+
+def test_config_collections_are_read_only():
+    """Test that list and table settings cannot be changed through the snapshot."""
+    secrets = {
+        "ollama_preload_models": ["a"],
+        "model_token_limits": {"a": {"context": 100}},
+    }
+    config = Config.load(secrets=secrets, env={}).replace(trailer_pool_genres=["Horror"])
+    assert config.ollama_preload_models == ("a",)
+    assert config.trailer_pool_genres == ("Horror",)
+    with pytest.raises(TypeError):
+        config.model_token_limits["a"]["context"] = 1
+    with pytest.raises(TypeError):
+        config.model_token_limits["b"] = {}
+
+
+def test_secrets_source_replaces_secrets_file(tmp_path):
+    """Test that a registered secrets source is used instead of the file."""
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text('music_fit_mode = "loop"\n')
+    config_module.set_secrets_source(lambda: {"music_fit_mode": "stretch"})
+    try:
+        config = config_module.reload_config(str(secrets_path))
+        assert config.music_fit_mode == "stretch"
+        config_module.set_secrets_source(lambda: None)
+        config = config_module.reload_config(str(secrets_path))
+        assert config.music_fit_mode == "loop"
+    finally:
+        config_module.set_secrets_source(None)
+        config_module.reload_config(str(secrets_path))
+
+
+def test_config_rate_limits():
+    """Test that rate limits from the secrets update the shared limiter."""
+    secrets = {"rate_limits": {"elevenlabs": {"characters": [100000, 2592000]}}}
+    config = Config.load(secrets=secrets, env={})
+    assert config.rate_limits == {"elevenlabs": {"characters": (100000.0, 2592000.0)}}
+    limits = config.rate_limiter().limits
+    assert limits["elevenlabs"]["characters"] == (100000.0, 2592000.0)
+    assert "characters" not in Config().rate_limiter().limits["elevenlabs"]
+
+
+def test_mix_processing_is_opt_in():
+    """Test that ducking and loudness normalization keep the original mix by default."""
+    config = Config.load(secrets={}, env={})
+    assert config.music_ducking is False
+    assert config.target_lufs is None
+    config = Config.load(secrets={"music_ducking": True, "target_lufs": -16.0}, env={})
+    assert (config.music_ducking, config.target_lufs) == (True, -16.0)
+
+
+def test_config_is_immutable():
+    """Test that a loaded snapshot cannot be changed in place."""
+    config = Config()
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.target_lufs = -14.0
+
+
+def test_config_layers(tmp_path):
+    """Test that env vars override the TOML file and overrides win over both."""
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text(
+        'music_fit_mode = "loop"\nmedia_server_port = 9000\nmusic_library_dir = "toml"\n'
+    )
+    env = {"MUSIC_LIBRARY_DIR": "env"}
+
+    config = Config.load(env=env, secrets_path=str(secrets_path))
+    assert config.music_fit_mode == "loop"
+    assert config.media_server_port == 9000
+    assert config.music_library_dir == "env"
+
+    overrides = config_module.parse_overrides(["music_library_dir=cli", "target_lufs=-14"])
+    config = Config.load(env=env, overrides=overrides, secrets_path=str(secrets_path))
+    assert config.music_library_dir == "cli"
+    assert config.target_lufs == -14
+
+
+def test_parse_overrides():
+    """Test command line override parsing."""
+    assert config_module.parse_overrides(
+        ["music_ducking=false", "openrouter_api_keys=[\"a\", \"b\"]", "music_fit_mode=loop"]
+    ) == {"music_ducking": False, "openrouter_api_keys": ["a", "b"], "music_fit_mode": "loop"}
+    with pytest.raises(ValueError):
+        config_module.parse_overrides(["no_such_setting=1"])
+    with pytest.raises(ValueError):
+        config_module.parse_overrides(["music_ducking"])
+
+
+def test_get_config_reloads_on_file_change(tmp_path):
+    """Test that the shared snapshot is reused until the secrets file changes."""
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text('music_fit_mode = "loop"\n')
+
+    first = config_module.get_config(str(secrets_path))
+    assert config_module.get_config(str(secrets_path)) is first
+    assert first.music_fit_mode == "loop"
+
+    secrets_path.write_text('music_fit_mode = "stretch"  # edited\n')
+    assert config_module.get_config(str(secrets_path)).music_fit_mode == "stretch"
+
+    reloaded = config_module.reload_config(str(secrets_path), overrides={"target_lufs": -9.0})
+    assert reloaded.target_lufs == -9.0
+    assert config_module.get_config(str(secrets_path)) is reloaded
+    config_module.reload_config(str(secrets_path))
+
+
+def test_update_secrets_keeps_other_settings(tmp_path):
+    """Test that saving API keys leaves lists, tables and comments intact."""
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text(
+        "# keep me\n"
+        'OPENROUTER_API_KEY = "old"\n'
+        'openrouter_api_keys = ["a", "b"]\n'
+        "\n"
+        "[rate_limits.openrouter]\n"
+        "requests = [20, 60]\n"
+    )
+
+    config_module.update_secrets(
+        {"OPENROUTER_API_KEY": 'new"key', "ELEVENLABS_API_KEY": "el"},
+        str(secrets_path),
+    )
+
+    secrets = config_module.read_secrets(str(secrets_path))
+    assert secrets["OPENROUTER_API_KEY"] == 'new"key'
+    assert secrets["ELEVENLABS_API_KEY"] == "el"
+    assert secrets["openrouter_api_keys"] == ["a", "b"]
+    assert secrets["rate_limits"] == {"openrouter": {"requests": [20, 60]}}
+    assert secrets_path.read_text().startswith("# keep me\n")
+
+
+def test_read_secrets_rejects_invalid_toml(tmp_path):
+    """Test that a broken secrets file is reported instead of ignored."""
+    secrets_path = tmp_path / "secrets.toml"
+    secrets_path.write_text('openrouter_api_keys = "["a", "b"]"\n')
+
+    with pytest.raises(ValueError):
+        config_module.read_secrets(str(secrets_path))
+    with pytest.raises(ValueError):
+        config_module.update_secrets({"OPENROUTER_API_KEY": "x"}, str(secrets_path))
+    assert config_module.read_secrets(str(tmp_path / "missing.toml")) == {}
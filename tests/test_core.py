@@ -0,0 +1,226 @@
+import sys
+import subprocess
+import pytest
+import requests
+from unittest.mock import MagicMock, patch
+from scripts import core, script_validation
+from scripts.key_pool import KeyPool
+from scripts.rate_limiter import RateLimiter
+
+
+def test_core_does_not_import_streamlit():
+    """Test that headless entry points can be imported without Streamlit."""
+    code = (
+        "import sys\n"
+        "import scripts.core, scripts.batch_jobs, scripts.config\n"
+        "import scripts.openrouter_client, utils.llm_api\n"
+        "assert 'streamlit' not in sys.modules, 'streamlit was imported'\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_tts_failure_raises():
+    """Test that TTS failures are raised instead of shown in the UI."""
+    pool = KeyPool("elevenlabs", ["key"], limiter=RateLimiter({}))
+    response = MagicMock()
+    response.raise_for_status.side_effect = requests.exceptions.HTTPError("500 Server Error")
+    with patch.object(core.requests, "post", return_value=response):
+        with pytest.raises(core.TTSError, match="500 Server Error"):
+            core.generate_audio_with_elevenlabs("In a world...", key_pool=pool)
+
+
+def test_tts_without_keys_raises():
+    """Test that a missing ElevenLabs key is reported as a TTSError."""
+    pool = KeyPool("elevenlabs", [], limiter=RateLimiter({}))
+    with pytest.raises(core.TTSError, match="No elevenlabs API key configured"):
+        core.generate_audio_with_elevenlabs("In a world...", key_pool=pool)
+
+
+def test_missing_voice_over_raises():
+    """Test that mixing a missing file raises a MixingError."""
+    with pytest.raises(core.MixingError):
+        core.apply_background_music("non_existent_file.mp3")
+
+
+def test_ollama_not_installed_raises():
+    """Test that a missing Ollama binary raises an OllamaError."""
+    with patch.object(core.subprocess, "run", side_effect=FileNotFoundError):
+        with pytest.raises(core.OllamaError, match="not installed"):
+            core.get_ollama_models()
+
+
+ELEMENTS = {
+    "Genre": "Horror",
+    "Main Character": "A retired mime",
+    "Setting": "Sentient IKEA",
+    "Conflict": "Missing screws",
+    "Plot Twist": "It was flat-packed all along",
+}
+
+
+def test_generate_trailer_text_reports_progress(monkeypatch):
+    """Test that title and script are generated in order and logged."""
+    replies = iter(['"Flat Pack"', "In a world...\n\nOne mime.\n\nFlat Pack."])
+    monkeypatch.setattr(core, "call_llm", lambda **kwargs: next(replies))
+    monkeypatch.setattr(core, "save_movie_data", lambda *args, **kwargs: "gen-1")
+    progress = []
+
+    result = core.generate_trailer_text(
+        ELEMENTS, "model", "key", "http://llm", report=lambda p, m: progress.append(p)
+    )
+    assert result == {
+        "movie_name": "Flat Pack",
+        "script": "In a world...\n\nOne mime.\n\nFlat Pack.",
+        "generation_id": "gen-1",
+    }
+    assert progress == sorted(progress)
+
+
+def test_empty_title_raises(monkeypatch):
+    """Test that an empty LLM reply is raised as a GenerationError."""
+    monkeypatch.setattr(core, "call_llm", lambda **kwargs: None)
+    with pytest.raises(core.GenerationError):
+        core.generate_title(ELEMENTS, "model", "key", "http://llm")
+
+
+def test_prefetched_text_is_reused(monkeypatch):
+    """Test that an accepted prefetch skips the LLM and a stale one is discarded."""
+    calls = []
+    monkeypatch.setattr(
+        core, "call_llm", lambda **kwargs: calls.append(kwargs["prompt"]) or "Reply"
+    )
+    monkeypatch.setattr(core, "save_movie_data", lambda *args, **kwargs: "gen-1")
+
+    prefetched = core.prefetch_trailer_text(ELEMENTS, "model", "key", "http://llm")
+    assert len(calls) == 1
+    assert "script" not in prefetched["stages"]
+
+    # Accepted: only the script is left to generate
+    core.generate_trailer_text(
+        ELEMENTS, "model", "key", "http://llm", prefetched=prefetched
+    )
+    assert len(calls) == 2
+
+    # The user changed an element: the prefetch is ignored
+    changed = dict(ELEMENTS, Genre="Comedy")
+    core.generate_trailer_text(
+        changed, "model", "key", "http://llm", prefetched=prefetched
+    )
+    assert len(calls) == 4
+
+
+def test_overlong_script_is_regenerated_once(monkeypatch):
+    """Test that a script cut down too far is retried uncoalesced, then repaired."""
+    long_script = " ".join(["The END is NEAR, and it is close."] * 20) + " Flat Pack."
+    calls = []
+
+    def fake_call_llm(**kwargs):
+        calls.append(kwargs["coalesce"])
+        kwargs["usage"].update(prompt_tokens=10, completion_tokens=100)
+        return long_script
+
+    monkeypatch.setattr(core, "call_llm", fake_call_llm)
+    usage = {}
+    script = core.generate_script(
+        "Flat Pack", ELEMENTS, "m", "k", "http://llm", usage=usage
+    )
+
+    assert calls == [True, False]
+    assert usage == {"prompt_tokens": 20, "completion_tokens": 200}
+    assert script.endswith("Flat Pack.")
+    assert script_validation.count_words(script) <= script_validation.MAX_WORDS
+
+
+class RejectedRequest(Exception):
+    """An API error as raised by the OpenAI SDK for a 400 response."""
+
+    status_code = 400
+
+
+def test_final_key_for():
+    """Test that the final mix never gets the voice-over's own name."""
+    assert core.final_key_for("voiceover_A_1.mp3") == "final_A_1.mp3"
+    assert core.final_key_for("voiceover_voiceover_A.mp3") == "final_voiceover_A.mp3"
+    assert core.final_key_for("take_1.mp3") == "final_take_1.mp3"
+
+
+def test_title_uses_schema_and_falls_back_once(monkeypatch):
+    """Test that a rejected JSON schema is remembered and plain text is used."""
+    monkeypatch.setattr(core, "_SCHEMALESS_MODELS", set())
+    calls = []
+
+    def fake_call_llm(**kwargs):
+        calls.append("response_format" in kwargs)
+        if kwargs.get("response_format") and kwargs["model_name"] == "plain":
+            raise RejectedRequest("response_format is not supported")
+        return '{"title": "Flat Pack"}' if "response_format" in kwargs else "Mime Time"
+
+    monkeypatch.setattr(core, "call_llm", fake_call_llm)
+    assert core.generate_title(ELEMENTS, "json", "k", "http://llm") == "Flat Pack"
+    assert core.generate_title(ELEMENTS, "plain", "k", "http://llm") == "Mime Time"
+    assert core.generate_title(ELEMENTS, "plain", "k", "http://llm") == "Mime Time"
+    assert calls == [True, True, False, False]
+
+
+def test_unrelated_bad_request_keeps_schema(monkeypatch):
+    """Test that a 400 that does not name the schema is raised, not remembered."""
+    monkeypatch.setattr(core, "_SCHEMALESS_MODELS", set())
+
+    def fake_call_llm(**kwargs):
+        raise RejectedRequest("max_tokens is too large")
+
+    monkeypatch.setattr(core, "call_llm", fake_call_llm)
+    with pytest.raises(RejectedRequest):
+        core.generate_title(ELEMENTS, "m", "k", "http://llm")
+    assert core._SCHEMALESS_MODELS == set()
+
+
+def test_unusable_title_is_retried_once(monkeypatch):
+    """Test that a placeholder title is requested again without coalescing."""
+    replies = iter(['{"title": "Title"}', '{"title": "Flat Pack"}'])
+    coalesced = []
+
+    def fake_call_llm(**kwargs):
+        coalesced.append(kwargs["coalesce"])
+        kwargs["usage"].update(prompt_tokens=5, completion_tokens=7)
+        return next(replies)
+
+    monkeypatch.setattr(core, "call_llm", fake_call_llm)
+    usage = {}
+    title = core.generate_title(ELEMENTS, "m", "k", "http://llm", usage=usage)
+    assert title == "Flat Pack"
+    assert coalesced == [True, False]
+    assert usage == {"prompt_tokens": 10, "completion_tokens": 14}
+
+
+def test_generate_titles_in_batches(monkeypatch):
+    """Test that combinations are packed per request and gaps are left as None."""
+    monkeypatch.setattr(core, "_SCHEMALESS_MODELS", set())
+    prompts_sent = []
+    replies = iter(
+        [
+            '{"titles": [{"id": 1, "title": "One"}, {"id": 2, "title": "Title"}]}',
+            "1. Three",
+        ]
+    )
+
+    def fake_call_llm(**kwargs):
+        prompts_sent.append(kwargs["prompt"])
+        return next(replies)
+
+    monkeypatch.setattr(core, "call_llm", fake_call_llm)
+    elements_list = [dict(ELEMENTS, Genre=genre) for genre in ("A", "B", "C")]
+    titles = core.generate_titles(elements_list, "m", "k", "http://llm", batch_size=2)
+
+    # "Title" is a placeholder and is left for a single request
+    assert titles == ["One", None, "Three"]
+    assert len(prompts_sent) == 2
+    assert "2. Genre: B" in prompts_sent[0] and "1. Genre: C" in prompts_sent[1]
+
+
+def test_title_batch_size_follows_token_limits():
+    """Test that small context or output limits shrink the bulk batch."""
+    assert core.title_batch_size() == core.MAX_TITLE_BATCH
+    assert core.title_batch_size(output_tokens=100) == 3
+    assert core.title_batch_size(context_tokens=500) < 5
+    assert core.title_batch_size(context_tokens=100, output_tokens=10) == 1
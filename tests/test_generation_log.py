@@ -0,0 +1,92 @@
+import pytest
+from scripts import generation_log
+from scripts.generation_log import GenerationRecord
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "history.sqlite3")
+
+
+def make_record(name, genre="Horror", model="llama3.2:3b", created_at=1000.0, **kwargs):
+    return GenerationRecord(
+        elements={"Genre": genre, "Setting": "Sentient IKEA"},
+        movie_name=name,
+        script=f"In a world... {name}",
+        model=model,
+        title_prompt=f"title prompt for {name}",
+        script_prompt=f"script prompt for {name}",
+        created_at=created_at,
+        **kwargs,
+    )
+
+
+def test_log_and_get_generation(db_path):
+    """Test that a logged generation round-trips with all its fields."""
+    record = make_record(
+        "Flat Pack", title_ms=120.5, script_ms=900.0, prompt_tokens=80, completion_tokens=60
+    )
+    generation_id = generation_log.log_generation(record, db_path)
+
+    loaded = generation_log.get_generation(generation_id, db_path)
+    assert loaded == record
+    assert generation_log.get_generation("missing", db_path) is None
+
+
+def test_history_is_append_only(db_path):
+    """Test that every run is kept instead of only the last one."""
+    for i in range(3):
+        generation_log.log_generation(make_record(f"Movie {i}", created_at=1000.0 + i), db_path)
+
+    names = [r.movie_name for r in generation_log.recent_generations(db_path=db_path)]
+    assert names == ["Movie 2", "Movie 1", "Movie 0"]
+
+
+def test_recent_generations_filters(db_path):
+    """Test filtering by genre, model and title, and pagination."""
+    generation_log.log_generation(make_record("A", genre="Horror", created_at=1.0), db_path)
+    generation_log.log_generation(make_record("B", genre="Comedy", created_at=2.0), db_path)
+    generation_log.log_generation(make_record("C", model="gpt-4o", created_at=3.0), db_path)
+
+    horror = generation_log.recent_generations(genre="Horror", db_path=db_path)
+    assert [r.movie_name for r in horror] == ["C", "A"]
+    by_model = generation_log.recent_generations(model="gpt-4o", db_path=db_path)
+    assert [r.movie_name for r in by_model] == ["C"]
+    by_name = generation_log.recent_generations(movie_name="B", db_path=db_path)
+    assert [r.movie_name for r in by_name] == ["B"]
+    page = generation_log.recent_generations(limit=1, offset=1, db_path=db_path)
+    assert [r.movie_name for r in page] == ["B"]
+
+
+def test_artifacts_are_linked(db_path):
+    """Test that artifacts logged later are returned with their generation."""
+    generation_id = generation_log.log_generation(make_record("Flat Pack"), db_path)
+    generation_log.log_artifact(generation_id, "voiceover", "generated_audio/v.mp3", db_path)
+    generation_log.log_artifact(generation_id, "final", "generated_audio/f.mp3", db_path)
+
+    record = generation_log.get_generation(generation_id, db_path)
+    assert [(a["kind"], a["path"]) for a in record.artifacts] == [
+        ("voiceover", "generated_audio/v.mp3"),
+        ("final", "generated_audio/f.mp3"),
+    ]
+    found = generation_log.find_by_artifact("generated_audio/f.mp3", db_path)
+    assert found.id == generation_id
+    assert generation_log.find_by_artifact("other.mp3", db_path) is None
+
+
+def test_find_by_prompt(db_path):
+    """Test looking up the latest completion for a model and prompt."""
+    generation_log.log_generation(make_record("Old", created_at=1.0), db_path)
+    newer = make_record("Old", created_at=2.0)
+    newer.script = "A newer script"
+    generation_log.log_generation(newer, db_path)
+
+    found = generation_log.find_by_prompt("llama3.2:3b", "script prompt for Old", db_path=db_path)
+    assert found.script == "A newer script"
+    assert generation_log.find_by_prompt("gpt-4o", "script prompt for Old", db_path=db_path) is None
+    title = generation_log.find_by_prompt(
+        "llama3.2:3b", "title prompt for Old", kind="title", db_path=db_path
+    )
+    assert title.movie_name == "Old"
+    with pytest.raises(ValueError):
+        generation_log.find_by_prompt("llama3.2:3b", "x", kind="image", db_path=db_path)
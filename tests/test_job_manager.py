@@ -0,0 +1,85 @@
+import threading
+import pytest
+from scripts.job_manager import JobManager
+
+
+@pytest.fixture
+def manager():
+    manager = JobManager(max_workers=2)
+    yield manager
+    manager.shutdown()
+
+
+def wait_for(manager, session_id, kind):
+    """Waits until the job finished and collects it."""
+    job = manager.get(session_id, kind)
+    for _ in range(500):
+        if job.finished:
+            break
+        threading.Event().wait(0.01)
+    return manager.pop_finished(session_id, kind)
+
+
+def test_job_result_is_delivered_once(manager):
+    """Test that a finished job is collected exactly once with its result."""
+
+    def work(a, b, report):
+        report(0.5, "adding")
+        return a + b
+
+    manager.submit("session", "text", work, 1, b=2)
+    job = wait_for(manager, "session", "text")
+    assert (job.status, job.result, job.progress, job.message) == ("done", 3, 1.0, "adding")
+    assert manager.pop_finished("session", "text") is None
+    assert manager.get("session", "text") is None
+
+
+def test_failed_job_keeps_error(manager):
+    """Test that exceptions are recorded on the job instead of propagating."""
+
+    def work(report):
+        raise RuntimeError("provider down")
+
+    manager.submit("session", "audio", work)
+    job = wait_for(manager, "session", "audio")
+    assert job.status == "failed"
+    assert job.error == "provider down"
+
+
+def test_running_job_is_not_started_twice(manager):
+    """Test that a rerun or second click returns the running job."""
+    release = threading.Event()
+    calls = []
+
+    def work(report):
+        calls.append(1)
+        release.wait(5)
+
+    first = manager.submit("session", "text", work)
+    second = manager.submit("session", "text", work)
+    other = manager.submit("other-session", "text", work)
+    assert second is first
+    assert other is not first
+    assert {job.session_id for job in manager.active()} == {"session", "other-session"}
+    assert manager.pop_finished("session", "text") is None
+    release.set()
+    wait_for(manager, "session", "text")
+    wait_for(manager, "other-session", "text")
+    assert len(calls) == 2
+
+
+def test_uncollected_jobs_are_pruned():
+    """Test that finished jobs of closed sessions are dropped after keep_seconds."""
+    now = [1000.0]
+    manager = JobManager(max_workers=1, keep_seconds=60, clock=lambda: now[0])
+    gone = manager.submit("gone", "text", lambda report: None)
+    for _ in range(500):
+        if gone.finished:
+            break
+        threading.Event().wait(0.01)
+
+    now[0] += 61
+    manager.submit("session", "text", lambda report: None)
+    manager.shutdown()
+    assert manager.get("gone", "text") is None
+    assert manager.get("session", "text") is not None
@@ -0,0 +1,130 @@
+import pytest
+from scripts import key_pool
+from scripts.key_pool import KeyPool, NoAvailableKeyError
+from scripts.rate_limiter import RateLimiter, RateLimitTimeout
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class HTTPError(Exception):
+    """Stand-in for a client error carrying an HTTP response."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code, "headers": headers or {}})()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_pool(clock, keys=("a", "b", "c"), strategy="least_loaded", limits=None):
+    limiter = RateLimiter(limits or {}, clock=clock)
+    return KeyPool("api", list(keys), strategy, limiter=limiter, clock=clock)
+
+
+def test_round_robin(clock):
+    """Test that round robin cycles through the keys."""
+    pool = make_pool(clock, strategy="round_robin")
+    picked = []
+    for _ in range(6):
+        key = pool.acquire()
+        pool.release(key)
+        picked.append(key)
+    assert picked == ["a", "b", "c", "a", "b", "c"]
+
+
+def test_least_loaded_prefers_idle_keys(clock):
+    """Test that least loaded spreads concurrent calls over the keys."""
+    pool = make_pool(clock)
+    assert {pool.acquire(), pool.acquire(), pool.acquire()} == {"a", "b", "c"}
+
+
+def test_least_loaded_prefers_keys_with_quota(clock):
+    """Test that a key whose rate limit is used up is picked last."""
+    pool = make_pool(clock, keys=("a", "b"), limits={"api": {"requests": (1, 60)}})
+    pool.limiter.acquire("api", "a", requests=1)
+    assert pool.acquire() == "b"
+
+
+def test_rate_limited_key_cools_down(clock):
+    """Test that a 429 takes the key out of rotation until retry-after passes."""
+    pool = make_pool(clock, keys=("a", "b"), strategy="round_robin")
+    with pytest.raises(HTTPError):
+        with pool.lease():
+            raise HTTPError(429, {"retry-after": "30"})
+    assert pool.available() == ["b"]
+    assert [pool.acquire() for _ in range(2)] == ["b", "b"]
+    clock.now += 31
+    assert pool.available() == ["a", "b"]
+
+
+def test_invalid_key_is_parked(clock):
+    """Test that an authentication failure disables the key for longer."""
+    pool = make_pool(clock, keys=("a",))
+    pool.release(pool.acquire(), success=False, status=401, error="invalid key")
+    with pytest.raises(NoAvailableKeyError):
+        pool.acquire()
+    clock.now += key_pool.AUTH_FAILURE_COOLDOWN
+    assert pool.acquire() == "a"
+
+
+def test_repeated_errors_cool_down(clock):
+    """Test that only repeated transient errors take a key out of rotation."""
+    pool = make_pool(clock, keys=("a",))
+    for _ in range(key_pool.MAX_CONSECUTIVE_ERRORS - 1):
+        pool.release(pool.acquire(), success=False, status=500)
+    assert pool.available() == ["a"]
+    pool.release(pool.acquire(), success=False, status=500)
+    assert pool.available() == []
+
+
+def test_rate_limit_timeout_is_not_held_against_the_key(clock):
+    """Test that a call the rate limiter gave up on leaves the key healthy."""
+    pool = make_pool(clock, keys=("a",))
+    for _ in range(key_pool.MAX_CONSECUTIVE_ERRORS):
+        with pytest.raises(RateLimitTimeout):
+            with pool.lease():
+                raise RateLimitTimeout("no capacity")
+    assert pool.available() == ["a"]
+    assert pool.status()[0]["failures"] == 0
+    assert pool.status()[0]["in_flight"] == 0
+
+
+def test_empty_pool():
+    """Test that a pool without keys reports that none is configured."""
+    pool = KeyPool("api", [None, ""], limiter=RateLimiter({}))
+    with pytest.raises(NoAvailableKeyError, match="No api API key configured"):
+        pool.acquire()
+
+
+def test_status_masks_keys(clock):
+    """Test that the status display never shows full keys."""
+    pool = make_pool(clock, keys=("sk-secret-1234",))
+    pool.release(pool.acquire())
+    assert pool.status() == [
+        {
+            "key": "…1234",
+            "in_flight": 0,
+            "successes": 1,
+            "failures": 0,
+            "cooldown_seconds": 0.0,
+            "last_error": None,
+        }
+    ]
+
+
+def test_get_key_pool_keeps_health():
+    """Test that the shared pool keeps key health when the config is reloaded."""
+    pool = key_pool.get_key_pool("test-provider", ["a", "b"])
+    pool.release(pool.acquire(), success=False, status=429)
+    same = key_pool.get_key_pool("test-provider", ["a", "b", "c"])
+    assert same is pool
+    assert len(same.available()) == 2
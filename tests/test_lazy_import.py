@@ -0,0 +1,75 @@
+import os
+import sys
+import subprocess
+import pytest
+from scripts.lazy_import import MissingModule, lazy_import
+
+# Headless entry points. Set IMPORT_TIME_BUDGET_MS to also check the time (ms)
+# each may take to import, including everything it pulls in; wall-clock timings
+# are too noisy to check on every run.
+ENTRY_POINTS = [
+    "scripts.core",
+    "scripts.batch_jobs",
+    "scripts.config",
+    "scripts.media_server",
+    "scripts.music_library",
+    "scripts.artifact_store",
+    "scripts.openrouter_client",
+    "utils.llm_api",
+]
+IMPORT_TIME_BUDGET_MS = os.environ.get("IMPORT_TIME_BUDGET_MS")
+HEAVY_MODULES = ("openai", "httpx", "pydub", "numpy", "requests", "boto3")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_times(module):
+    """Runs ``python -X importtime`` and returns {module: cumulative µs}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_does_not_import_heavy_modules(module):
+    """Test that heavy dependencies are not imported until they are used."""
+    times = import_times(module)
+    heavy = sorted(name for name in times if name.split(".")[0] in HEAVY_MODULES)
+    assert heavy == []
+
+
+@pytest.mark.skipif(not IMPORT_TIME_BUDGET_MS, reason="IMPORT_TIME_BUDGET_MS not set")
+@pytest.mark.parametrize("module", ENTRY_POINTS)
+def test_entry_point_import_time_budget(module):
+    """Test that each entry point imports within the start-up budget."""
+    times = import_times(module)
+    assert times[module] / 1000 < float(IMPORT_TIME_BUDGET_MS)
+
+
+def test_lazy_import_defers_loading():
+    """Test that the module is only executed on first attribute access."""
+    sys.modules.pop("colorsys", None)
+    module = lazy_import("colorsys")
+    assert type(module).__name__ == "_LazyModule"
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert lazy_import("colorsys") is sys.modules["colorsys"]
+
+
+def test_missing_module_raises_on_use():
+    """Test that a missing optional dependency fails when used, not when imported."""
+    module = lazy_import("no_such_module_for_tests", "testing")
+    assert isinstance(module, MissingModule)
+    assert not module
+    with pytest.raises(ImportError, match="no_such_module_for_tests is required for testing"):
+        module.anything
@@ -0,0 +1,134 @@
+import pytest
+import urllib.request
+import urllib.error
+from scripts import media_server
+
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A media server on a free port serving a temporary directory."""
+    (tmp_path / "final_Test Movie_20250101_120000.mp3").write_bytes(CONTENT)
+    (tmp_path.parent / "secret.txt").write_text("outside root")
+    (tmp_path / "history.sqlite3").write_bytes(b"SQLite format 3")
+    (tmp_path / ".tmp-abc.mp3").write_bytes(CONTENT)
+    server = media_server.start_media_server(str(tmp_path), port=0)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield base_url, str(tmp_path)
+    server.shutdown()
+    server.server_close()
+
+
+def fetch(url, headers=None, method="GET"):
+    request = urllib.request.Request(url, headers=headers or {}, method=method)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, dict(response.headers), response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, dict(e.headers), e.read()
+
+
+def file_url(base_url, root, **kwargs):
+    return media_server.media_url(
+        f"{root}/final_Test Movie_20250101_120000.mp3", base_url, root=root, **kwargs
+    )
+
+
+@pytest.mark.parametrize(
+    "header,expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-200", (800, 999)),
+        ("bytes=900-5000", (900, 999)),
+        ("bytes=1000-", None),
+        ("bytes=50-10", None),
+        ("bytes=-", None),
+        ("items=0-1", None),
+    ],
+)
+def test_parse_range(header, expected):
+    """Test parsing of single byte ranges."""
+    assert media_server.parse_range(header, 1000) == expected
+
+
+def test_full_response_has_cache_headers(server):
+    """Test a plain GET with validators and caching headers."""
+    status, headers, body = fetch(file_url(*server))
+    assert status == 200
+    assert body == CONTENT
+    assert headers["Content-Type"] == "audio/mpeg"
+    assert headers["Accept-Ranges"] == "bytes"
+    assert headers["Cache-Control"] == media_server.CACHE_CONTROL
+    assert headers["ETag"]
+    assert headers["Last-Modified"]
+
+
+def test_range_request(server):
+    """Test that a byte range returns 206 with only the requested bytes."""
+    status, headers, body = fetch(file_url(*server), {"Range": "bytes=1000-1999"})
+    assert status == 206
+    assert body == CONTENT[1000:2000]
+    assert headers["Content-Range"] == f"bytes 1000-1999/{len(CONTENT)}"
+
+
+def test_unsatisfiable_range(server):
+    """Test that a range past the end returns 416."""
+    status, headers, _ = fetch(file_url(*server), {"Range": "bytes=99999-"})
+    assert status == 416
+    assert headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_etag_revalidation(server):
+    """Test that a matching If-None-Match returns 304 without a body."""
+    _, headers, _ = fetch(file_url(*server))
+    status, _, body = fetch(file_url(*server), {"If-None-Match": headers["ETag"]})
+    assert status == 304
+    assert body == b""
+
+
+def test_head_and_download(server):
+    """Test HEAD requests and the attachment download flag."""
+    status, headers, body = fetch(file_url(*server), method="HEAD")
+    assert status == 200
+    assert headers["Content-Length"] == str(len(CONTENT))
+    assert body == b""
+
+    _, headers, _ = fetch(file_url(*server, download=True))
+    assert headers["Content-Disposition"].startswith("attachment;")
+
+
+def test_paths_outside_root_are_not_served(server):
+    """Test that missing files and path traversal return 404."""
+    base_url, _ = server
+    assert fetch(f"{base_url}/missing.mp3")[0] == 404
+    assert fetch(f"{base_url}/%2E%2E/secret.txt")[0] == 404
+
+
+def test_only_audio_files_are_served(server):
+    """Test that databases and temporary files below the root are not served."""
+    base_url, _ = server
+    assert fetch(f"{base_url}/history.sqlite3")[0] == 404
+    assert fetch(f"{base_url}/.tmp-abc.mp3")[0] == 404
+    status, headers, _ = fetch(file_url(*server))
+    assert status == 200
+    assert "Access-Control-Allow-Origin" not in headers
+
+
+def test_shared_server_follows_artifact_root(tmp_path, monkeypatch):
+    """Test that the shared server serves the root it was last asked for."""
+    monkeypatch.setattr(media_server, "_server", None)
+    first, second = tmp_path / "first", tmp_path / "second"
+    server = media_server.ensure_media_server(str(first), port=0)
+    try:
+        (second / "a.mp3").parent.mkdir()
+        (second / "a.mp3").write_bytes(CONTENT)
+        assert media_server.ensure_media_server(str(second), port=0) is server
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        url = media_server.media_url(str(second / "a.mp3"), base_url, str(second))
+        assert fetch(url)[0] == 200
+    finally:
+        server.shutdown()
+        server.server_close()
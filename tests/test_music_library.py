@@ -0,0 +1,128 @@
+import os
+import json
+import pytest
+from pydub import AudioSegment
+from scripts import audio_engine, music_library
+from scripts.music_library import Track
+
+
+@pytest.fixture
+def music_dir(tmp_path, monkeypatch):
+    """A music directory with two silent beds of different lengths."""
+    monkeypatch.setattr(audio_engine, "_BED_CACHE", {})
+    directory = tmp_path / "audio"
+    directory.mkdir()
+    AudioSegment.silent(duration=1000, frame_rate=8000).export(
+        str(directory / "horror_drone.wav"), format="wav"
+    )
+    AudioSegment.silent(duration=3000, frame_rate=8000).export(
+        str(directory / "western_theme.wav"), format="wav"
+    )
+    (directory / "notes.txt").write_text("not audio")
+    return str(directory)
+
+
+def make_track(path, duration_ms, tags):
+    return Track(
+        path=path,
+        mtime=0.0,
+        duration_ms=duration_ms,
+        frame_rate=44100,
+        channels=2,
+        loudness_lufs=-14.0,
+        tempo=None,
+        cache_path="",
+        tags=tags,
+    )
+
+
+def test_scan_library_builds_index(music_dir, tmp_path):
+    """Test that scanning analyses audio files and persists the index."""
+    tracks = music_library.scan_library(music_dir, cache_dir=str(tmp_path / "cache"))
+
+    assert [os.path.basename(t.path) for t in tracks] == [
+        "horror_drone.wav",
+        "western_theme.wav",
+    ]
+    assert tracks[0].duration_ms == pytest.approx(1000)
+    assert tracks[1].frame_rate == 8000
+    assert tracks[0].tags == ["horror", "drone"]
+    assert os.path.exists(tracks[0].cache_path)
+    assert music_library.load_index(music_dir) == tracks
+
+
+def test_scan_library_reuses_index(music_dir, tmp_path, monkeypatch):
+    """Test that unchanged files are not analysed again."""
+    cache_dir = str(tmp_path / "cache")
+    first = music_library.scan_library(music_dir, cache_dir=cache_dir)
+
+    monkeypatch.setattr(music_library, "analyse_track", pytest.fail)
+    assert music_library.scan_library(music_dir, cache_dir=cache_dir) == first
+
+
+def test_scan_library_is_cached(music_dir, tmp_path, monkeypatch):
+    """Test that repeated scans neither re-read the index nor miss new beds."""
+    cache_dir = str(tmp_path / "cache")
+    first = music_library.scan_library(music_dir, cache_dir=cache_dir)
+
+    with monkeypatch.context() as m:
+        m.setattr(music_library, "load_index", pytest.fail)
+        assert music_library.scan_library(music_dir, cache_dir=cache_dir) == first
+
+    AudioSegment.silent(duration=2000, frame_rate=8000).export(
+        os.path.join(music_dir, "noir_sax.wav"), format="wav"
+    )
+    tracks = music_library.scan_library(music_dir, cache_dir=cache_dir)
+    assert len(tracks) == 3
+    # The index went through a private temporary file that is gone again
+    assert sorted(os.listdir(music_dir)) == [
+        "horror_drone.wav",
+        "music_index.json",
+        "noir_sax.wav",
+        "notes.txt",
+        "western_theme.wav",
+    ]
+
+
+def test_scan_library_keeps_edited_tags(music_dir, tmp_path):
+    """Test that hand-edited tags survive a rescan of a modified file."""
+    cache_dir = str(tmp_path / "cache")
+    music_library.scan_library(music_dir, cache_dir=cache_dir)
+
+    index_path = music_library.index_path_for(music_dir)
+    with open(index_path) as f:
+        index = json.load(f)
+    index["tracks"][1]["tags"] = ["western", "noir"]
+    index["tracks"][1]["mtime"] = 0.0  # pretend the file changed
+    with open(index_path, "w") as f:
+        json.dump(index, f)
+
+    tracks = music_library.scan_library(music_dir, cache_dir=cache_dir)
+    assert tracks[1].tags == ["western", "noir"]
+    assert tracks[1].mtime == os.path.getmtime(tracks[1].path)
+
+
+def test_scan_library_drops_removed_files(music_dir, tmp_path):
+    """Test that deleted files disappear from the index."""
+    cache_dir = str(tmp_path / "cache")
+    music_library.scan_library(music_dir, cache_dir=cache_dir)
+    os.remove(os.path.join(music_dir, "horror_drone.wav"))
+
+    tracks = music_library.scan_library(music_dir, cache_dir=cache_dir)
+    assert [os.path.basename(t.path) for t in tracks] == ["western_theme.wav"]
+    assert len(music_library.load_index(music_dir)) == 1
+
+
+def test_select_track_prefers_genre_then_duration():
+    """Test genre matching with duration as the tie-breaker."""
+    tracks = [
+        make_track("a.mp3", 30000, ["horror"]),
+        make_track("b.mp3", 60000, ["horror"]),
+        make_track("c.mp3", 45000, ["western"]),
+    ]
+
+    assert music_library.select_track(tracks, "Cosmic Horror Comedy", 50000).path == "b.mp3"
+    assert music_library.select_track(tracks, "Acid Western", 50000).path == "c.mp3"
+    # No genre match: closest duration wins
+    assert music_library.select_track(tracks, "Mumblecore", 31000).path == "a.mp3"
+    assert music_library.select_track([], "Horror", 1000) is None
@@ -0,0 +1,104 @@
+import time
+import threading
+import pytest
+from unittest.mock import MagicMock, patch
+from scripts import ollama_manager
+from scripts.ollama_manager import OllamaManager, keep_alive_seconds, ollama_host
+
+
+def response(payload):
+    mock = MagicMock()
+    mock.json.return_value = payload
+    return mock
+
+
+def test_keep_alive_and_host_parsing():
+    """Test Ollama duration strings and base URL handling."""
+    assert keep_alive_seconds("30m") == 1800
+    assert keep_alive_seconds("1h30m") == 5400
+    assert keep_alive_seconds(300) == 300
+    assert keep_alive_seconds("-1") == float("inf")
+    with pytest.raises(ValueError):
+        keep_alive_seconds("soon")
+    assert ollama_host("http://localhost:11434/v1/") == "http://localhost:11434"
+    assert ollama_host(None) == ollama_manager.DEFAULT_HOST
+
+
+@patch("scripts.ollama_manager.requests")
+def test_load_records_load_time_and_keep_alive(mock_requests):
+    """Test that a preload sends the model's keep_alive and records the load."""
+    mock_requests.post.return_value = response({"load_duration": 4_200_000_000})
+    manager = OllamaManager(keep_alive="30m", model_keep_alive={"big": "-1"})
+
+    state = manager.load("big")
+    assert mock_requests.post.call_args.kwargs["json"] == {
+        "model": "big",
+        "keep_alive": "-1",
+    }
+    assert state.status == "loaded"
+    assert state.load_seconds == pytest.approx(4.2)
+
+    # Re-arming an already loaded model keeps the recorded load time
+    mock_requests.post.return_value = response({"load_duration": 0})
+    assert manager.load("big").load_seconds == pytest.approx(4.2)
+
+
+@patch("scripts.ollama_manager.requests")
+def test_ensure_warm_only_loads_when_needed(mock_requests):
+    """Test that a model with plenty of keep_alive left is not reloaded."""
+    expires = time.strftime(
+        "%Y-%m-%dT%H:%M:%S.123456789Z", time.gmtime(time.time() + 1500)
+    )
+    mock_requests.get.return_value = response(
+        {"models": [{"name": "warm", "expires_at": expires}]}
+    )
+    mock_requests.post.return_value = response({"load_duration": 1_000_000_000})
+    manager = OllamaManager(keep_alive="30m")
+
+    assert manager.ensure_warm("warm").status == "loaded"
+    assert manager.ensure_warm("cold").status == "loading"
+    for thread in threading.enumerate():
+        if thread.name == "ollama-load-cold":
+            thread.join(5)
+    assert manager.state("cold").status == "loaded"
+    loaded = [call.kwargs["json"]["model"] for call in mock_requests.post.call_args_list]
+    assert loaded == ["cold"]
+
+
+@patch("scripts.ollama_manager.requests")
+def test_failed_load_is_not_retried_at_once(mock_requests):
+    """Test that an unreachable server is not asked again on every rerun."""
+    mock_requests.exceptions.RequestException = OSError
+    mock_requests.get.side_effect = OSError("connection refused")
+    mock_requests.post.side_effect = OSError("connection refused")
+    manager = OllamaManager()
+
+    state = manager.load("llama3.2:3b")
+    assert state.status == "failed" and "refused" in state.error
+    assert manager.ensure_warm("llama3.2:3b").status == "failed"
+    assert mock_requests.post.call_count == 1
+
+
+@patch("scripts.ollama_manager.requests")
+def test_warm_loads_installed_models_when_reachable(mock_requests):
+    """Test that warming skips unpulled models and an unreachable server."""
+    mock_requests.exceptions.RequestException = OSError
+    mock_requests.get.side_effect = OSError("connection refused")
+    manager = OllamaManager()
+    manager._warm(("llama3.2:3b",))
+    assert manager.state("llama3.2:3b").status == "unloaded"
+    mock_requests.post.assert_not_called()
+
+    tags = response({"models": [{"name": "llama3.2:3b"}, {"name": "phi:latest"}]})
+    mock_requests.get.side_effect = [tags, response({"models": []})]
+    mock_requests.post.return_value = response({"load_duration": 1_000_000_000})
+    manager._installed_checked = float("-inf")
+    manager.warm(["llama3.2:3b", "phi", "missing"])
+    deadline = time.monotonic() + 5
+    while manager._warming or any(
+        t.name.startswith("ollama-load-") for t in threading.enumerate()
+    ):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    loaded = sorted(c.kwargs["json"]["model"] for c in mock_requests.post.call_args_list)
+    assert loaded == ["llama3.2:3b", "phi"]
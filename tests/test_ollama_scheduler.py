@@ -0,0 +1,99 @@
+import time
+import threading
+import pytest
+from scripts import ollama_scheduler
+from scripts.ollama_scheduler import OllamaBusyError, OllamaScheduler
+
+
+def queue(scheduler, model, admitted):
+    """Starts a request for ``model`` in a thread and waits until it is queued."""
+    queued = scheduler.status().get(model, {}).get("queued", 0)
+
+    def request():
+        scheduler.acquire(model, timeout=5)
+        admitted.append(model)
+
+    thread = threading.Thread(target=request, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 5
+    while scheduler.status().get(model, {}).get("queued", 0) <= queued:
+        assert time.monotonic() < deadline, "request was never queued"
+        time.sleep(0.005)
+    return thread
+
+
+def wait_for(admitted, count):
+    deadline = time.monotonic() + 5
+    while len(admitted) < count:
+        assert time.monotonic() < deadline, f"only {admitted} were admitted"
+        time.sleep(0.005)
+
+
+def test_requests_are_capped_per_model():
+    """Test that a model gets at most num_parallel requests at a time."""
+    scheduler = OllamaScheduler(num_parallel=2, max_loaded_models=1)
+    scheduler.acquire("a")
+    scheduler.acquire("a")
+    admitted = []
+    queue(scheduler, "a", admitted)
+    assert admitted == []
+
+    scheduler.release("a")
+    wait_for(admitted, 1)
+    assert scheduler.status() == {"a": {"in_flight": 2, "queued": 0}}
+
+
+def test_running_model_is_served_before_switching():
+    """Test that a newer request for the running model goes before another model."""
+    scheduler = OllamaScheduler(num_parallel=2, max_loaded_models=1)
+    scheduler.acquire("a")
+    scheduler.acquire("a")
+    admitted = []
+    queue(scheduler, "b", admitted)
+    queue(scheduler, "a", admitted)
+
+    scheduler.release("a")
+    wait_for(admitted, 1)
+    assert admitted == ["a"]
+    # "b" only starts once "a" has drained
+    scheduler.release("a")
+    scheduler.release("a")
+    wait_for(admitted, 2)
+    assert admitted == ["a", "b"]
+
+
+def test_busy_model_gives_way_after_batch_limit():
+    """Test that a waiting model is not starved by a model that keeps getting work."""
+    scheduler = OllamaScheduler(num_parallel=1, max_loaded_models=1, batch_limit=2)
+    scheduler.acquire("a")
+    scheduler.release("a")
+    scheduler.acquire("a")
+    admitted = []
+    queue(scheduler, "b", admitted)
+    queue(scheduler, "a", admitted)
+
+    scheduler.release("a")
+    wait_for(admitted, 1)
+    assert admitted == ["b"]
+
+
+def test_pick_model_prefers_loaded_models():
+    """Test that the loaded model is picked among interchangeable ones."""
+    scheduler = OllamaScheduler(loaded_models=lambda: ["qwen"])
+    assert scheduler.pick_model(["llama", "qwen"]) == "qwen"
+    assert scheduler.pick_model(["llama", "phi"]) == "llama"
+    assert scheduler.pick_model([]) is None
+
+
+def test_timeout_and_host_detection(monkeypatch):
+    """Test the queue timeout and which base URLs are scheduled."""
+    scheduler = OllamaScheduler(num_parallel=1, max_loaded_models=1)
+    scheduler.acquire("a")
+    with pytest.raises(OllamaBusyError):
+        scheduler.acquire("b", timeout=0.05)
+    assert scheduler.status() == {"a": {"in_flight": 1, "queued": 0}}
+
+    monkeypatch.setattr(ollama_scheduler, "_schedulers", {})
+    assert ollama_scheduler.scheduler_for("https://openrouter.ai/api/v1") is None
+    local = ollama_scheduler.scheduler_for("http://localhost:11434/v1")
+    assert local is ollama_scheduler.scheduler_for("http://localhost:11434")
@@ -0,0 +1,54 @@
+import pytest
+from scripts import prompts
+from scripts.prompt_templates import (
+    build_messages,
+    compile_template,
+    supports_cache_marker,
+)
+
+ELEMENTS = {
+    "Genre": "Horror",
+    "Main Character": "A retired mime",
+    "Setting": "Sentient IKEA",
+    "Conflict": "Missing screws",
+    "Plot Twist": "It was flat-packed all along",
+}
+
+
+def test_compile_extracts_fields_and_rejects_variable_prefix():
+    """Test that fields are found once and the system prefix must be static."""
+    template = compile_template("t", 'Reply as {"a": 1}', "{x} and {y}, {x}")
+    assert template.fields == ("x", "y")
+    assert template.render(x=1, y=2) == "1 and 2, 1"
+    with pytest.raises(KeyError, match="y"):
+        template.render(x=1)
+    with pytest.raises(ValueError):
+        compile_template("t", "Be {mood}", "{x}")
+
+
+def test_static_prefix_is_shared_between_requests():
+    """Test that only the user message differs between two combinations."""
+    other = dict(ELEMENTS, Genre="Comedy")
+    for template, fields in (
+        (prompts.TITLE_TEMPLATE, prompts.title_fields),
+        (prompts.SCRIPT_TEMPLATE, lambda e: prompts.script_fields("Flat Pack", e)),
+    ):
+        first = build_messages(template.render(**fields(ELEMENTS)), template.system)
+        second = build_messages(template.render(**fields(other)), template.system)
+        assert first[0] == second[0] and first[0]["role"] == "system"
+        assert first[1] != second[1]
+        assert "Horror" not in template.system
+    assert "1-5 words" in prompts.TITLE_TEMPLATE.system
+    assert "60 words" in prompts.SCRIPT_TEMPLATE.system
+
+
+def test_cache_marker_only_where_needed():
+    """Test that cache_control is added for OpenRouter Anthropic/Gemini models."""
+    openrouter = "https://openrouter.ai/api/v1"
+    assert supports_cache_marker(openrouter, "anthropic/claude-3.5-haiku")
+    assert not supports_cache_marker(openrouter, "deepseek/deepseek-chat-v3-0324:free")
+    assert not supports_cache_marker("http://localhost:11434/v1", "anthropic/x")
+
+    marked = build_messages("Hi", "Rules", cache_marker=True)
+    assert marked[0]["content"][0]["cache_control"] == {"type": "ephemeral"}
+    assert build_messages("Hi") == [{"role": "user", "content": "Hi"}]
@@ -0,0 +1,166 @@
+import pytest
+from scripts import rate_limiter
+from scripts.rate_limiter import RateLimiter, RateLimitTimeout, TokenBucket
+
+
+class FakeClock:
+    """A clock that only advances when something sleeps."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_token_bucket_refills(clock):
+    """Test that a bucket refills at its rate up to its capacity."""
+    bucket = TokenBucket(capacity=10, refill_rate=2, clock=clock)
+    bucket.consume(10)
+    assert bucket.wait_time(4) == pytest.approx(2.0)
+    clock.sleep(100)
+    assert bucket.wait_time(10) == 0
+    assert bucket.tokens == 10
+
+
+def test_acquire_paces_calls(clock):
+    """Test that calls beyond the limit wait instead of failing."""
+    limiter = RateLimiter({"api": {"requests": (3, 60)}}, clock=clock, sleep=clock.sleep)
+    waits = [limiter.acquire("api", "key", requests=1) for _ in range(5)]
+    assert waits[:3] == [0, 0, 0]
+    # One request every 20 seconds after the burst
+    assert waits[3] == pytest.approx(20)
+    assert waits[4] == pytest.approx(20)
+
+
+def test_keys_have_separate_buckets(clock):
+    """Test that each API key is paced independently."""
+    limiter = RateLimiter({"api": {"requests": (1, 60)}}, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire("api", "key-a", requests=1) == 0
+    assert limiter.acquire("api", "key-b", requests=1) == 0
+    assert limiter.wait_time("api", "key-a", requests=1) == pytest.approx(60)
+
+
+def test_acquire_waits_for_every_resource(clock):
+    """Test that a call waits for the slowest of its buckets."""
+    limits = {"tts": {"requests": (10, 60), "characters": (100, 100)}}
+    limiter = RateLimiter(limits, clock=clock, sleep=clock.sleep)
+    limiter.acquire("tts", "key", requests=1, characters=100)
+    assert limiter.acquire("tts", "key", requests=1, characters=50) == pytest.approx(50)
+
+
+def test_acquire_timeout(clock):
+    """Test that acquire gives up when capacity is too far away."""
+    limiter = RateLimiter({"api": {"requests": (1, 600)}}, clock=clock, sleep=clock.sleep)
+    limiter.acquire("api", "key", requests=1)
+    with pytest.raises(RateLimitTimeout):
+        limiter.acquire("api", "key", timeout=10, requests=1)
+
+
+def test_unlimited_provider_is_not_paced(clock):
+    """Test that providers without limits (e.g. local Ollama) never wait."""
+    limiter = RateLimiter({}, clock=clock, sleep=clock.sleep)
+    for _ in range(100):
+        assert limiter.acquire("localhost", "ollama", requests=1, tokens=500) == 0
+
+
+def test_parse_duration():
+    """Test the reset header formats sent by different providers."""
+    assert rate_limiter.parse_duration("1.5") == 1.5
+    assert rate_limiter.parse_duration("6m0s") == 360
+    assert rate_limiter.parse_duration("20ms") == pytest.approx(0.02)
+    assert rate_limiter.parse_duration("1h2m3s") == 3723
+    assert rate_limiter.parse_duration("1700000060000", now=1_700_000_000) == 60
+    assert rate_limiter.parse_duration("1700000030", now=1_700_000_000) == 30
+    assert rate_limiter.parse_duration("soon") is None
+
+
+def test_parse_rate_limit_headers():
+    """Test OpenAI-style and OpenRouter-style rate limit headers."""
+    openai_style = {
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "59",
+        "x-ratelimit-reset-requests": "1s",
+        "x-ratelimit-limit-tokens": "150000",
+        "x-ratelimit-remaining-tokens": "149000",
+        "x-ratelimit-reset-tokens": "400ms",
+        "content-type": "application/json",
+    }
+    assert rate_limiter.parse_rate_limit_headers(openai_style) == {
+        "requests": (60, 59, 1),
+        "tokens": (150000, 149000, pytest.approx(0.4)),
+    }
+    openrouter_style = {
+        "X-RateLimit-Limit": "20",
+        "X-RateLimit-Remaining": "5",
+        "X-RateLimit-Reset": "1700000030000",
+    }
+    assert rate_limiter.parse_rate_limit_headers(openrouter_style, now=1_700_000_000) == {
+        "requests": (20, 5, 30)
+    }
+
+
+def test_observe_learns_limits(clock):
+    """Test that response headers replace the configured limits."""
+    limiter = RateLimiter({"api": {"requests": (20, 60)}}, clock=clock, sleep=clock.sleep)
+    limiter.observe(
+        "api",
+        "key",
+        {
+            "x-ratelimit-limit-requests": "10",
+            "x-ratelimit-remaining-requests": "0",
+            "x-ratelimit-reset-requests": "5s",
+        },
+    )
+    bucket = limiter.buckets("api", "key")["requests"]
+    assert bucket.capacity == 10
+    # Empty now, full again when the window resets in 5 seconds
+    assert limiter.wait_time("api", "key", requests=10) == pytest.approx(5)
+    assert limiter.wait_time("api", "key", requests=1) == pytest.approx(0.5)
+
+
+def test_retry_after_blocks(clock):
+    """Test that a retry-after header blocks the key even with tokens left."""
+    limiter = RateLimiter({}, clock=clock, sleep=clock.sleep)
+    limiter.observe("api", "key", {"retry-after": "7"})
+    assert limiter.acquire("api", "key", requests=1) == pytest.approx(7)
+    limiter.penalize("api", "key", 3)
+    assert limiter.acquire("api", "key", requests=1) == pytest.approx(3)
+
+
+def test_provider_for():
+    """Test provider names derived from base URLs."""
+    assert rate_limiter.provider_for("https://openrouter.ai/api/v1") == "openrouter"
+    assert rate_limiter.provider_for("http://localhost:11434/v1") == "localhost"
+
+
+def test_configured_limits_override_defaults(clock):
+    """Test that configured limits replace, add and remove default limits."""
+    limits = rate_limiter.merge_limits(
+        {
+            "openrouter": {"requests": (200, 60)},
+            "elevenlabs": {"characters": (100_000, rate_limiter.SECONDS_PER_MONTH)},
+            "api": {"requests": (0, 60)},
+        }
+    )
+    assert limits["openrouter"] == {"requests": (200, 60)}
+    assert limits["elevenlabs"]["characters"] == (100_000, rate_limiter.SECONDS_PER_MONTH)
+    assert limits["api"] == {}
+    # Character quotas are only paced when configured
+    assert "characters" not in rate_limiter.merge_limits()["elevenlabs"]
+
+
+def test_set_limits_resets_changed_providers(clock):
+    """Test that new limits take effect for providers whose limits changed."""
+    limiter = RateLimiter({"api": {"requests": (1, 600)}}, clock=clock, sleep=clock.sleep)
+    limiter.acquire("api", "key", requests=1)
+    limiter.set_limits({"api": {"requests": (10, 60)}})
+    assert limiter.acquire("api", "key", requests=1) == 0
@@ -0,0 +1,141 @@
+from scripts import script_validation
+from scripts.script_validation import (
+    clean_script,
+    clean_title,
+    parse_title,
+    parse_titles,
+    title_issues,
+    validate_script,
+)
+
+COMPLIANT = (
+    "In a world of ENDLESS possibilities, one TRUTH remains.\n\n"
+    "The path ahead is DANGEROUS - but the cost of failure? UNIMAGINABLE.\n\n"
+    "The Matrix."
+)
+
+
+def test_clean_title():
+    """Test that labels, markdown, quotes and trailing periods are removed."""
+    assert clean_title('"Flat Pack"') == "Flat Pack"
+    assert clean_title("**Title:** *The Last Screw*.") == "The Last Screw"
+    assert clean_title("Here is your title:\n\n# Mime Time\nA comedy") == "Mime Time"
+    assert clean_title("   \n") == ""
+
+
+def test_parse_title_reads_json_or_text():
+    """Test that structured, fenced and plain outputs give the same title."""
+    assert parse_title('{"title": "Flat Pack"}') == "Flat Pack"
+    assert parse_title('```json\n{"title": "\\"Flat Pack\\""}\n```') == "Flat Pack"
+    assert parse_title("Flat Pack") == "Flat Pack"
+    assert parse_title('{"title": ') == "{title:"
+    assert parse_title(None) == ""
+
+
+def test_parse_titles_reads_numbered_answers():
+    """Test bulk answers as JSON or numbered lines, dropping bad entries."""
+    raw = (
+        '{"titles": [{"id": 1, "title": "\\"Flat Pack\\""}, {"id": 3, "title": "Dup"},'
+        ' {"id": 3, "title": "Dup 2"}, {"id": 9, "title": "Extra"}, {"id": 2}]}'
+    )
+    assert parse_titles(raw, 3) == {1: "Flat Pack"}
+    assert parse_titles("1. Flat Pack\n2) **Mime Time**\n", 2) == {
+        1: "Flat Pack",
+        2: "Mime Time",
+    }
+    assert parse_titles("", 2) == {}
+
+
+def test_title_issues():
+    """Test that empty, long, placeholder and broken titles are flagged."""
+    assert title_issues("Flat Pack") == []
+    assert title_issues("") == ["empty"]
+    assert title_issues("Movie Title") == ["placeholder"]
+    assert title_issues("<Flat Pack>") == ["markup"]
+    assert title_issues("A title that goes on and on and on forever") == ["10 words"]
+
+
+def test_clean_script_strips_directions_and_markup():
+    """Test that only the spoken text survives, one paragraph per line."""
+    raw = (
+        "Sure! Here's the script:\n"
+        '**NARRATOR (V.O.):** "In a world of ENDLESS screws..."\n'
+        "*explosion*\n"
+        "[Dramatic music swells]\n"
+        "CUT TO BLACK\n"
+        "Music: drums\n"
+        "- Sound the ALARM. (whispering) Flat Pack."
+    )
+    assert clean_script(raw) == (
+        "In a world of ENDLESS screws...\n\nSound the ALARM. Flat Pack."
+    )
+
+
+def test_times_and_asides_in_dialogue_are_kept():
+    """Test that only timecodes and known direction forms are removed."""
+    raw = "(whispering) They came from BELOW. 3:10 to Yuma rides again."
+    assert clean_script(raw) == "They came from BELOW. 3:10 to Yuma rides again."
+    assert clean_script("[00:03] In a world...\n0:03 - Sound the ALARM.") == (
+        "In a world...\n\nSound the ALARM."
+    )
+    assert clean_script("(0:05-0:08) Run. (BEAT) (softly) Go.") == "Run. Go."
+
+    report = validate_script("At 3:10 the TRAIN comes. 3:10 to Yuma.", "3:10 to Yuma")
+    assert report.script == "At 3:10 the TRAIN comes. 3:10 to Yuma."
+    assert not report.needs_regeneration
+
+
+def test_unknown_parenthetical_is_kept_and_flagged():
+    """Test that an aside that may be spoken is not deleted but regenerated."""
+    raw = "The hero (and his mother) RETURNS. Flat Pack."
+    report = validate_script(raw, "Flat Pack")
+    assert "(and his mother)" in report.script
+    assert report.issues == ["unrecognised parenthetical (and his mother)"]
+    assert report.needs_regeneration
+
+
+def test_compliant_script_is_untouched():
+    """Test that a script following every rule scores 1 and is kept as is."""
+    report = validate_script(COMPLIANT, "The Matrix")
+    assert report.script == COMPLIANT
+    assert report.score == 1.0
+    assert report.issues == [] and report.repairs == []
+    assert not report.needs_regeneration
+
+
+def test_missing_title_is_appended():
+    """Test that the title is added when the script does not end with it."""
+    report = validate_script("One mime. ONE mission.", "Flat Pack")
+    assert report.script == "One mime. ONE mission.\n\nFlat Pack."
+    assert "does not end with the title" in report.issues
+    assert report.score < 1.0
+
+
+def test_overlong_script_is_trimmed_by_sentence():
+    """Test that sentences are dropped from the end and the title is kept."""
+    sentences = [f"Sentence {n} has EXACTLY seven words here." for n in range(9)]
+    report = validate_script(" ".join(sentences) + " Flat Pack.", "Flat Pack")
+
+    assert report.word_count <= script_validation.MAX_WORDS
+    assert report.script.startswith("Sentence 0")
+    assert report.script.endswith("Sentence 7 has EXACTLY seven words here. Flat Pack.")
+    assert "65 words (limit 60)" in report.issues
+    # One sentence of eight cut: a repair, not a regeneration
+    assert not report.needs_regeneration
+
+
+def test_heavy_trim_requests_regeneration():
+    """Test that losing most of the script asks for a new one."""
+    report = validate_script("WORD " * 200 + "and more.", "Flat Pack")
+    assert report.needs_regeneration
+    assert report.script.endswith("...\n\nFlat Pack.")
+    assert report.word_count <= script_validation.MAX_WORDS
+
+
+def test_surplus_emphasis_is_lowercased():
+    """Test that only the first two emphasis words of a sentence stay upper case."""
+    report = validate_script(
+        "THE END is NEAR and NOBODY is SAFE. Flat Pack.", "Flat Pack"
+    )
+    assert report.script == "THE END is near and nobody is safe. Flat Pack."
+    assert "too many emphasis words" in report.issues
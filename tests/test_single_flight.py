@@ -0,0 +1,230 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from scripts.single_flight import SingleFlight, request_key
+from utils import llm_api
+
+
+def slow_call(calls, started, release, result="done"):
+    def call():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return call
+
+
+def test_concurrent_calls_share_one_request():
+    """Test that identical concurrent calls make a single call."""
+    group = SingleFlight()
+    calls, started, release = [], threading.Event(), threading.Event()
+    call = slow_call(calls, started, release)
+
+    def request():
+        return group.do("key", call)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(request)
+        started.wait(5)
+        followers = [pool.submit(request) for _ in range(3)]
+        while group.coalesced < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [f.result() for f in [leader] + followers]
+
+    assert results == ["done"] * 4
+    assert len(calls) == 1
+    assert (group.calls, group.coalesced, group.in_flight()) == (1, 3, 0)
+
+
+def test_exception_is_shared():
+    """Test that followers get the leader's exception."""
+    group = SingleFlight()
+    calls, started, release = [], threading.Event(), threading.Event()
+    call = slow_call(calls, started, release, RuntimeError("429"))
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(group.do, "key", call)
+        started.wait(5)
+        follower = pool.submit(group.do, "key", call)
+        while group.coalesced < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError, match="429"):
+                future.result()
+    assert len(calls) == 1
+
+
+def test_finished_calls_are_not_cached():
+    """Test that a request after the first one finished goes out again."""
+    group = SingleFlight()
+    results = iter(["first", "second"])
+    assert group.do("key", lambda: next(results)) == "first"
+    assert group.do("key", lambda: next(results)) == "second"
+
+
+def test_request_key_ignores_dict_order():
+    """Test that keyword arguments in a different order give the same key."""
+    assert request_key("m", {"a": 1, "b": 2}) == request_key("m", {"b": 2, "a": 1})
+    assert request_key("m", {"a": 1}) != request_key("m", {"a": 2})
+
+
+def test_call_llm_coalesces_identical_prompts(monkeypatch):
+    """Test that concurrent identical LLM calls share one request and its usage."""
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def fake_call(*args, **kwargs):
+        calls.append(args)
+        started.set()
+        release.wait(5)
+        return "Flat Pack", {"prompt_tokens": 10, "completion_tokens": 3}
+
+    monkeypatch.setattr(llm_api, "_call_llm", fake_call)
+    group = llm_api.get_single_flight("llm")
+    coalesced = group.coalesced
+    usages = [{}, {}]
+
+    def request(usage):
+        return llm_api.call_llm(
+            "model", "prompt", "key", "http://llm", usage=usage, temperature=0.7
+        )
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first = pool.submit(request, usages[0])
+        started.wait(5)
+        second = pool.submit(request, usages[1])
+        while group.coalesced == coalesced:
+            threading.Event().wait(0.01)
+        release.set()
+        assert first.result() == second.result() == "Flat Pack"
+
+    assert len(calls) == 1
+    assert usages[0] == {"prompt_tokens": 10, "completion_tokens": 3}
+    # The follower is not billed for the leader's tokens a second time
+    assert usages[1] == {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "shared_prompt_tokens": 10,
+        "shared_completion_tokens": 3,
+    }
+
+
+def test_call_llm_without_coalescing(monkeypatch):
+    """Test that coalesce=False always makes its own call."""
+    calls = []
+    monkeypatch.setattr(
+        llm_api, "_call_llm", lambda *args, **kwargs: (calls.append(1), ("x", {}))[1]
+    )
+    llm_api.call_llm("model", "prompt", "key", "http://llm", coalesce=False)
+    assert calls == [1]
+
+
+def test_async_callers_share_one_call():
+    """Test that identical tasks share one call, also with a waiting thread."""
+    group = SingleFlight()
+    calls, release = [], threading.Event()
+
+    async def call():
+        calls.append(1)
+        await asyncio.get_running_loop().run_in_executor(None, release.wait, 5)
+        return "done"
+
+    async def main():
+        tasks = [asyncio.create_task(group.do_async("key", call)) for _ in range(3)]
+        while group.coalesced < 2:
+            await asyncio.sleep(0.01)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            thread = pool.submit(group.do, "key", lambda: "not called")
+            while group.coalesced < 3:
+                await asyncio.sleep(0.01)
+            release.set()
+            results = await asyncio.gather(*tasks)
+            return results + [thread.result()]
+
+    assert asyncio.run(main()) == ["done"] * 4
+    assert len(calls) == 1
+    assert group.in_flight() == 0
+
+
+def test_cancelled_follower_does_not_cancel_the_call():
+    """Test that a follower giving up leaves the leader's call running."""
+    group = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(group.do_async("key", call))
+        follower = asyncio.create_task(group.do_async("key", call))
+        await asyncio.sleep(0.01)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_call_llm_async_coalesces(monkeypatch):
+    """Test the awaitable call_llm: one request, usage billed to the leader."""
+    calls, release = [], threading.Event()
+
+    def fake_call(*args, **kwargs):
+        calls.append(args)
+        release.wait(5)
+        return "Flat Pack", {"prompt_tokens": 10, "completion_tokens": 3}
+
+    monkeypatch.setattr(llm_api, "_call_llm", fake_call)
+    group = llm_api.get_single_flight("llm")
+    usages = [{}, {}]
+
+    async def main():
+        first = asyncio.create_task(
+            llm_api.call_llm_async("m", "async", "k", "http://llm", usage=usages[0])
+        )
+        while not calls:
+            await asyncio.sleep(0.01)
+        coalesced = group.coalesced
+        second = asyncio.create_task(
+            llm_api.call_llm_async("m", "async", "k", "http://llm", usage=usages[1])
+        )
+        while group.coalesced == coalesced:
+            await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(main()) == ["Flat Pack", "Flat Pack"]
+    assert len(calls) == 1
+    assert usages[0]["prompt_tokens"] == 10
+    assert usages[1]["prompt_tokens"] == 0
+    assert usages[1]["shared_prompt_tokens"] == 10
+
+
+def test_calls_with_different_keys_are_not_coalesced(monkeypatch):
+    """Test that a request is only shared by callers using the same key or pool."""
+    calls, release = [], threading.Event()
+
+    def fake_call(*args, **kwargs):
+        calls.append(args[2])
+        release.wait(5)
+        return "Flat Pack", {}
+
+    monkeypatch.setattr(llm_api, "_call_llm", fake_call)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futures = [
+            pool.submit(llm_api.call_llm, "model", "prompt", key, "http://llm")
+            for key in ("key-a", "key-b")
+        ]
+        for _ in range(500):
+            if len(calls) == 2:
+                break
+            threading.Event().wait(0.01)
+        release.set()
+        assert [f.result() for f in futures] == ["Flat Pack", "Flat Pack"]
+    assert sorted(calls) == ["key-a", "key-b"]
@@ -0,0 +1,118 @@
+import pytest
+from scripts import batch_jobs, trailer_pool
+
+ELEMENTS = {
+    "Genre": "Horror",
+    "Main Character": "A retired mime",
+    "Setting": "Sentient IKEA",
+    "Conflict": "Missing screws",
+    "Plot Twist": "It was flat-packed all along",
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    return {
+        "db_path": str(tmp_path / "pool.sqlite3"),
+        "jobs_db_path": str(tmp_path / "jobs.sqlite3"),
+    }
+
+
+class Crash(BaseException):
+    """Stands in for the process dying mid-refill."""
+
+
+def handlers(calls, crash_on=None):
+    def make(stage):
+        def handler(item):
+            calls.append((item.elements["Genre"], stage))
+            if crash_on and len(calls) == crash_on:
+                raise Crash()
+            return f"{stage}-{item.job_id}-{item.item_id}"
+
+        return handler
+
+    return {stage: make(stage) for stage in batch_jobs.STAGES}
+
+
+def test_take_serves_oldest_trailer_once(paths):
+    """Test that trailers are served oldest first and never twice."""
+    db_path = paths["db_path"]
+    trailer_pool.add_trailer(ELEMENTS, "First", "Script 1", "a.mp3", db_path=db_path)
+    trailer_pool.add_trailer(ELEMENTS, "Second", "Script 2", "b.mp3", db_path=db_path)
+    assert trailer_pool.ready_counts(db_path) == {"Horror": 2}
+
+    assert trailer_pool.take_trailer(db_path=db_path).movie_name == "First"
+    assert trailer_pool.take_trailer(db_path=db_path).movie_name == "Second"
+    assert trailer_pool.take_trailer(db_path=db_path) is None
+
+
+def test_take_by_genre_and_skips_missing_audio(paths):
+    """Test the genre filter and that deleted audio is dropped from the pool."""
+    db_path = paths["db_path"]
+    comedy = dict(ELEMENTS, Genre="Comedy")
+    trailer_pool.add_trailer(ELEMENTS, "Gone", "", "deleted.mp3", db_path=db_path)
+    trailer_pool.add_trailer(comedy, "Funny", "", "funny.mp3", db_path=db_path)
+    trailer_pool.add_trailer(ELEMENTS, "Scary", "", "scary.mp3", db_path=db_path)
+
+    assert trailer_pool.take_trailer("Comedy", db_path=db_path).movie_name == "Funny"
+    trailer = trailer_pool.take_trailer(
+        "Horror", is_available=lambda path: path != "deleted.mp3", db_path=db_path
+    )
+    assert trailer.movie_name == "Scary"
+    assert trailer.elements == ELEMENTS
+    assert trailer_pool.ready_counts(db_path) == {}
+
+
+def test_refill_tops_up_each_genre(paths):
+    """Test that a refill only renders the shortfall of every genre."""
+    trailer_pool.add_trailer(ELEMENTS, "Ready", "", "a.mp3", db_path=paths["db_path"])
+    calls = []
+    added = trailer_pool.refill(2, ["Horror", "Comedy"], handlers(calls), **paths)
+
+    assert added == 3
+    assert trailer_pool.ready_counts(paths["db_path"]) == {"Horror": 2, "Comedy": 2}
+    assert sorted(genre for genre, stage in calls if stage == "mix") == [
+        "Comedy",
+        "Comedy",
+        "Horror",
+    ]
+    assert trailer_pool.refill(2, ["Horror", "Comedy"], handlers([]), **paths) == 0
+
+
+def test_interrupted_refill_is_resumed(paths):
+    """Test that a crashed refill resumes its job instead of starting over."""
+    calls = []
+    with pytest.raises(Crash):
+        trailer_pool.refill(1, ["Horror"], handlers(calls, crash_on=3), **paths)
+    assert trailer_pool.ready_counts(paths["db_path"]) == {}
+
+    calls.clear()
+    assert trailer_pool.refill(1, ["Horror"], handlers(calls), **paths) == 1
+    # Title and script were checkpointed before the crash
+    assert calls == [("Horror", "tts"), ("Horror", "mix")]
+    assert trailer_pool.ready_counts(paths["db_path"]) == {"Horror": 1}
+
+
+def test_refill_with_failed_items_stays_open(paths):
+    """Test that items with attempts left keep the refill open for the next run."""
+    calls, failures = [], []
+    stage_handlers = handlers(calls)
+    tts = stage_handlers["tts"]
+
+    def flaky_tts(item):
+        if item.item_id == 1 and not failures:
+            failures.append(item.item_id)
+            raise RuntimeError("provider down")
+        return tts(item)
+
+    stage_handlers["tts"] = flaky_tts
+    assert trailer_pool.refill(2, ["Horror"], stage_handlers, **paths) == 1
+    assert trailer_pool.ready_counts(paths["db_path"]) == {"Horror": 1}
+
+    calls.clear()
+    assert trailer_pool.refill(2, ["Horror"], stage_handlers, **paths) == 1
+    # Only the failed item is retried; no new job is created
+    assert calls == [("Horror", "tts"), ("Horror", "mix")]
+    assert trailer_pool.ready_counts(paths["db_path"]) == {"Horror": 2}
+    assert trailer_pool.refill(2, ["Horror"], handlers([]), **paths) == 0
@@ -1,6 +1,16 @@
-import openai
 import os
-from typing import Optional, Any
+import asyncio
+import functools
+from typing import Optional, Any, Tuple
+from scripts.rate_limiter import DEFAULT_MAX_WAIT, get_rate_limiter, provider_for
+from scripts.key_pool import KeyPool
+from scripts.ollama_scheduler import scheduler_for
+from scripts.prompt_templates import build_messages, supports_cache_marker
+from scripts.lazy_import import lazy_import
+from scripts.single_flight import get_single_flight, request_key
+
+# The SDK is imported on the first call, not when this module is loaded
+openai = lazy_import("openai", "calling LLMs")
 
 # Consider loading base_url and api_key from environment variables or a config file
 # for better security and flexibility.
@@ -12,7 +22,15 @@ from typing import Optional, Any
 
 
 def call_llm(
-    model_name: str, prompt: str, api_key: str, base_url: str, **kwargs: Any
+    model_name: str,
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    usage: Optional[dict] = None,
+    key_pool: Optional[KeyPool] = None,
+    coalesce: bool = True,
+    system: Optional[str] = None,
+    **kwargs: Any,
 ) -> Optional[str]:
     """
     Calls a Large Language Model (LLM) using the OpenAI API standard.
@@ -26,6 +44,21 @@ def call_llm(
         prompt: The user's prompt as a simple string.
         api_key: The API key for the target service.
         base_url: The base URL of the target API endpoint (e.g., "https://openrouter.ai/api/v1", "http://localhost:11434/v1").
+        usage: Optional dict that is filled with the ``prompt_tokens`` and
+               ``completion_tokens`` reported by the API. A call answered by
+               another caller's identical request reports zero tokens and the
+               request's counts as ``shared_prompt_tokens`` and
+               ``shared_completion_tokens``, so totals count each request once.
+        key_pool: Optional pool to take the API key from instead of ``api_key``.
+                  The key's outcome (429, invalid key, ...) is reported back
+                  so exhausted keys cool down.
+        coalesce: When True (the default), concurrent calls with the same base
+                  URL, model, prompt, arguments and API key (or key pool) share
+                  one request; callers that want independent samples pass False.
+        system: Optional static instructions sent as a system message before
+                the prompt. Keeping them identical between calls lets providers
+                cache the prefix; OpenRouter's Anthropic and Gemini models get
+                an explicit cache marker for it.
         **kwargs: Additional keyword arguments to pass directly to the
                   openai.chat.completions.create method (e.g., temperature, max_tokens).
 
@@ -38,10 +71,149 @@ def call_llm(
         openai.NotFoundError: If the model or resource is not found.
         openai.APIConnectionError: If there's trouble connecting to the API.
         openai.RateLimitError: If the rate limit is exceeded.
+        scripts.rate_limiter.RateLimitTimeout: If the provider's rate limit leaves
+            no capacity within DEFAULT_MAX_WAIT seconds.
+        scripts.ollama_scheduler.OllamaBusyError: If a local Ollama server has
+            no free slot for the model within DEFAULT_QUEUE_TIMEOUT seconds.
         openai.APITimeoutError: If the request times out.
         openai.APIError: For other generic OpenAI API errors.
         Exception: For any other unexpected errors during the process.
     """
+    call = functools.partial(
+        _call_scheduled,
+        model_name,
+        prompt,
+        api_key,
+        base_url,
+        key_pool,
+        system,
+        **kwargs,
+    )
+    led = []
+
+    def lead():
+        led.append(True)
+        return call()
+
+    if coalesce:
+        key = _coalesce_key(
+            model_name, prompt, api_key, base_url, key_pool, system, kwargs
+        )
+        content, call_usage = get_single_flight("llm").do(key, lead)
+    else:
+        content, call_usage = lead()
+    if usage is not None:
+        usage.update(call_usage if led else _shared_usage(call_usage))
+    return content
+
+
+async def call_llm_async(
+    model_name: str,
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    usage: Optional[dict] = None,
+    key_pool: Optional[KeyPool] = None,
+    coalesce: bool = True,
+    system: Optional[str] = None,
+    **kwargs: Any,
+) -> Optional[str]:
+    """
+    Awaitable call_llm for callers on an asyncio loop; takes the same arguments
+    and raises the same errors.
+
+    The request runs in a worker thread. Identical requests in flight, from
+    tasks or threads, share one call, and coalesced tasks wait on the loop
+    without holding a thread.
+    """
+    call = functools.partial(
+        _call_scheduled,
+        model_name,
+        prompt,
+        api_key,
+        base_url,
+        key_pool,
+        system,
+        **kwargs,
+    )
+    led = []
+
+    async def lead():
+        led.append(True)
+        return await asyncio.to_thread(call)
+
+    if coalesce:
+        key = _coalesce_key(
+            model_name, prompt, api_key, base_url, key_pool, system, kwargs
+        )
+        content, call_usage = await get_single_flight("llm").do_async(key, lead)
+    else:
+        content, call_usage = await lead()
+    if usage is not None:
+        usage.update(call_usage if led else _shared_usage(call_usage))
+    return content
+
+
+def _coalesce_key(
+    model_name: str,
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    key_pool: Optional[KeyPool],
+    system: Optional[str],
+    kwargs: dict,
+) -> str:
+    # Only callers using the same key (or key pool) share a call, so a follower
+    # never gets another key's 401/402/429 and the leader's pool does not cool
+    # down a key on its behalf
+    credentials = ("pool", id(key_pool)) if key_pool is not None else ("key", api_key)
+    return request_key(base_url, model_name, system, prompt, kwargs, credentials)
+
+
+def _shared_usage(usage: dict) -> dict:
+    """Returns the usage reported to a caller that joined another's request."""
+    shared = {name: 0 for name in usage}
+    shared.update({f"shared_{name}": count for name, count in usage.items()})
+    return shared
+
+
+def _call_scheduled(
+    model_name: str,
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    key_pool: Optional[KeyPool] = None,
+    system: Optional[str] = None,
+    **kwargs: Any,
+) -> Tuple[Optional[str], dict]:
+    """
+    Runs _call_llm, in a slot of the server's scheduler for local Ollama
+    models so concurrent sessions do not overload it or thrash its models.
+    """
+    args = (model_name, prompt, api_key, base_url, key_pool, system)
+    scheduler = scheduler_for(base_url)
+    if scheduler is None:
+        return _call_llm(*args, **kwargs)
+    with scheduler.slot(model_name):
+        return _call_llm(*args, **kwargs)
+
+
+def _call_llm(
+    model_name: str,
+    prompt: str,
+    api_key: str,
+    base_url: str,
+    key_pool: Optional[KeyPool] = None,
+    system: Optional[str] = None,
+    **kwargs: Any,
+) -> Tuple[Optional[str], dict]:
+    """Makes one call for call_llm and returns the content and token usage."""
+    if key_pool is not None:
+        with key_pool.lease() as pooled_key:
+            return _call_llm(
+                model_name, prompt, pooled_key, base_url, system=system, **kwargs
+            )
+
     print(f"--- Calling LLM ---")
     print(f"Base URL: {base_url}")
     print(f"Model: {model_name}")
@@ -50,6 +222,18 @@ def call_llm(
     print(f"Prompt: {prompt[:100]}...")  # Print truncated prompt
     print(f"Additional Args: {kwargs}")
 
+    # Pace the call against the provider's limits for this key; the token cost
+    # is estimated from the prompt length and the completion budget
+    limiter = get_rate_limiter()
+    provider = provider_for(base_url)
+    limiter.acquire(
+        provider,
+        api_key,
+        timeout=DEFAULT_MAX_WAIT,
+        requests=1,
+        tokens=(len(system or "") + len(prompt)) // 4 + kwargs.get("max_tokens", 0),
+    )
+
     try:
         # Instantiate the client within the try block in case base_url is invalid?
         # No, OpenAI client doesn't seem to validate eagerly. Keep it outside for clarity.
@@ -58,11 +242,20 @@ def call_llm(
             api_key=api_key,
         )
 
-        messages = [{"role": "user", "content": prompt}]
+        messages = build_messages(
+            prompt, system, cache_marker=supports_cache_marker(base_url, model_name)
+        )
 
-        completion = client.chat.completions.create(
+        raw_response = client.chat.completions.with_raw_response.create(
             model=model_name, messages=messages, **kwargs
         )
+        limiter.observe(provider, api_key, raw_response.headers)
+        completion = raw_response.parse()
+
+        usage = {}
+        if getattr(completion, "usage", None):
+            usage["prompt_tokens"] = completion.usage.prompt_tokens
+            usage["completion_tokens"] = completion.usage.completion_tokens
 
         # Extract response content
         response_content = None
@@ -79,9 +272,9 @@ def call_llm(
         if response_content is None:
             print("Warning: LLM response content was empty or missing.")
             # Decide if empty response is an error or valid case. Returning None for now.
-            return None
+            return None, usage
 
-        return response_content.strip()
+        return response_content.strip(), usage
 
     except openai.AuthenticationError as e:
         print(f"ERROR: OpenAI Authentication Error: {e}")
@@ -96,6 +289,7 @@ def call_llm(
         raise
     except openai.RateLimitError as e:
         print(f"ERROR: OpenAI Rate Limit Error: {e}")
+        limiter.observe(provider, api_key, e.response.headers)
         raise
     except openai.APITimeoutError as e:
         print(f"ERROR: OpenAI API Timeout Error: {e}")